@@ -0,0 +1,222 @@
+# batch_board.py
+# NumPy-backed board that plays many Dots and Boxes games at once.
+# Used for generating training data and running rollouts in bulk: every operation
+# works on all games in the batch with array operations instead of Python loops.
+#
+# Edges are numbered the same way as GameBoard.move_to_edge_index(), and players
+# and box owners use the same values as GameBoard (1 and 2, with 0 for "no owner").
+
+from typing import List, Optional
+
+import numpy as np
+
+from game_board import GameBoard
+
+NO_MOVE = -1
+
+
+class BatchGameBoard:
+    """
+    A batch of independent Dots and Boxes games on boards of the same size.
+
+    Attributes:
+        rows (int): Number of rows of dots
+        cols (int): Number of columns of dots
+        count (int): Number of games in the batch
+        edge_count (int): Number of edges per board
+        box_count (int): Number of boxes per board
+        incidence (np.ndarray): (box_count, edge_count) bool matrix; True where an edge is a side of a box
+        edge_boxes (np.ndarray): (edge_count, 2) boxes bordering each edge, padded with -1
+        edges (np.ndarray): (count, edge_count) bool; True where a line has been drawn
+        box_sides (np.ndarray): (count, box_count) number of drawn sides of each box
+        box_owners (np.ndarray): (count, box_count) owner of each box (0 if not completed)
+        current_player (np.ndarray): (count,) player to move in each game (1 or 2)
+        scores (np.ndarray): (count, 2) scores of players 1 and 2
+    """
+
+    def __init__(self, count: int, rows: int = 3, cols: int = 3):
+        """
+        Create a batch of empty boards.
+
+        Args:
+            count (int): Number of games
+            rows (int): Number of rows of dots (default: 3)
+            cols (int): Number of columns of dots (default: 3)
+        """
+        board = GameBoard(rows, cols)
+        self.rows = rows
+        self.cols = cols
+        self.count = count
+        self.edge_count = board.get_edge_count()
+        self.box_count = (rows - 1) * (cols - 1)
+
+        # Precompute which edges are the four sides of each box
+        self.incidence = np.zeros((self.box_count, self.edge_count), dtype=bool)
+        for box_row in range(rows - 1):
+            for box_col in range(cols - 1):
+                box = box_row * (cols - 1) + box_col
+                self.incidence[box, board.move_to_edge_index('h', box_row, box_col)] = True
+                self.incidence[box, board.move_to_edge_index('h', box_row + 1, box_col)] = True
+                self.incidence[box, board.move_to_edge_index('v', box_row, box_col)] = True
+                self.incidence[box, board.move_to_edge_index('v', box_row, box_col + 1)] = True
+        # Every edge borders one or two boxes; pad with -1 to get a rectangular array
+        self.edge_boxes = np.full((self.edge_count, 2), -1, dtype=np.int64)
+        for edge in range(self.edge_count):
+            boxes = np.flatnonzero(self.incidence[:, edge])
+            self.edge_boxes[edge, :len(boxes)] = boxes
+
+        self.edges = np.zeros((count, self.edge_count), dtype=bool)
+        self.box_sides = np.zeros((count, self.box_count), dtype=np.int8)
+        self.box_owners = np.zeros((count, self.box_count), dtype=np.int8)
+        self.current_player = np.ones(count, dtype=np.int8)
+        self.scores = np.zeros((count, 2), dtype=np.int32)
+
+    def legal_move_mask(self) -> np.ndarray:
+        """
+        Get the legal moves of every game.
+
+        Returns:
+            np.ndarray: (count, edge_count) bool; True where the edge can still be drawn
+        """
+        return ~self.edges
+
+    def is_game_over(self) -> np.ndarray:
+        """
+        Check which games are over.
+
+        Returns:
+            np.ndarray: (count,) bool; True for games where every box is completed
+        """
+        return (self.box_owners != 0).all(axis=1)
+
+    def apply_moves(self, moves: np.ndarray) -> np.ndarray:
+        """
+        Make one move in each game, following the same rules as GameBoard.make_move().
+
+        Args:
+            moves (np.ndarray): (count,) edge index for each game, or NO_MOVE (-1)
+                to leave that game unchanged
+
+        Returns:
+            np.ndarray: (count,) number of boxes completed in each game
+
+        Raises:
+            ValueError: If a move is out of range or the line is already drawn
+        """
+        moves = np.asarray(moves, dtype=np.int64)
+        if moves.shape != (self.count,):
+            raise ValueError(f"Expected {self.count} moves, got shape {moves.shape}")
+        games = np.flatnonzero(moves != NO_MOVE)
+        edges = moves[games]
+        if ((edges < 0) | (edges >= self.edge_count)).any():
+            raise ValueError("Edge index out of range")
+        if self.edges[games, edges].any():
+            raise ValueError("Line already drawn")
+
+        self.edges[games, edges] = True
+        completed = np.zeros(self.count, dtype=np.int32)
+        players = self.current_player[games]
+        # Each edge touches at most two boxes: update each slot separately
+        for slot in range(2):
+            boxes = self.edge_boxes[edges, slot]
+            has_box = boxes >= 0
+            slot_games = games[has_box]
+            slot_boxes = boxes[has_box]
+            self.box_sides[slot_games, slot_boxes] += 1
+            done = self.box_sides[slot_games, slot_boxes] == 4
+            self.box_owners[slot_games[done], slot_boxes[done]] = players[has_box][done]
+            completed[slot_games[done]] += 1
+
+        # Score the completed boxes for the player who moved; otherwise switch players
+        moved_completed = completed[games]
+        self.scores[games, players - 1] += moved_completed
+        switch = games[moved_completed == 0]
+        self.current_player[switch] = 3 - self.current_player[switch]
+        return completed
+
+    def random_moves(self, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Pick a uniformly random legal move in every game.
+
+        Returns:
+            np.ndarray: (count,) edge index for each game, NO_MOVE for finished games
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        weights = rng.random((self.count, self.edge_count))
+        weights[self.edges] = -1.0
+        moves = weights.argmax(axis=1)
+        moves[self.edges.all(axis=1)] = NO_MOVE
+        return moves
+
+    @classmethod
+    def from_boards(cls, boards: List[GameBoard]) -> 'BatchGameBoard':
+        """
+        Build a batch from individual GameBoard instances (all the same size).
+
+        Raises:
+            ValueError: If there are no boards or they are not all the same size
+        """
+        if not boards:
+            raise ValueError("Cannot build a batch from no boards")
+        rows, cols = boards[0].rows, boards[0].cols
+        batch = cls(len(boards), rows, cols)
+        for i, board in enumerate(boards):
+            if (board.rows, board.cols) != (rows, cols):
+                raise ValueError("All boards in a batch must be the same size")
+            for row, col in board.horizontal_lines:
+                batch.edges[i, board.move_to_edge_index('h', row, col)] = True
+            for row, col in board.vertical_lines:
+                batch.edges[i, board.move_to_edge_index('v', row, col)] = True
+            for (box_row, box_col), owner in board.boxes.items():
+                batch.box_owners[i, box_row * (cols - 1) + box_col] = owner
+            batch.current_player[i] = board.current_player
+            batch.scores[i] = (board.get_score(1), board.get_score(2))
+        batch.box_sides[:] = batch.edges.astype(np.int8) @ batch.incidence.T.astype(np.int8)
+        return batch
+
+    def to_board(self, index: int) -> GameBoard:
+        """
+        Convert one game of the batch back into a GameBoard.
+        """
+        board = GameBoard(self.rows, self.cols)
+        for edge in np.flatnonzero(self.edges[index]):
+            move_type, row, col = board.edge_index_to_move(int(edge))
+            if move_type == 'h':
+                board.horizontal_lines.add((row, col))
+            else:
+                board.vertical_lines.add((row, col))
+        for box in np.flatnonzero(self.box_owners[index]):
+            box_row, box_col = divmod(int(box), self.cols - 1)
+            board.boxes[(box_row, box_col)] = int(self.box_owners[index, box])
+        board.current_player = int(self.current_player[index])
+        board.scores = {1: int(self.scores[index, 0]), 2: int(self.scores[index, 1])}
+        return board
+
+    def to_boards(self) -> List[GameBoard]:
+        """
+        Convert every game of the batch into a GameBoard.
+        """
+        return [self.to_board(i) for i in range(self.count)]
+
+    def mismatched_games(self, boards: List[GameBoard]) -> List[int]:
+        """
+        Cross-check the batch against GameBoard instances that played the same moves.
+
+        Args:
+            boards (List[GameBoard]): One board per game in the batch
+
+        Returns:
+            List[int]: Indexes of games whose lines, boxes, scores or current
+                player differ from the matching GameBoard (empty if all agree)
+        """
+        mismatched = []
+        for i, expected in enumerate(boards):
+            actual = self.to_board(i)
+            if (actual.horizontal_lines != expected.horizontal_lines
+                    or actual.vertical_lines != expected.vertical_lines
+                    or actual.boxes != expected.boxes
+                    or actual.scores != expected.scores
+                    or actual.current_player != expected.current_player):
+                mismatched.append(i)
+        return mismatched
@@ -3,6 +3,7 @@
 # Console-based two-player game where players take turns drawing lines to complete boxes.
 
 from game_board import GameBoard
+from mcts_player import MCTSPlayer
 from game_ui import (
     display_board,
     display_scores,
@@ -11,6 +12,9 @@ from game_ui import (
     get_player_move
 )
 
+# Set to 1 or 2 to play against the MCTS computer player, or None for two human players
+AI_PLAYER = None
+
 
 def main():
     """
@@ -25,6 +29,7 @@ def main():
     
     # Initialize game board (3x3 dots = 2x2 boxes by default)
     board = GameBoard(rows=3, cols=3)
+    ai_player = MCTSPlayer(time_limit=1.0) if AI_PLAYER else None
     
     # Main game loop
     while not board.is_game_over():
@@ -32,8 +37,12 @@ def main():
         display_board(board)
         display_scores(board)
         
-        # Get player move
-        move = get_player_move(board)
+        # Get player move (from the computer player on its turn)
+        if board.current_player == AI_PLAYER:
+            move = ai_player.choose_move(board)
+            print(f"Computer plays: {move[0]} {move[1]} {move[2]}")
+        else:
+            move = get_player_move(board)
         
         # Handle quit
         if move is None:
@@ -224,6 +224,78 @@ class GameBoard:
         
         return moves
     
+    def get_edge_count(self) -> int:
+        """
+        Get the total number of lines (edges) that can be drawn on the board.
+        
+        Returns:
+            int: Number of horizontal lines plus number of vertical lines
+        """
+        return self.rows * (self.cols - 1) + (self.rows - 1) * self.cols
+    
+    def move_to_edge_index(self, move_type: str, row: int, col: int) -> int:
+        """
+        Convert a move to its edge index.
+        
+        Edges are numbered with all horizontal lines first (row by row), followed
+        by all vertical lines (row by row). This is the same order used by
+        get_available_moves(), and gives every line a single small integer that
+        can be stored compactly.
+        
+        Args:
+            move_type (str): 'h' for horizontal line, 'v' for vertical line
+            row (int): Row coordinate
+            col (int): Column coordinate
+            
+        Returns:
+            int: Edge index in the range 0 to get_edge_count() - 1
+            
+        Raises:
+            ValueError: If the move type or coordinates are out of range
+        """
+        if move_type == 'h' and 0 <= row < self.rows and 0 <= col < self.cols - 1:
+            return row * (self.cols - 1) + col
+        if move_type == 'v' and 0 <= row < self.rows - 1 and 0 <= col < self.cols:
+            return self.rows * (self.cols - 1) + row * self.cols + col
+        raise ValueError(f"Move out of range: {move_type} {row} {col}")
+    
+    def edge_index_to_move(self, edge_index: int) -> Tuple[str, int, int]:
+        """
+        Convert an edge index back to a move.
+        
+        Args:
+            edge_index (int): Edge index produced by move_to_edge_index()
+            
+        Returns:
+            Tuple[str, int, int]: (move_type, row, col) tuple
+            
+        Raises:
+            ValueError: If the edge index is out of range
+        """
+        if edge_index < 0 or edge_index >= self.get_edge_count():
+            raise ValueError(f"Edge index out of range: {edge_index}")
+        horizontal_count = self.rows * (self.cols - 1)
+        if edge_index < horizontal_count:
+            row, col = divmod(edge_index, self.cols - 1)
+            return ('h', row, col)
+        row, col = divmod(edge_index - horizontal_count, self.cols)
+        return ('v', row, col)
+    
+    def copy(self) -> 'GameBoard':
+        """
+        Create an independent copy of the board.
+        
+        Returns:
+            GameBoard: A new board with the same lines, boxes, scores and current player
+        """
+        board = GameBoard(self.rows, self.cols)
+        board.horizontal_lines = set(self.horizontal_lines)
+        board.vertical_lines = set(self.vertical_lines)
+        board.boxes = dict(self.boxes)
+        board.current_player = self.current_player
+        board.scores = dict(self.scores)
+        return board
+    
     def get_winner(self) -> Optional[int]:
         """
         Get the winner of the game (if game is over).
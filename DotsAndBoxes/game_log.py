@@ -0,0 +1,400 @@
+# game_log.py
+# Compact binary move log for saving and replaying Dots and Boxes games.
+# Each move is stored as the edge index of the line that was drawn, so a game
+# on a small board takes about one byte per move and millions of games fit in one file.
+#
+# File layout:
+#   header:  b'DBLG', format version, rows, cols   (version/rows/cols are varints)
+#   games:   one varint per move holding (edge index + 1), then a 0 byte to end the game
+#
+# Varints use the LEB128 encoding (7 bits per byte, high bit set on every byte
+# except the last). A 0 byte can only appear as the end-of-game marker, which lets
+# a reader find every game boundary with a fast byte search instead of decoding.
+
+import mmap
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from game_board import GameBoard
+
+MAGIC = b'DBLG'
+FORMAT_VERSION = 1
+END_OF_GAME = b'\x00'
+DEFAULT_CHECKPOINT_INTERVAL = 8
+# Bytes read at a time when searching backwards for the end of the last game
+_SCAN_BLOCK_SIZE = 65536
+
+Move = Tuple[str, int, int]
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    Encode a non-negative integer as a LEB128 varint.
+
+    Args:
+        value (int): Value to encode (must be >= 0)
+
+    Returns:
+        bytes: Encoded value (one byte for values below 128)
+    """
+    if value < 0:
+        raise ValueError("Varints must be non-negative")
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def decode_varint(data, pos: int) -> Tuple[int, int]:
+    """
+    Decode a LEB128 varint starting at a position in a bytes-like object.
+
+    Args:
+        data: bytes, bytearray or mmap holding the encoded data
+        pos (int): Offset of the first byte of the varint
+
+    Returns:
+        Tuple[int, int]: (decoded value, offset just past the varint)
+
+    Raises:
+        ValueError: If the data ends in the middle of a varint
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated varint in game log")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_header(rows: int, cols: int) -> bytes:
+    """
+    Build the file header for a log of games played on a rows x cols board.
+    """
+    return MAGIC + encode_varint(FORMAT_VERSION) + encode_varint(rows) + encode_varint(cols)
+
+
+def decode_header(data) -> Tuple[int, int, int]:
+    """
+    Parse a game log header.
+
+    Returns:
+        Tuple[int, int, int]: (rows, cols, offset of the first game)
+
+    Raises:
+        ValueError: If the data is not a game log or uses an unknown format version
+    """
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a Dots and Boxes game log")
+    version, pos = decode_varint(data, len(MAGIC))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported game log version: {version}")
+    rows, pos = decode_varint(data, pos)
+    cols, pos = decode_varint(data, pos)
+    return rows, cols, pos
+
+
+def _find_end_of_last_game(f: BinaryIO, first_game: int, size: int) -> int:
+    """
+    Find the offset just past the last end-of-game marker of an open log file,
+    searching backwards from the end so large logs are not read in full.
+
+    Returns:
+        int: Offset just past the last complete game (first_game if there is none)
+    """
+    end = size
+    while end > first_game:
+        start = max(first_game, end - _SCAN_BLOCK_SIZE)
+        f.seek(start)
+        pos = f.read(end - start).rfind(END_OF_GAME)
+        if pos != -1:
+            return start + pos + 1
+        end = start
+    return first_game
+
+
+class GameLogWriter:
+    """
+    Append-only writer that streams moves to a binary game log as they are played.
+
+    Moves are written immediately, so a game can be recorded from inside the game
+    loop without keeping its history in memory. Call end_game() when a game is
+    finished; a game that was never ended is ignored by GameLogReader.
+
+    Attributes:
+        rows (int): Number of rows of dots for every game in the log
+        cols (int): Number of columns of dots for every game in the log
+        games_written (int): Number of games ended by this writer
+    """
+
+    def __init__(self, stream: BinaryIO, rows: int = 3, cols: int = 3, write_header: bool = True):
+        """
+        Create a writer on an already open binary stream.
+
+        Args:
+            stream (BinaryIO): Stream opened for binary writing
+            rows (int): Number of rows of dots (default: 3)
+            cols (int): Number of columns of dots (default: 3)
+            write_header (bool): Write the file header first (False when appending
+                to a log that already has one)
+        """
+        self.stream = stream
+        self.rows = rows
+        self.cols = cols
+        self.games_written = 0
+        # A scratch board is only used to convert moves to edge indexes
+        self._board = GameBoard(rows, cols)
+        if write_header:
+            self.stream.write(encode_header(rows, cols))
+
+    @classmethod
+    def open(cls, path: str, rows: int = 3, cols: int = 3) -> 'GameLogWriter':
+        """
+        Open a log file for appending, creating it (with a header) if needed.
+
+        If the last game in the file was never ended (e.g., the program that was
+        writing it crashed), its moves are removed first, so they do not become
+        part of the next game.
+
+        Raises:
+            ValueError: If the existing file was written for a different board size
+        """
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r+b') as f:
+                existing_rows, existing_cols, first_game = decode_header(f.read(64))
+                if (existing_rows, existing_cols) != (rows, cols):
+                    raise ValueError(
+                        f"Log {path} holds {existing_rows}x{existing_cols} games, not {rows}x{cols}")
+                size = os.fstat(f.fileno()).st_size
+                end = _find_end_of_last_game(f, first_game, size)
+                if end < size:
+                    f.truncate(end)
+            return cls(open(path, 'ab'), rows, cols, write_header=False)
+        return cls(open(path, 'wb'), rows, cols)
+
+    def record_move(self, move_type: str, row: int, col: int) -> None:
+        """
+        Append one move of the game currently being played.
+        """
+        edge_index = self._board.move_to_edge_index(move_type, row, col)
+        # Store edge + 1 so that 0 stays free for the end-of-game marker
+        self.stream.write(encode_varint(edge_index + 1))
+
+    def end_game(self) -> None:
+        """
+        Mark the end of the game currently being recorded.
+        """
+        self.stream.write(END_OF_GAME)
+        self.games_written += 1
+
+    def write_game(self, moves: List[Move]) -> None:
+        """
+        Append a complete game in a single write.
+
+        Args:
+            moves (List[Move]): The game's moves in the order they were played
+        """
+        encoded = bytearray()
+        for move_type, row, col in moves:
+            encoded += encode_varint(self._board.move_to_edge_index(move_type, row, col) + 1)
+        encoded += END_OF_GAME
+        self.stream.write(encoded)
+        self.games_written += 1
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.close()
+
+    def __enter__(self) -> 'GameLogWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class GameLogReader:
+    """
+    Random-access reader for a binary game log.
+
+    On creation the reader scans the log once for end-of-game markers and keeps
+    the start offset of every complete game, so any game can be decoded directly
+    without reading the games before it.
+
+    Attributes:
+        rows (int): Number of rows of dots for every game in the log
+        cols (int): Number of columns of dots for every game in the log
+    """
+
+    def __init__(self, data):
+        """
+        Create a reader over log data that is already in memory.
+
+        Args:
+            data: bytes, bytearray or mmap holding a complete game log
+        """
+        self._data = data
+        self.rows, self.cols, first_game = decode_header(data)
+        self._board = GameBoard(self.rows, self.cols)
+        # _game_offsets[i] is where game i starts; the final entry is one past the last game
+        self._game_offsets = [first_game]
+        pos = data.find(END_OF_GAME, first_game)
+        while pos != -1:
+            self._game_offsets.append(pos + 1)
+            pos = data.find(END_OF_GAME, pos + 1)
+        self._file = None
+
+    @classmethod
+    def open(cls, path: str) -> 'GameLogReader':
+        """
+        Open a log file, memory-mapping it so large logs are not read into memory.
+
+        Raises:
+            ValueError: If the file is empty or is not a game log
+        """
+        f = open(path, 'rb')
+        if os.fstat(f.fileno()).st_size == 0:
+            f.close()
+            raise ValueError(f"Game log {path} is empty")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            reader = cls(data)
+        except ValueError:
+            data.close()
+            f.close()
+            raise
+        reader._file = f
+        return reader
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._data.close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'GameLogReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """
+        Number of complete games in the log.
+        """
+        return len(self._game_offsets) - 1
+
+    def get_edge_indexes(self, game_number: int) -> List[int]:
+        """
+        Decode the moves of one game as edge indexes.
+
+        Raises:
+            IndexError: If the game number is out of range
+        """
+        if game_number < 0 or game_number >= len(self):
+            raise IndexError(f"Game number out of range: {game_number}")
+        pos = self._game_offsets[game_number]
+        end = self._game_offsets[game_number + 1] - 1
+        data = self._data
+        edges = []
+        while pos < end:
+            byte = data[pos]
+            if byte < 0x80:
+                # Fast path: every edge on boards up to 127 lines fits in one byte
+                edges.append(byte - 1)
+                pos += 1
+            else:
+                value, pos = decode_varint(data, pos)
+                edges.append(value - 1)
+        return edges
+
+    def get_moves(self, game_number: int) -> List[Move]:
+        """
+        Decode the moves of one game as (move_type, row, col) tuples.
+        """
+        return [self._board.edge_index_to_move(edge)
+                for edge in self.get_edge_indexes(game_number)]
+
+    def __iter__(self) -> Iterator[List[Move]]:
+        for game_number in range(len(self)):
+            yield self.get_moves(game_number)
+
+    def replay(self, game_number: int,
+               checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> 'GameReplay':
+        """
+        Load one game for replay.
+        """
+        return GameReplay(self.rows, self.cols, self.get_moves(game_number), checkpoint_interval)
+
+
+class GameReplay:
+    """
+    Replays a recorded game and rebuilds the position after any number of moves.
+
+    The game is played through once when the replay is created, and a copy of the
+    board is saved every checkpoint_interval moves. position_at() starts from the
+    nearest earlier checkpoint, so it never replays more than checkpoint_interval - 1
+    moves no matter how long the game is.
+
+    Attributes:
+        moves (List[Move]): The game's moves in the order they were played
+        checkpoint_interval (int): Number of moves between saved boards
+    """
+
+    def __init__(self, rows: int, cols: int, moves: List[Move],
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Replay the game and save checkpoints.
+
+        Raises:
+            ValueError: If the log contains a move that is illegal at that point in the game
+        """
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be at least 1")
+        self.moves = moves
+        self.checkpoint_interval = checkpoint_interval
+        board = GameBoard(rows, cols)
+        self._checkpoints = [board.copy()]
+        for move_number, move in enumerate(moves, start=1):
+            if not board.make_move(*move):
+                raise ValueError(f"Illegal move {move} at move {move_number}")
+            if move_number % checkpoint_interval == 0:
+                self._checkpoints.append(board.copy())
+        self.final_board = board
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def position_at(self, move_count: Optional[int] = None) -> GameBoard:
+        """
+        Get the board after the first move_count moves.
+
+        Args:
+            move_count (Optional[int]): Number of moves to apply (default: the whole game)
+
+        Returns:
+            GameBoard: A new board that the caller may modify freely
+
+        Raises:
+            IndexError: If move_count is negative or longer than the game
+        """
+        if move_count is None:
+            move_count = len(self.moves)
+        if move_count < 0 or move_count > len(self.moves):
+            raise IndexError(f"Move count out of range: {move_count}")
+        checkpoint = move_count // self.checkpoint_interval
+        board = self._checkpoints[checkpoint].copy()
+        for move in self.moves[checkpoint * self.checkpoint_interval:move_count]:
+            board.make_move(*move)
+        return board
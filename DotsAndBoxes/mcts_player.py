@@ -0,0 +1,328 @@
+# mcts_player.py
+# Monte Carlo Tree Search (MCTS) computer player for Dots and Boxes.
+# Positions are stored as an integer bitmask of drawn edges so that the thousands
+# of random playouts MCTS needs are cheap to run.
+#
+# Dots and Boxes does not strictly alternate turns: a player who completes a box
+# moves again. Each tree node therefore records which player is about to move,
+# and each child's statistics are kept from the point of view of the player who
+# made the move into it. Selection always maximizes the value for the player to
+# move at the parent, whether or not that is the same player as one level up.
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from game_board import GameBoard
+
+# Rollout policies, from weakest to strongest
+ROLLOUT_RANDOM = 'random'    # Any legal move
+ROLLOUT_GREEDY = 'greedy'    # Complete a box if possible, otherwise any legal move
+ROLLOUT_SAFE = 'safe'        # Like greedy, but avoid drawing the third side of a box
+
+DEFAULT_EXPLORATION = 1.4
+DEFAULT_ITERATIONS = 2000
+
+
+class BoardGeometry:
+    """
+    Precomputed edge/box relationships for one board size.
+
+    Attributes:
+        rows (int): Number of rows of dots
+        cols (int): Number of columns of dots
+        edge_count (int): Number of edges (lines) on the board
+        full_mask (int): Bitmask with every edge drawn
+        box_edges (List[int]): For each box, a bitmask of its four edges
+        edge_boxes (List[Tuple[int, ...]]): For each edge, the one or two boxes it borders
+    """
+
+    def __init__(self, rows: int, cols: int):
+        board = GameBoard(rows, cols)
+        self.rows = rows
+        self.cols = cols
+        self.edge_count = board.get_edge_count()
+        self.full_mask = (1 << self.edge_count) - 1
+        self.box_edges: List[int] = []
+        edge_boxes: List[List[int]] = [[] for _ in range(self.edge_count)]
+        for box_row in range(rows - 1):
+            for box_col in range(cols - 1):
+                box = len(self.box_edges)
+                sides = (
+                    board.move_to_edge_index('h', box_row, box_col),
+                    board.move_to_edge_index('h', box_row + 1, box_col),
+                    board.move_to_edge_index('v', box_row, box_col),
+                    board.move_to_edge_index('v', box_row, box_col + 1),
+                )
+                mask = 0
+                for edge in sides:
+                    mask |= 1 << edge
+                    edge_boxes[edge].append(box)
+                self.box_edges.append(mask)
+        self.edge_boxes = [tuple(boxes) for boxes in edge_boxes]
+
+    def apply_edge(self, mask: int, player: int, scores: Tuple[int, int],
+                   edge: int) -> Tuple[int, int, Tuple[int, int]]:
+        """
+        Draw an edge, following the same rules as GameBoard.make_move().
+
+        Args:
+            mask (int): Bitmask of drawn edges
+            player (int): Player making the move (1 or 2)
+            scores (Tuple[int, int]): Scores of players 1 and 2
+            edge (int): Edge to draw (must not already be drawn)
+
+        Returns:
+            Tuple[int, int, Tuple[int, int]]: (new mask, player to move next, new scores)
+        """
+        mask |= 1 << edge
+        completed = 0
+        for box in self.edge_boxes[edge]:
+            box_mask = self.box_edges[box]
+            if mask & box_mask == box_mask:
+                completed += 1
+        if completed == 0:
+            return mask, 3 - player, scores
+        if player == 1:
+            return mask, player, (scores[0] + completed, scores[1])
+        return mask, player, (scores[0], scores[1] + completed)
+
+    def state_from_board(self, board: GameBoard) -> Tuple[int, int, Tuple[int, int]]:
+        """
+        Convert a GameBoard into (edge mask, player to move, scores).
+        """
+        mask = 0
+        for row, col in board.horizontal_lines:
+            mask |= 1 << board.move_to_edge_index('h', row, col)
+        for row, col in board.vertical_lines:
+            mask |= 1 << board.move_to_edge_index('v', row, col)
+        return mask, board.current_player, (board.get_score(1), board.get_score(2))
+
+
+class _Node:
+    """
+    One position in the search tree.
+    """
+    __slots__ = ('mask', 'player', 'scores', 'edge', 'mover', 'parent',
+                 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, geometry: BoardGeometry, mask: int, player: int,
+                 scores: Tuple[int, int], edge: Optional[int] = None,
+                 mover: Optional[int] = None, parent: Optional['_Node'] = None):
+        self.mask = mask
+        self.player = player        # Player to move in this position
+        self.scores = scores
+        self.edge = edge            # Edge drawn to reach this position
+        self.mover = mover          # Player who drew that edge
+        self.parent = parent
+        self.children: List['_Node'] = []
+        self.untried = [e for e in range(geometry.edge_count) if not mask >> e & 1]
+        self.visits = 0
+        self.wins = 0.0             # Total reward for self.mover
+
+
+def _rollout(geometry: BoardGeometry, mask: int, player: int, scores: Tuple[int, int],
+             policy: str, rng: random.Random) -> Tuple[int, int]:
+    """
+    Play random moves from a position to the end of the game.
+
+    Returns:
+        Tuple[int, int]: Final scores of players 1 and 2
+    """
+    edge_boxes = geometry.edge_boxes
+    # Number of drawn sides of each box, updated as the rollout proceeds
+    sides = [bin(mask & box_mask).count('1') for box_mask in geometry.box_edges]
+    available = [e for e in range(geometry.edge_count) if not mask >> e & 1]
+    score = [scores[0], scores[1]]
+    while available:
+        edge = None
+        if policy != ROLLOUT_RANDOM:
+            capturing = [e for e in available
+                         if any(sides[box] == 3 for box in edge_boxes[e])]
+            if capturing:
+                edge = rng.choice(capturing)
+            elif policy == ROLLOUT_SAFE:
+                safe = [e for e in available
+                        if all(sides[box] < 2 for box in edge_boxes[e])]
+                if safe:
+                    edge = rng.choice(safe)
+        if edge is None:
+            edge = rng.choice(available)
+        available.remove(edge)
+        completed = 0
+        for box in edge_boxes[edge]:
+            sides[box] += 1
+            if sides[box] == 4:
+                completed += 1
+        if completed:
+            score[player - 1] += completed
+        else:
+            player = 3 - player
+    return score[0], score[1]
+
+
+def _reward(scores: Tuple[int, int], player: int) -> float:
+    """
+    Reward for a player at the end of a game: 1 for a win, 0.5 for a tie, 0 for a loss.
+    """
+    mine = scores[player - 1]
+    theirs = scores[2 - player]
+    if mine > theirs:
+        return 1.0
+    if mine < theirs:
+        return 0.0
+    return 0.5
+
+
+def run_search(rows: int, cols: int, mask: int, player: int, scores: Tuple[int, int],
+               iterations: Optional[int] = DEFAULT_ITERATIONS,
+               time_limit: Optional[float] = None,
+               exploration: float = DEFAULT_EXPLORATION,
+               rollout_policy: str = ROLLOUT_SAFE,
+               seed: Optional[int] = None) -> Dict[int, Tuple[int, float]]:
+    """
+    Run MCTS from one position and report the statistics of the root's children.
+
+    The search stops after `iterations` iterations or `time_limit` seconds,
+    whichever comes first (either may be None, but not both).
+
+    Returns:
+        Dict[int, Tuple[int, float]]: Maps each explored edge to (visits, total reward
+            for the player to move at the root)
+    """
+    if iterations is None and time_limit is None:
+        raise ValueError("Set iterations, time_limit, or both")
+    geometry = BoardGeometry(rows, cols)
+    rng = random.Random(seed)
+    root = _Node(geometry, mask, player, scores)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    iteration = 0
+    while root.untried or root.children:
+        if iterations is not None and iteration >= iterations:
+            break
+        # Checking the clock every few iterations keeps the overhead negligible
+        if (deadline is not None and iteration > 0 and iteration % 16 == 0
+                and time.perf_counter() >= deadline):
+            break
+        iteration += 1
+
+        # 1. Selection: descend while the node is fully expanded
+        node = root
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: (
+                child.wins / child.visits
+                + exploration * math.sqrt(log_visits / child.visits)))
+
+        # 2. Expansion: add one untried move
+        if node.untried:
+            edge = node.untried.pop(rng.randrange(len(node.untried)))
+            child_mask, child_player, child_scores = geometry.apply_edge(
+                node.mask, node.player, node.scores, edge)
+            child = _Node(geometry, child_mask, child_player, child_scores,
+                          edge, node.player, node)
+            node.children.append(child)
+            node = child
+
+        # 3. Simulation
+        final_scores = _rollout(geometry, node.mask, node.player, node.scores,
+                                rollout_policy, rng)
+
+        # 4. Backpropagation: credit each node's reward to the player who moved into it
+        while node is not None:
+            node.visits += 1
+            if node.mover is not None:
+                node.wins += _reward(final_scores, node.mover)
+            node = node.parent
+
+    return {child.edge: (child.visits, child.wins) for child in root.children}
+
+
+def _run_search_worker(args: tuple) -> Dict[int, Tuple[int, float]]:
+    """
+    Process pool entry point for root-parallel search.
+    """
+    return run_search(*args)
+
+
+class MCTSPlayer:
+    """
+    Computer player that chooses moves with Monte Carlo Tree Search.
+
+    With workers > 1 the search is root-parallel: each worker process searches
+    its own tree from the current position with a different random seed, and
+    the visit counts of the root moves are added up before choosing.
+
+    Attributes:
+        iterations (Optional[int]): Iterations per worker per move (None for no limit;
+            DEFAULT_ITERATIONS if neither iterations nor time_limit is given)
+        time_limit (Optional[float]): Seconds per move (None for no limit)
+        workers (int): Number of worker processes (1 searches in this process)
+        exploration (float): UCT exploration constant
+        rollout_policy (str): ROLLOUT_RANDOM, ROLLOUT_GREEDY or ROLLOUT_SAFE
+    """
+
+    def __init__(self, iterations: Optional[int] = None,
+                 time_limit: Optional[float] = None, workers: int = 1,
+                 exploration: float = DEFAULT_EXPLORATION,
+                 rollout_policy: str = ROLLOUT_SAFE, seed: Optional[int] = None):
+        if rollout_policy not in (ROLLOUT_RANDOM, ROLLOUT_GREEDY, ROLLOUT_SAFE):
+            raise ValueError(f"Unknown rollout policy: {rollout_policy}")
+        # A time limit alone searches for the whole time; with no limit at all, use the default count
+        if iterations is None and time_limit is None:
+            iterations = DEFAULT_ITERATIONS
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.workers = workers
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self._rng = random.Random(seed)
+        self._executor = None
+
+    def choose_move(self, board: GameBoard) -> Tuple[str, int, int]:
+        """
+        Choose a move for the current player.
+
+        Args:
+            board (GameBoard): The game board (not modified)
+
+        Returns:
+            Tuple[str, int, int]: (move_type, row, col) of the chosen move
+
+        Raises:
+            ValueError: If the game is already over
+        """
+        geometry = BoardGeometry(board.rows, board.cols)
+        mask, player, scores = geometry.state_from_board(board)
+        if mask == geometry.full_mask:
+            raise ValueError("No moves available: the game is over")
+        search_args = [
+            (board.rows, board.cols, mask, player, scores, self.iterations,
+             self.time_limit, self.exploration, self.rollout_policy,
+             self._rng.randrange(2 ** 32))
+            for _ in range(self.workers)
+        ]
+        if self.workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            results = list(self._executor.map(_run_search_worker, search_args))
+        else:
+            results = [run_search(*search_args[0])]
+
+        totals: Dict[int, int] = {}
+        for stats in results:
+            for edge, (visits, _) in stats.items():
+                totals[edge] = totals.get(edge, 0) + visits
+        # The most visited move is the most robust choice
+        best_edge = max(totals, key=totals.get)
+        return board.edge_index_to_move(best_edge)
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes (if any).
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
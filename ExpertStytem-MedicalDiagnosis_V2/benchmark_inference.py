@@ -0,0 +1,245 @@
+# benchmark_inference.py
+# Compares the inference engines on a synthetic knowledge base and patient workload.
+#
+# For each engine it reports the setup time (building indexes, compiling, ...),
+# per-patient latency percentiles, throughput, and peak memory allocated while
+# diagnosing (measured with tracemalloc in a separate run on the first
+# MEMORY_SAMPLE_SIZE patients, since tracing slows everything down). It also
+# checks that every engine derives the same facts as forward_chaining_inference().
+#
+# Examples:
+#   python benchmark_inference.py
+#   python benchmark_inference.py --rules 100000 --depth 5 --fan-in 3 --patients 2000
+#   python benchmark_inference.py --engines compiled,stratified,vectorized
+
+import argparse
+import atexit
+import sys
+import time
+import tracemalloc
+
+from compiled_knowledge_base import compile_knowledge_base, compiled_forward_chaining_inference
+from inference_engine import forward_chaining_inference, indexed_forward_chaining_inference
+from knowledge_base import KnowledgeBaseVersion, build_rule_index
+from rule_graph import build_rule_graph, stratified_forward_chaining_inference
+from synthetic_knowledge_base import (DEFAULT_RULE_COUNT, DEFAULT_DEPTH, DEFAULT_FAN_IN,
+                                      DEFAULT_SYMPTOM_COUNT, DEFAULT_SYMPTOMS_PER_PATIENT,
+                                      generate_knowledge_base, generate_patients)
+
+ENGINE_NAIVE = 'naive'
+ENGINE_INDEXED = 'indexed'
+ENGINE_COMPILED = 'compiled'
+ENGINE_STRATIFIED = 'stratified'
+ENGINE_VECTORIZED = 'vectorized'
+ENGINE_SHARDED = 'sharded'
+ALL_ENGINES = [ENGINE_NAIVE, ENGINE_INDEXED, ENGINE_COMPILED, ENGINE_STRATIFIED, ENGINE_VECTORIZED,
+               ENGINE_SHARDED]
+# Engines that diagnose all the patients in one call
+BATCH_ENGINES = [ENGINE_VECTORIZED, ENGINE_SHARDED]
+
+DEFAULT_PATIENT_COUNT = 1000
+# The naive engine rescans every rule, so by default it only runs on this many patients
+DEFAULT_NAIVE_LIMIT = 100
+# tracemalloc slows Python code down several times, so memory is measured on this many patients
+MEMORY_SAMPLE_SIZE = 100
+
+
+def _prepare_engine(engine, rules):
+    """
+    Does an engine's one-time setup.
+
+    Returns:
+        function: Takes a list of symptom lists and returns a list of derived fact lists
+    """
+    if engine == ENGINE_NAIVE:
+        return lambda patients: [forward_chaining_inference(rules, facts) for facts in patients]
+    if engine == ENGINE_INDEXED:
+        rule_index = build_rule_index(rules)
+        return lambda patients: [indexed_forward_chaining_inference(rules, facts, rule_index)
+                                 for facts in patients]
+    compiled = compile_knowledge_base(rules)
+    if engine == ENGINE_COMPILED:
+        return lambda patients: [compiled_forward_chaining_inference(compiled, facts)
+                                 for facts in patients]
+    if engine == ENGINE_STRATIFIED:
+        graph = build_rule_graph(compiled)
+        graph.get_stratum_rules()
+        return lambda patients: [stratified_forward_chaining_inference(graph, facts)
+                                 for facts in patients]
+    if engine == ENGINE_VECTORIZED:
+        # Imported here because only this engine needs NumPy
+        from vectorized_engine import VectorizedEngine
+        vector_engine = VectorizedEngine(KnowledgeBaseVersion(0, compiled, None))
+        return lambda patients: _run_vectorized(vector_engine, patients)
+    if engine == ENGINE_SHARDED:
+        # Imported here because multiprocessing.shared_memory needs Python 3.8
+        from sharded_engine import ShardedEngine
+        sharded_engine = ShardedEngine(compiled)
+        # Stops the worker processes when the benchmark ends
+        atexit.register(sharded_engine.close)
+        return sharded_engine.run_batch
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def _run_vectorized(engine, patients):
+    """
+    Runs the vectorized engine and converts its matrix back to derived fact lists.
+    """
+    import numpy as np
+    initial = engine.encode(patients)
+    known = engine.run(initial.copy())
+    derived = np.unpackbits(known & ~initial, axis=1, count=len(patients)).T
+    fact_names = engine.compiled.fact_names
+    return [[fact_names[fact_id] for fact_id in np.flatnonzero(row)] for row in derived]
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value at a fraction (0.0 to 1.0) of a sorted list (nearest rank).
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def benchmark_engine(engine, rules, patients):
+    """
+    Benchmarks one engine.
+
+    Batch engines (vectorized, sharded) diagnose all patients in one call, so their
+    latency is the time for the whole batch divided evenly among the patients.
+
+    Returns:
+        dict: 'engine', 'patients', 'setup_seconds', 'p50_ms', 'p95_ms',
+            'p99_ms', 'throughput' (patients/sec), 'peak_memory_mb' (while
+            diagnosing MEMORY_SAMPLE_SIZE patients) and 'results' (derived fact lists)
+    """
+    start = time.perf_counter()
+    run = _prepare_engine(engine, rules)
+    setup_seconds = time.perf_counter() - start
+
+    latencies = []
+    results = []
+    start = time.perf_counter()
+    if engine in BATCH_ENGINES:
+        results = run(patients)
+        elapsed = time.perf_counter() - start
+        latencies = [elapsed / max(1, len(patients))] * len(patients)
+    else:
+        for facts in patients:
+            query_start = time.perf_counter()
+            results.extend(run([facts]))
+            latencies.append(time.perf_counter() - query_start)
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    tracemalloc.start()
+    run(patients[:MEMORY_SAMPLE_SIZE])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'engine': engine,
+        'patients': len(patients),
+        'setup_seconds': setup_seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'throughput': len(patients) / elapsed if elapsed > 0 else 0.0,
+        'peak_memory_mb': peak / (1024 * 1024),
+        'results': results,
+    }
+
+
+def run_benchmarks(engines, rules, patients, naive_limit=DEFAULT_NAIVE_LIMIT):
+    """
+    Benchmarks several engines and checks their results against the naive engine.
+    The naive engine runs first (if it is one of the engines), so every other
+    engine is checked whatever order the engines are given in.
+
+    Returns:
+        list: One report (see benchmark_engine()) per engine, in the order of
+            engines, each with an added 'mismatches' count of patients whose
+            derived facts differ from forward_chaining_inference() (None if the
+            naive engine was not run)
+    """
+    reports = {}
+    expected = None
+    # sorted() is stable, so the other engines keep their order
+    for engine in sorted(engines, key=lambda engine: engine != ENGINE_NAIVE):
+        engine_patients = patients[:naive_limit] if engine == ENGINE_NAIVE else patients
+        report = benchmark_engine(engine, rules, engine_patients)
+        results = report.pop('results')
+        if engine == ENGINE_NAIVE:
+            expected = [set(derived) for derived in results]
+        if expected is None:
+            report['mismatches'] = None
+        else:
+            report['mismatches'] = sum(1 for want, got in zip(expected, results) if want != set(got))
+        reports[engine] = report
+    return [reports[engine] for engine in engines]
+
+
+def format_reports(reports):
+    """
+    Formats benchmark reports as a text table.
+    """
+    lines = [f"{'engine':<11} {'patients':>8} {'setup s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'p99 ms':>8} {'patients/s':>11} {'peak MB':>8} {'mismatches':>10}"]
+    for report in reports:
+        mismatches = '-' if report['mismatches'] is None else report['mismatches']
+        lines.append(f"{report['engine']:<11} {report['patients']:>8} {report['setup_seconds']:>8.3f} "
+                     f"{report['p50_ms']:>8.3f} {report['p95_ms']:>8.3f} {report['p99_ms']:>8.3f} "
+                     f"{report['throughput']:>11,.0f} {report['peak_memory_mb']:>8.2f} {mismatches:>10}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Run with --help for options.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the inference engines on a synthetic knowledge base.")
+    parser.add_argument('--rules', type=int, default=DEFAULT_RULE_COUNT, help="Number of rules")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="Longest chain of rules")
+    parser.add_argument('--fan-in', type=int, default=DEFAULT_FAN_IN, help="Conditions per rule")
+    parser.add_argument('--symptoms', type=int, default=DEFAULT_SYMPTOM_COUNT,
+                        help="Number of distinct symptoms")
+    parser.add_argument('--patients', type=int, default=DEFAULT_PATIENT_COUNT, help="Number of patients")
+    parser.add_argument('--symptoms-per-patient', type=int, default=DEFAULT_SYMPTOMS_PER_PATIENT,
+                        help="Approximate symptoms per patient")
+    parser.add_argument('--naive-limit', type=int, default=DEFAULT_NAIVE_LIMIT,
+                        help="Patients for the (slow) naive engine; the others are checked against these")
+    parser.add_argument('--engines', default=','.join(ALL_ENGINES),
+                        help=f"Comma-separated engines to run (default: {','.join(ALL_ENGINES)})")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed")
+    args = parser.parse_args(argv)
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    unknown = [engine for engine in engines if engine not in ALL_ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(unknown)}")
+    if ENGINE_VECTORIZED in engines:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("NumPy is not installed: skipping the vectorized engine")
+            engines.remove(ENGINE_VECTORIZED)
+    if ENGINE_SHARDED in engines:
+        try:
+            import multiprocessing.shared_memory  # noqa: F401
+        except ImportError:
+            print("multiprocessing.shared_memory needs Python 3.8: skipping the sharded engine")
+            engines.remove(ENGINE_SHARDED)
+
+    start = time.perf_counter()
+    rules = generate_knowledge_base(args.rules, args.depth, args.fan_in, args.symptoms, args.seed)
+    patients = generate_patients(rules, args.patients, args.symptoms_per_patient, args.seed)
+    print(f"Generated {len(rules)} rules (depth {args.depth}, fan-in {args.fan_in}) and "
+          f"{len(patients)} patients in {time.perf_counter() - start:.2f}s")
+    print(format_reports(run_benchmarks(engines, rules, patients, args.naive_limit)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# certainty_inference.py
+# Certainty factor inference: diagnoses ranked by how strongly the evidence supports them.
+#
+# Every rule has a certainty factor (the optional 'confidence' column of the CSV
+# file, 1.0 if missing), and every symptom can be given a certainty (1.0 if not).
+# Certainties are combined the way the MYCIN expert system combined them:
+#   - A rule's premise is as certain as its least certain condition (minimum)
+#   - A rule contributes premise x rule confidence to its conclusion, if the premise
+#     is at least MIN_PREMISE_CERTAINTY
+#   - Several rules (or a symptom and rules) supporting the same fact combine as
+#     a + b * (1 - a), so more evidence raises the certainty without exceeding 1.0
+#
+# With every confidence and symptom certainty at 1.0, the facts with a certainty
+# above zero are exactly the facts get_diagnosis() derives.
+#
+# Example:
+#   session = CertaintySession({'fever': 0.9, 'cough': 0.8, 'body_aches': 1.0})
+#   session.get_ranked_diagnoses()    # [('influenza', 0.448)]
+
+from array import array
+
+from fact_symbols import get_symbol, normalize_fact_name
+from knowledge_base import RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION, get_current_knowledge_base
+
+# A rule does not fire if its premise is less certain than this (MYCIN used 0.2)
+MIN_PREMISE_CERTAINTY = 0.2
+# Changes in a fact's certainty smaller than this are not propagated further
+CERTAINTY_EPSILON = 1e-4
+
+
+class CertaintySession:
+    """
+    Certainty factors of every fact for one patient, updated as symptoms are added.
+
+    Each rule's contribution is stored, so when a symptom is added or becomes
+    more certain, only the rules that use a changed fact are recomputed, and a
+    conclusion is only propagated further if its certainty changed by more than
+    CERTAINTY_EPSILON. Certainties can only go up: adding a symptom again with a
+    lower certainty is ignored. (Lowering one could leave rules in a cycle
+    supporting each other.)
+
+    Like DiagnosisSession, a session stays on the knowledge base version that
+    was current when it was created.
+
+    Attributes:
+        version (int): Knowledge base version the session uses
+        symptoms (dict): Certainty of each symptom added so far
+    """
+
+    def __init__(self, symptoms=()):
+        """
+        Starts a session.
+
+        Args:
+            symptoms (dict or iterable): Symptom certainties, or symptom strings
+                (each with certainty 1.0)
+        """
+        knowledge_base = get_current_knowledge_base()
+        self.version = knowledge_base.version
+        self._compiled = compiled = knowledge_base.compiled
+        self.symptoms = {}
+        self._certainties = array('d', [0.0]) * compiled.fact_count
+        self._given = array('d', [0.0]) * compiled.fact_count
+        self._contributions = array('d', [0.0]) * compiled.rule_count
+        # Rules without conditions contribute their confidence from the start
+        changed = []
+        for rule_number in compiled.unconditional_rules:
+            self._contributions[rule_number] = self._rule_contribution(rule_number)
+            changed.append(compiled.conclusion_ids[rule_number])
+        self._propagate(self._update_facts(changed))
+        self.add_symptoms(symptoms)
+
+    def add_symptom(self, symptom, certainty=1.0):
+        """
+        Adds a symptom (or raises its certainty) and propagates the change.
+
+        Args:
+            symptom (str): The symptom (e.g., 'fever')
+            certainty (float): How certain the symptom is, 0.0 to 1.0
+
+        Raises:
+            ValueError: If certainty is not between 0 and 1
+        """
+        self.add_symptoms({symptom: certainty})
+
+    def add_symptoms(self, symptoms):
+        """
+        Adds several symptoms and propagates the changes.
+
+        Args:
+            symptoms (dict or iterable): Symptom certainties, or symptom strings
+                (each with certainty 1.0)
+
+        Raises:
+            ValueError: If a certainty is not between 0 and 1
+        """
+        if not isinstance(symptoms, dict):
+            symptoms = dict.fromkeys(symptoms, 1.0)
+        changed = []
+        fact_ids = self._compiled.fact_ids
+        for symptom, certainty in symptoms.items():
+            if not 0.0 <= certainty <= 1.0:
+                raise ValueError(f"Certainty of {symptom!r} must be between 0 and 1, got {certainty}")
+            symptom = normalize_fact_name(symptom)
+            if not symptom:
+                continue
+            if certainty <= self.symptoms.get(symptom, 0.0):
+                continue
+            self.symptoms[symptom] = certainty
+            fact_id = fact_ids.get(symptom)
+            if fact_id is not None:
+                self._given[fact_id] = certainty
+                changed.append(fact_id)
+        self._propagate(self._update_facts(changed))
+
+    def get_certainty(self, fact):
+        """
+        Returns the certainty of any fact (0.0 if nothing supports it).
+        """
+        fact_id = self._compiled.fact_ids.get(normalize_fact_name(fact))
+        return self._certainties[fact_id] if fact_id is not None else 0.0
+
+    def get_ranked_diagnoses(self):
+        """
+        Returns the supported diagnoses, most certain first.
+
+        Returns:
+            list: (diagnosis, certainty) tuples, e.g. [('influenza', 0.448)]
+        """
+        return self._ranked(RESULT_TYPE_DIAGNOSIS)
+
+    def get_ranked_recommendations(self):
+        """
+        Returns the supported recommendations, most certain first.
+
+        Returns:
+            list: (recommendation, certainty) tuples
+        """
+        return self._ranked(RESULT_TYPE_RECOMMENDATION)
+
+    def get_results(self):
+        """
+        Returns the ranked diagnoses and recommendations in one dict with the
+        same keys as get_diagnosis(), but holding (name, certainty) tuples.
+        """
+        return {"diagnoses": self.get_ranked_diagnoses(),
+                "recommendations": self.get_ranked_recommendations()}
+
+    def _ranked(self, goal_type):
+        fact_names = self._compiled.fact_names
+        ranked = []
+        for fact_id, certainty in enumerate(self._certainties):
+            if certainty > 0.0 and fact_names[fact_id] not in self.symptoms:
+                symbol = get_symbol(fact_names[fact_id])
+                if symbol.goal_type == goal_type:
+                    ranked.append((symbol.label, certainty))
+        # Most certain first; ties in name order so the ranking is stable
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    def _rule_contribution(self, rule_number):
+        """
+        Returns what a rule currently contributes to its conclusion's certainty.
+        """
+        compiled = self._compiled
+        certainties = self._certainties
+        condition_ids = compiled.condition_ids
+        premise = 1.0
+        for position in range(compiled.condition_offsets[rule_number],
+                              compiled.condition_offsets[rule_number + 1]):
+            certainty = certainties[condition_ids[position]]
+            if certainty < premise:
+                premise = certainty
+        if premise < MIN_PREMISE_CERTAINTY:
+            return 0.0
+        return premise * compiled.confidences[rule_number]
+
+    def _update_facts(self, fact_ids):
+        """
+        Recombines the certainty of each fact from its given certainty and its
+        rules' contributions.
+
+        Returns:
+            list: The facts whose certainty changed by more than CERTAINTY_EPSILON
+        """
+        compiled = self._compiled
+        concluding_offsets = compiled.concluding_offsets
+        concluding_rules = compiled.concluding_rules
+        contributions = self._contributions
+        changed = []
+        for fact_id in fact_ids:
+            # Combining a + b * (1 - a) over all the evidence is 1 - product of (1 - each)
+            disbelief = 1.0 - self._given[fact_id]
+            for position in range(concluding_offsets[fact_id], concluding_offsets[fact_id + 1]):
+                disbelief *= 1.0 - contributions[concluding_rules[position]]
+            certainty = 1.0 - disbelief
+            if abs(certainty - self._certainties[fact_id]) > CERTAINTY_EPSILON:
+                self._certainties[fact_id] = certainty
+                changed.append(fact_id)
+        return changed
+
+    def _propagate(self, agenda):
+        """
+        Recomputes the rules that use each changed fact until nothing changes.
+        """
+        compiled = self._compiled
+        dependent_offsets = compiled.dependent_offsets
+        dependent_rules = compiled.dependent_rules
+        conclusion_ids = compiled.conclusion_ids
+        contributions = self._contributions
+        while agenda:
+            fact_id = agenda.pop()
+            conclusions = []
+            for position in range(dependent_offsets[fact_id], dependent_offsets[fact_id + 1]):
+                rule_number = dependent_rules[position]
+                contribution = self._rule_contribution(rule_number)
+                if contribution != contributions[rule_number]:
+                    contributions[rule_number] = contribution
+                    conclusions.append(conclusion_ids[rule_number])
+            agenda += self._update_facts(conclusions)
+
+
+def get_ranked_diagnosis(symptoms):
+    """
+    Diagnoses a patient with certainty factors.
+
+    Args:
+        symptoms (dict or iterable): Symptom certainties (e.g., {'fever': 0.9}),
+            or symptom strings (each with certainty 1.0)
+
+    Returns:
+        dict: 'diagnoses' and 'recommendations', each a list of (name, certainty)
+            tuples with the most certain first
+    """
+    return CertaintySession(symptoms).get_results()
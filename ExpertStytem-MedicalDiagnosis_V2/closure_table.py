@@ -0,0 +1,149 @@
+# closure_table.py
+# Precomputes the diagnosis of every combination of symptoms, for knowledge bases
+# with only a few symptoms.
+#
+# The rules of medical_diagnosis.csv only use a handful of symptoms (fever, cough,
+# body_aches, ...), so there are only 2^n possible patients. A ClosureTable runs
+# inference once for each of them and stores the results, so that a diagnosis is a
+# dictionary lookup on a bit mask of the patient's symptoms. Set USE_CLOSURE_TABLE
+# in inference_engine.py to have get_diagnosis() use it. Knowledge bases with more
+# than MAX_CLOSURE_TABLE_SYMPTOMS symptoms get no table, and get_diagnosis() runs
+# inference as usual.
+#
+# The table stays compact:
+#   - Each subset is built from a smaller one by adding one symptom and only
+#     propagating that symptom, to find the subsets that fire rules
+#   - Subsets that fire no rules (beyond the rules without conditions) are not
+#     stored; a missing mask means the result for no symptoms
+#   - Subsets with the same diagnoses and recommendations (in the same order)
+#     share one result
+# The result of each stored subset comes from a fresh inference run on its
+# symptoms, so its lists are in the same order as get_diagnosis() gives.
+
+from compiled_knowledge_base import compiled_forward_chaining_inference, propagate_facts, start_inference
+from inference_engine import extract_goals
+
+# Knowledge bases with more symptoms than this get no closure table (2^16 = 65536 subsets)
+MAX_CLOSURE_TABLE_SYMPTOMS = 16
+
+
+def find_symptom_ids(compiled):
+    """
+    Returns the IDs of the symptoms of a compiled knowledge base: the facts that
+    rules use as conditions but that no rule concludes.
+    """
+    concluding_offsets = compiled.concluding_offsets
+    dependent_offsets = compiled.dependent_offsets
+    return [fact_id for fact_id in range(compiled.fact_count)
+            if concluding_offsets[fact_id] == concluding_offsets[fact_id + 1]
+            and dependent_offsets[fact_id] < dependent_offsets[fact_id + 1]]
+
+
+class ClosureTable:
+    """
+    The diagnosis results of every subset of a knowledge base's symptoms.
+
+    Attributes:
+        symptoms (list): The symptom names; symptom i is bit i of a mask
+        results (list): The distinct diagnosis results (see extract_goals()).
+            results[0] is the result for a patient with no symptoms.
+        stored_subsets (int): Number of subsets stored (the ones that fire rules)
+    """
+
+    def __init__(self, compiled, max_symptoms=MAX_CLOSURE_TABLE_SYMPTOMS):
+        """
+        Builds the table of a compiled knowledge base.
+
+        Raises:
+            ValueError: If the knowledge base has more than max_symptoms symptoms
+        """
+        symptom_ids = find_symptom_ids(compiled)
+        if len(symptom_ids) > max_symptoms:
+            raise ValueError(f"{len(symptom_ids)} symptoms is more than the limit of {max_symptoms}")
+        self.symptoms = [compiled.fact_names[fact_id] for fact_id in symptom_ids]
+        self.results = []
+        self._compiled = compiled
+        self._symptom_ids = symptom_ids
+        self._symptom_bits = {symptom: 1 << bit for bit, symptom in enumerate(self.symptoms)}
+        # Mask -> index in results, for the subsets that fire rules
+        self._masks = {}
+        # (diagnoses, recommendations) -> index in results
+        self._result_numbers = {}
+
+        known, unsatisfied, agenda, derived = start_inference(compiled, ())
+        derived += propagate_facts(compiled, known, unsatisfied, agenda)
+        self._add_result(0)
+        self._base_count = len(derived)
+        self._add_subsets(0, 0, known, unsatisfied, derived)
+        self.stored_subsets = len(self._masks)
+        del self._result_numbers
+
+    def _add_result(self, mask):
+        """
+        Runs inference on the symptoms of a mask (in bit order) and returns the
+        index in results of its result, adding it if it is new.
+        """
+        symptoms = [symptom for bit, symptom in enumerate(self.symptoms) if mask & (1 << bit)]
+        result = extract_goals(compiled_forward_chaining_inference(self._compiled, symptoms))
+        key = (tuple(result['diagnoses']), tuple(result['recommendations']))
+        result_number = self._result_numbers.get(key)
+        if result_number is None:
+            result_number = len(self.results)
+            self.results.append(result)
+            self._result_numbers[key] = result_number
+        return result_number
+
+    def _add_subsets(self, mask, first_bit, known, unsatisfied, derived):
+        """
+        Adds every subset made by adding symptoms from first_bit on to a subset
+        whose inference state is (known, unsatisfied, derived).
+        """
+        for bit in range(first_bit, len(self._symptom_ids)):
+            fact_id = self._symptom_ids[bit]
+            subset_known = bytearray(known)
+            subset_unsatisfied = unsatisfied[:]
+            subset_known[fact_id] = 1
+            subset_derived = derived + propagate_facts(self._compiled, subset_known, subset_unsatisfied,
+                                                       [fact_id])
+            subset_mask = mask | (1 << bit)
+            if len(subset_derived) > self._base_count:
+                self._masks[subset_mask] = self._add_result(subset_mask)
+            self._add_subsets(subset_mask, bit + 1, subset_known, subset_unsatisfied, subset_derived)
+
+    def lookup(self, facts):
+        """
+        Looks up the diagnosis for a patient's facts.
+
+        Facts that do not appear in any rule are ignored, like get_diagnosis()
+        ignores them. The lists are in the order get_diagnosis() gives for the
+        symptoms listed in the order of the symptoms attribute.
+
+        Args:
+            facts (iterable): Normalized fact strings (see fact_symbols.normalize_facts())
+
+        Returns:
+            dict: A copy of the stored result, or None if a fact is not a symptom
+                but appears in the rules (e.g., an intermediate fact such as
+                'suspect_flu'), since the table only covers symptoms
+        """
+        mask = 0
+        symptom_bits = self._symptom_bits
+        for fact in facts:
+            bit = symptom_bits.get(fact)
+            if bit is None:
+                if fact in self._compiled.fact_ids:
+                    return None
+            else:
+                mask |= bit
+        result = self.results[self._masks.get(mask, 0)]
+        return {key: list(value) for key, value in result.items()}
+
+
+def build_closure_table(compiled, max_symptoms=MAX_CLOSURE_TABLE_SYMPTOMS):
+    """
+    Builds the ClosureTable of a compiled knowledge base, or returns None if the
+    knowledge base has more than max_symptoms symptoms.
+    """
+    if len(find_symptom_ids(compiled)) > max_symptoms:
+        return None
+    return ClosureTable(compiled, max_symptoms)
@@ -0,0 +1,418 @@
+# compiled_knowledge_base.py
+# Compiles the rule dictionaries of the knowledge base into flat integer arrays,
+# and runs forward chaining directly on the compiled form.
+#
+# Every fact string is interned to an integer ID once, at compile time. After that
+# inference only does integer array indexing: no string hashing or rule dictionary
+# lookups happen inside the inference loop.
+
+from array import array
+
+from knowledge_base import (IF_KEY, THEN_KEY, RESULT_TYPE_KEY, CONFIDENCE_KEY, RESULT_TYPE_INTERMEDIATE,
+                            RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION, DEFAULT_CONFIDENCE)
+
+# Integer codes stored for each rule's result_type
+RESULT_TYPE_CODES = {
+    RESULT_TYPE_INTERMEDIATE: 0,
+    RESULT_TYPE_DIAGNOSIS: 1,
+    RESULT_TYPE_RECOMMENDATION: 2,
+}
+UNKNOWN_RESULT_TYPE_CODE = -1
+
+
+class CompiledKnowledgeBase:
+    """
+    A knowledge base compiled into flat arrays.
+
+    Rule r's conditions are condition_ids[condition_offsets[r]:condition_offsets[r + 1]],
+    and the rules that use fact f as a condition are
+    dependent_rules[dependent_offsets[f]:dependent_offsets[f + 1]].
+
+    Attributes:
+        fact_names (list): Fact string for each fact ID
+        fact_ids (dict): Maps each fact string to its ID
+        rule_count (int): Number of rules
+        condition_offsets (array): Start of each rule's conditions (rule_count + 1 entries)
+        condition_ids (array): Condition fact IDs of all rules, one rule after another
+        conclusion_ids (array): Conclusion fact ID of each rule
+        result_type_codes (array): RESULT_TYPE_CODES value of each rule
+        confidences (array): Certainty factor of each rule (floats)
+        condition_counts (array): Number of conditions of each rule
+        dependent_offsets (array): Start of each fact's dependent rules (fact count + 1 entries)
+        dependent_rules (array): Rule numbers that use each fact, one fact after another
+        concluding_offsets (array): Start of each fact's concluding rules (fact count + 1 entries)
+        concluding_rules (array): Rule numbers that conclude each fact, one fact after another
+            (in rule order), used by backward chaining
+        unconditional_rules (array): Rules with no conditions (they always fire)
+    """
+
+    def __init__(self, rules):
+        """
+        Compiles a list of rule dictionaries.
+
+        Args:
+            rules (list): Rule dictionaries with 'if', 'then' and (optionally)
+                'result_type' keys, as used by forward_chaining_inference(), and
+                optionally 'confidence' keys
+        """
+        self.fact_names = []
+        self.fact_ids = {}
+        self.rule_count = len(rules)
+        self.condition_offsets = array('l', [0])
+        self.condition_ids = array('l')
+        self.conclusion_ids = array('l')
+        self.result_type_codes = array('b')
+        self.confidences = array('d')
+        for rule in rules:
+            # Sort the conditions so that compiling the same rules always gives the same arrays
+            for fact in sorted(rule[IF_KEY]):
+                self.condition_ids.append(self._intern(fact))
+            self.condition_offsets.append(len(self.condition_ids))
+            self.conclusion_ids.append(self._intern(rule[THEN_KEY]))
+            self.result_type_codes.append(
+                RESULT_TYPE_CODES.get(rule.get(RESULT_TYPE_KEY), UNKNOWN_RESULT_TYPE_CODE))
+            self.confidences.append(float(rule.get(CONFIDENCE_KEY, DEFAULT_CONFIDENCE)))
+
+        offsets = self.condition_offsets
+        self.condition_counts = array('l', (offsets[r + 1] - offsets[r]
+                                            for r in range(self.rule_count)))
+        self.unconditional_rules = array('l', (r for r in range(self.rule_count)
+                                               if self.condition_counts[r] == 0))
+
+        # Invert the condition lists into per-fact dependent rule lists (counting sort)
+        fact_count = len(self.fact_names)
+        counts = [0] * (fact_count + 1)
+        for fact_id in self.condition_ids:
+            counts[fact_id + 1] += 1
+        for fact_id in range(fact_count):
+            counts[fact_id + 1] += counts[fact_id]
+        self.dependent_offsets = array('l', counts)
+        self.dependent_rules = array('l', [0]) * len(self.condition_ids)
+        next_slot = counts[:fact_count]
+        for rule_number in range(self.rule_count):
+            for position in range(offsets[rule_number], offsets[rule_number + 1]):
+                fact_id = self.condition_ids[position]
+                self.dependent_rules[next_slot[fact_id]] = rule_number
+                next_slot[fact_id] += 1
+
+        # The same for conclusions: the rules that conclude each fact
+        counts = [0] * (fact_count + 1)
+        for fact_id in self.conclusion_ids:
+            counts[fact_id + 1] += 1
+        for fact_id in range(fact_count):
+            counts[fact_id + 1] += counts[fact_id]
+        self.concluding_offsets = array('l', counts)
+        self.concluding_rules = array('l', [0]) * self.rule_count
+        next_slot = counts[:fact_count]
+        for rule_number, fact_id in enumerate(self.conclusion_ids):
+            self.concluding_rules[next_slot[fact_id]] = rule_number
+            next_slot[fact_id] += 1
+
+    def _intern(self, fact):
+        """
+        Returns the ID of a fact, assigning a new ID if the fact has not been seen.
+        """
+        fact_id = self.fact_ids.get(fact)
+        if fact_id is None:
+            fact_id = len(self.fact_names)
+            self.fact_ids[fact] = fact_id
+            self.fact_names.append(fact)
+        return fact_id
+
+    @property
+    def fact_count(self):
+        return len(self.fact_names)
+
+    def get_conditions(self, rule_number):
+        """
+        Returns the condition fact IDs of one rule.
+        """
+        return self.condition_ids[self.condition_offsets[rule_number]:
+                                  self.condition_offsets[rule_number + 1]]
+
+    def get_dependent_rules(self, fact_id):
+        """
+        Returns the numbers of the rules that use a fact as a condition.
+        """
+        return self.dependent_rules[self.dependent_offsets[fact_id]:
+                                    self.dependent_offsets[fact_id + 1]]
+
+    def get_concluding_rules(self, fact_id):
+        """
+        Returns the numbers of the rules that conclude a fact.
+        """
+        return self.concluding_rules[self.concluding_offsets[fact_id]:
+                                     self.concluding_offsets[fact_id + 1]]
+
+
+def compile_knowledge_base(rules):
+    """
+    Compiles a list of rule dictionaries into a CompiledKnowledgeBase.
+    """
+    return CompiledKnowledgeBase(rules)
+
+
+def propagate_facts(compiled, known, unsatisfied, agenda):
+    """
+    Runs forward chaining on compiled rules until no new facts can be derived.
+
+    This is the inference loop shared by compiled_forward_chaining_inference() and
+    anything that keeps inference state between calls. Facts on the agenda must
+    already be marked in `known`; the loop processes each of them once, decrementing
+    the unsatisfied-condition count of every dependent rule and firing rules
+    whose count reaches zero.
+
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        known (bytearray): One entry per fact ID, nonzero if the fact is known.
+            Updated in place.
+        unsatisfied (array): Unsatisfied condition count of each rule. Updated in place.
+        agenda (list): Fact IDs that are known but not yet processed. Emptied.
+
+    Returns:
+        list: IDs of the newly derived facts, in the order they were derived
+    """
+    dependent_offsets = compiled.dependent_offsets
+    dependent_rules = compiled.dependent_rules
+    conclusion_ids = compiled.conclusion_ids
+    derived = []
+    while agenda:
+        fact_id = agenda.pop()
+        for position in range(dependent_offsets[fact_id], dependent_offsets[fact_id + 1]):
+            rule_number = dependent_rules[position]
+            unsatisfied[rule_number] -= 1
+            if unsatisfied[rule_number] == 0:
+                new_fact_id = conclusion_ids[rule_number]
+                if not known[new_fact_id]:
+                    known[new_fact_id] = 1
+                    agenda.append(new_fact_id)
+                    derived.append(new_fact_id)
+    return derived
+
+
+def start_inference(compiled, initial_facts):
+    """
+    Builds the initial inference state for a set of starting facts.
+
+    Facts that do not appear in any rule are ignored, since they can never
+    match a condition. Rules without conditions are fired here.
+
+    Returns:
+        tuple: (known, unsatisfied, agenda, derived) ready for propagate_facts(),
+            where derived lists the IDs of facts derived by unconditional rules
+    """
+    known = bytearray(compiled.fact_count)
+    unsatisfied = array('l', compiled.condition_counts)
+    agenda = []
+    fact_ids = compiled.fact_ids
+    for fact in initial_facts:
+        fact_id = fact_ids.get(fact)
+        if fact_id is not None and not known[fact_id]:
+            known[fact_id] = 1
+            agenda.append(fact_id)
+    derived = []
+    for rule_number in compiled.unconditional_rules:
+        new_fact_id = compiled.conclusion_ids[rule_number]
+        if not known[new_fact_id]:
+            known[new_fact_id] = 1
+            agenda.append(new_fact_id)
+            derived.append(new_fact_id)
+    return known, unsatisfied, agenda, derived
+
+
+def compiled_forward_chaining_inference(compiled, initial_facts):
+    """
+    Performs forward chaining inference on a compiled knowledge base.
+
+    Gives the same derived facts as forward_chaining_inference() on the rules
+    the knowledge base was compiled from.
+
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+
+    Returns:
+        list: A list of newly derived fact strings (excluding the initial facts).
+    """
+    known, unsatisfied, agenda, derived = start_inference(compiled, initial_facts)
+    derived += propagate_facts(compiled, known, unsatisfied, agenda)
+    fact_names = compiled.fact_names
+    return [fact_names[fact_id] for fact_id in derived]
+
+
+# Goal states used by GoalProver
+_UNKNOWN = 0
+_PROVED = 1
+_FAILED = 2
+_IN_PROGRESS = 3
+
+
+class GoalProver:
+    """
+    Answers "can this fact be derived?" by backward chaining on compiled rules.
+
+    Starting from a goal, the prover only visits the rules that conclude it, then
+    the rules that conclude their conditions, and so on. A rule is abandoned at
+    its first condition that cannot be proved, so a targeted query usually
+    touches a small fraction of a large knowledge base. Every goal gives the
+    same answer as checking whether forward chaining derives it.
+
+    Results of subgoals are memoized, so asking about several goals for the same
+    facts (or one goal that shares subgoals between rules) proves each subgoal
+    only once. Cycles (e.g., A concludes B and B concludes A) are detected: a goal
+    that is already being proved further up is treated as unproved at that point.
+    Because that is only an assumption, a failure that relied on it is not
+    memoized until the goal at the top of the cycle has failed too without
+    anything new being proved meanwhile (which shows the assumption held).
+
+    Attributes:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        rules_visited (int): Number of rules examined so far, over all prove() calls
+    """
+
+    def __init__(self, compiled, initial_facts):
+        """
+        Args:
+            compiled (CompiledKnowledgeBase): The compiled rules
+            initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+        """
+        self.compiled = compiled
+        self.rules_visited = 0
+        self._state = bytearray(compiled.fact_count)
+        self._proved_count = 0
+        self._initial_facts = set(initial_facts)
+        for fact in self._initial_facts:
+            fact_id = compiled.fact_ids.get(fact)
+            if fact_id is not None:
+                self._state[fact_id] = _PROVED
+
+    def prove(self, goal):
+        """
+        Checks whether a fact follows from the initial facts.
+
+        Args:
+            goal (str): The fact to prove, e.g. 'diagnosis:influenza'
+
+        Returns:
+            bool: True if forward chaining from the initial facts would derive the
+                goal (or the goal is one of the initial facts)
+        """
+        goal_id = self.compiled.fact_ids.get(goal)
+        if goal_id is None:
+            return goal in self._initial_facts
+        if self._state[goal_id] == _UNKNOWN:
+            self._search(goal_id)
+        return self._state[goal_id] == _PROVED
+
+    def _search(self, goal_id):
+        """
+        Depth-first search for a proof of goal_id, using an explicit stack so
+        long rule chains cannot exceed Python's recursion limit.
+        """
+        compiled = self.compiled
+        state = self._state
+        condition_offsets = compiled.condition_offsets
+        condition_ids = compiled.condition_ids
+        concluding_offsets = compiled.concluding_offsets
+        concluding_rules = compiled.concluding_rules
+        no_dependency = len(condition_ids) + 1   # Deeper than any stack can get
+
+        # Stack position of each goal being proved
+        depth_of = {}
+        # Goals that failed while assuming that an enclosing goal was unproved
+        tentative_failures = []
+        # One frame per goal being proved:
+        # [fact_id, next concluding rule position, end position, next condition
+        #  of that rule, shallowest in-progress goal relied on, proved count at
+        #  start, tentative_failures length at start]
+        stack = []
+
+        def push(fact_id):
+            state[fact_id] = _IN_PROGRESS
+            depth_of[fact_id] = len(stack)
+            stack.append([fact_id, concluding_offsets[fact_id], concluding_offsets[fact_id + 1],
+                          0, no_dependency, self._proved_count, len(tentative_failures)])
+            self.rules_visited += concluding_offsets[fact_id + 1] - concluding_offsets[fact_id] > 0
+
+        push(goal_id)
+        while stack:
+            frame = stack[-1]
+            fact_id, position, end, condition, dependency, _, _ = frame
+            child_id = None
+            proved = False
+            while position < end:
+                rule_number = concluding_rules[position]
+                offset = condition_offsets[rule_number] + condition
+                if offset == condition_offsets[rule_number + 1]:
+                    proved = True   # Every condition of this rule holds
+                    break
+                condition_id = condition_ids[offset]
+                condition_state = state[condition_id]
+                if condition_state == _PROVED:
+                    condition += 1
+                    continue
+                if condition_state == _UNKNOWN:
+                    child_id = condition_id
+                    break
+                if condition_state == _IN_PROGRESS:
+                    dependency = min(dependency, depth_of[condition_id])
+                # This rule cannot fire: move on to the next one
+                position += 1
+                condition = 0
+                if position < end:
+                    self.rules_visited += 1
+            frame[1], frame[3], frame[4] = position, condition, dependency
+            if child_id is not None:
+                push(child_id)
+                continue
+
+            # The goal is settled: report the result to the frame below
+            stack.pop()
+            del depth_of[fact_id]
+            if proved:
+                state[fact_id] = _PROVED
+                self._proved_count += 1
+                dependency = no_dependency
+            elif dependency < len(stack):
+                # Failed by assuming a goal further down the stack is unproved
+                state[fact_id] = _UNKNOWN
+                tentative_failures.append(fact_id)
+            else:
+                # Top of its cycle (or no cycle): the failure is final if nothing
+                # was proved while searching, so the assumptions all held
+                tentative_start = frame[6]
+                final = self._proved_count == frame[5]
+                state[fact_id] = _FAILED if final else _UNKNOWN
+                for tentative_id in tentative_failures[tentative_start:]:
+                    if state[tentative_id] == _UNKNOWN and final:
+                        state[tentative_id] = _FAILED
+                del tentative_failures[tentative_start:]
+                dependency = no_dependency
+            if stack:
+                parent = stack[-1]
+                parent[4] = min(parent[4], dependency)
+                if proved:
+                    parent[3] += 1
+                else:
+                    parent[1] += 1
+                    parent[3] = 0
+                    if parent[1] < parent[2]:
+                        self.rules_visited += 1
+
+
+def compiled_backward_chaining_inference(compiled, initial_facts, goal):
+    """
+    Checks whether one goal follows from the initial facts by backward chaining.
+
+    Use a GoalProver directly to ask about several goals for the same facts.
+
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+        goal (str): The fact to prove, e.g. 'diagnosis:influenza'
+
+    Returns:
+        bool: True if compiled_forward_chaining_inference() would derive the goal
+            (or the goal is one of the initial facts)
+    """
+    return GoalProver(compiled, initial_facts).prove(goal)
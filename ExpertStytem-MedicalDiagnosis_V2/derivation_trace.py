@@ -0,0 +1,182 @@
+# derivation_trace.py
+# Records which rules fired, and in what order, while running forward chaining
+# on a compiled knowledge base, and turns the record into proof trees.
+#
+# Tracing uses its own copy of the inference loop, so the normal loop in
+# compiled_knowledge_base.py has no tracing code in it at all. The record is kept
+# in arrays allocated once before inference starts (a fact can only be derived
+# once, so there can never be more firings than facts).
+
+from array import array
+
+from compiled_knowledge_base import start_inference
+
+
+class ProofNode:
+    """
+    One fact in a proof tree.
+
+    Attributes:
+        fact (str): The fact
+        rule_number (int): Rule that derived the fact (None for an initial fact)
+        conditions (list): ProofNode for each condition of that rule (empty for an initial fact)
+        depth (int): Length of the longest chain of rules above this fact (0 for an initial fact)
+    """
+
+    def __init__(self, fact, rule_number=None, conditions=(), depth=0):
+        self.fact = fact
+        self.rule_number = rule_number
+        self.conditions = list(conditions)
+        self.depth = depth
+
+    def format(self, indent=0):
+        """
+        Returns the tree as indented text, one fact per line.
+        """
+        if self.rule_number is None:
+            lines = [f"{'  ' * indent}{self.fact} (given)"]
+        else:
+            lines = [f"{'  ' * indent}{self.fact} (rule {self.rule_number})"]
+        for condition in self.conditions:
+            lines.append(condition.format(indent + 1))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"ProofNode({self.fact!r}, rule_number={self.rule_number})"
+
+
+class DerivationTrace:
+    """
+    The rule firings of one inference run, in the order they happened.
+
+    Only firings that derived a new fact are recorded. A firing's depth is one
+    more than the deepest of its conditions (initial facts have depth 0): the
+    rules at depth 1 fired on the initial facts alone, like the first pass of
+    forward_chaining_inference(), those at depth 2 needed a fact from depth 1, and so on.
+
+    Attributes:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        firing_count (int): Number of recorded firings
+        rule_numbers (array): Rule number of each firing (first firing_count entries)
+        depths (array): Depth of each firing (first firing_count entries)
+    """
+
+    def __init__(self, compiled, initial_facts):
+        self.compiled = compiled
+        self.firing_count = 0
+        self.rule_numbers = array('l', [0]) * compiled.fact_count
+        self.depths = array('l', [0]) * compiled.fact_count
+        self._initial_facts = set(initial_facts)
+        # Firing that derived each fact ID, -1 for facts that were not derived
+        self._firing_of_fact = array('l', [-1]) * compiled.fact_count
+
+    def get_firings(self):
+        """
+        Returns the firings in order.
+
+        Returns:
+            list: (rule_number, conclusion, conditions, depth) tuples, where
+                conclusion is a fact string and conditions a list of fact strings
+        """
+        compiled = self.compiled
+        fact_names = compiled.fact_names
+        return [(rule_number, fact_names[compiled.conclusion_ids[rule_number]],
+                 [fact_names[fact_id] for fact_id in compiled.get_conditions(rule_number)],
+                 self.depths[firing])
+                for firing, rule_number in enumerate(self.rule_numbers[:self.firing_count])]
+
+    def get_proof(self, fact):
+        """
+        Builds the proof tree of a fact.
+
+        Args:
+            fact (str): A derived or initial fact (e.g., 'diagnosis:influenza')
+
+        Returns:
+            ProofNode: The root of the tree, or None if the fact is not known
+        """
+        fact_id = self.compiled.fact_ids.get(fact)
+        if fact_id is None or self._firing_of_fact[fact_id] < 0:
+            return ProofNode(fact) if fact in self._initial_facts else None
+        return self._build_proof(fact_id, {})
+
+    def _build_proof(self, fact_id, nodes):
+        # nodes caches the node of each fact, since several rules may share a condition
+        node = nodes.get(fact_id)
+        if node is not None:
+            return node
+        compiled = self.compiled
+        firing = self._firing_of_fact[fact_id]
+        if firing < 0:
+            node = ProofNode(compiled.fact_names[fact_id])
+        else:
+            rule_number = self.rule_numbers[firing]
+            node = ProofNode(compiled.fact_names[fact_id], rule_number,
+                             [self._build_proof(condition_id, nodes)
+                              for condition_id in compiled.get_conditions(rule_number)],
+                             self.depths[firing])
+        nodes[fact_id] = node
+        return node
+
+
+def traced_forward_chaining_inference(compiled, initial_facts):
+    """
+    Performs forward chaining like compiled_forward_chaining_inference(), and
+    records every rule firing.
+
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+
+    Returns:
+        tuple: (derived_facts, trace) where derived_facts is the same list
+            compiled_forward_chaining_inference() returns and trace is a DerivationTrace
+    """
+    initial_facts = list(initial_facts)
+    trace = DerivationTrace(compiled, initial_facts)
+    rule_numbers = trace.rule_numbers
+    depths = trace.depths
+    firing_of_fact = trace._firing_of_fact
+    concluding_offsets = compiled.concluding_offsets
+    concluding_rules = compiled.concluding_rules
+
+    known, unsatisfied, agenda, derived = start_inference(compiled, initial_facts)
+    # start_inference() fired the rules without conditions: record them first
+    for fact_id in derived:
+        for position in range(concluding_offsets[fact_id], concluding_offsets[fact_id + 1]):
+            rule_number = concluding_rules[position]
+            if unsatisfied[rule_number] == 0:
+                break
+        firing_of_fact[fact_id] = trace.firing_count
+        rule_numbers[trace.firing_count] = rule_number
+        depths[trace.firing_count] = 1
+        trace.firing_count += 1
+
+    # The same loop as propagate_facts(), plus recording
+    dependent_offsets = compiled.dependent_offsets
+    dependent_rules = compiled.dependent_rules
+    conclusion_ids = compiled.conclusion_ids
+    condition_offsets = compiled.condition_offsets
+    condition_ids = compiled.condition_ids
+    while agenda:
+        fact_id = agenda.pop()
+        for position in range(dependent_offsets[fact_id], dependent_offsets[fact_id + 1]):
+            rule_number = dependent_rules[position]
+            unsatisfied[rule_number] -= 1
+            if unsatisfied[rule_number] == 0:
+                new_fact_id = conclusion_ids[rule_number]
+                if not known[new_fact_id]:
+                    known[new_fact_id] = 1
+                    agenda.append(new_fact_id)
+                    derived.append(new_fact_id)
+                    depth = 0
+                    for offset in range(condition_offsets[rule_number], condition_offsets[rule_number + 1]):
+                        firing = firing_of_fact[condition_ids[offset]]
+                        if firing >= 0 and depths[firing] > depth:
+                            depth = depths[firing]
+                    firing_of_fact[new_fact_id] = trace.firing_count
+                    rule_numbers[trace.firing_count] = rule_number
+                    depths[trace.firing_count] = depth + 1
+                    trace.firing_count += 1
+    fact_names = compiled.fact_names
+    return [fact_names[fact_id] for fact_id in derived], trace
@@ -0,0 +1,183 @@
+# diagnosis_cache.py
+# Bounded cache of diagnosis results, keyed on the set of symptoms.
+# Most real queries repeat a handful of symptom combinations, so caching the
+# results avoids running inference again for the same patient picture.
+
+import threading
+from collections import OrderedDict
+
+# Eviction policies
+CACHE_POLICY_LRU = 'lru'    # Evict the least recently used entry
+CACHE_POLICY_LFU = 'lfu'    # Evict the least frequently used entry (oldest first on ties)
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def make_cache_key(initial_facts):
+    """
+    Builds the cache key for a list of facts.
+
+    Inference only depends on which facts are present, so the key is a frozenset:
+    symptom lists that differ only in order or duplicates share one cache entry.
+    """
+    return frozenset(initial_facts)
+
+
+def _copy_result(result):
+    """
+    Copies a diagnosis result so callers cannot modify the cached lists.
+    """
+    return {key: list(value) for key, value in result.items()}
+
+
+class DiagnosisCache:
+    """
+    A bounded LRU or LFU cache of get_diagnosis() results.
+
+    Every entry belongs to one knowledge base version. When a lookup or insert
+    uses a newer version (because the knowledge base was reloaded), the whole
+    cache is cleared first, so results from old rules are never returned.
+    Lookups and inserts for older versions are ignored.
+
+    Attributes:
+        max_size (int): Maximum number of cached results
+        policy (str): CACHE_POLICY_LRU or CACHE_POLICY_LFU
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, policy=CACHE_POLICY_LRU):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if policy not in (CACHE_POLICY_LRU, CACHE_POLICY_LFU):
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._reset_entries()
+
+    def _reset_entries(self):
+        # LRU: key -> result, ordered from least to most recently used
+        self._entries = OrderedDict()
+        # LFU: key -> use count, and use count -> keys with that count (oldest first)
+        self._counts = {}
+        self._keys_by_count = {}
+        self._min_count = 0
+
+    def _check_version(self, version):
+        """
+        Moves the cache to a newer version (dropping every entry). Returns False
+        for an older version, e.g. from a diagnosis that started before a reload.
+        """
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self._invalidations += 1
+            self._reset_entries()
+            self._version = version
+        return True
+
+    def _count_use(self, key):
+        count = self._counts[key]
+        keys = self._keys_by_count[count]
+        del keys[key]
+        if not keys:
+            del self._keys_by_count[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._keys_by_count.setdefault(count + 1, OrderedDict())[key] = None
+
+    def _evict(self):
+        if self.policy == CACHE_POLICY_LRU:
+            self._entries.popitem(last=False)
+        else:
+            keys = self._keys_by_count[self._min_count]
+            key, _ = keys.popitem(last=False)
+            if not keys:
+                del self._keys_by_count[self._min_count]
+            del self._counts[key]
+            del self._entries[key]
+        self._evictions += 1
+
+    def get(self, key, version):
+        """
+        Looks up a cached result.
+
+        Args:
+            key (frozenset): Key from make_cache_key()
+            version (int): Current knowledge base version
+
+        Returns:
+            dict: A copy of the cached result, or None if it is not cached
+        """
+        with self._lock:
+            result = self._entries.get(key) if self._check_version(version) else None
+            if result is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            if self.policy == CACHE_POLICY_LRU:
+                self._entries.move_to_end(key)
+            else:
+                self._count_use(key)
+            return _copy_result(result)
+
+    def put(self, key, version, result):
+        """
+        Stores a result, evicting an entry if the cache is full.
+
+        Args:
+            key (frozenset): Key from make_cache_key()
+            version (int): Knowledge base version the result was computed with
+            result (dict): Result from get_diagnosis() (a copy is stored)
+        """
+        with self._lock:
+            if not self._check_version(version) or key in self._entries:
+                return
+            if len(self._entries) >= self.max_size:
+                self._evict()
+            self._entries[key] = _copy_result(result)
+            if self.policy == CACHE_POLICY_LFU:
+                self._counts[key] = 1
+                self._keys_by_count.setdefault(1, OrderedDict())[key] = None
+                self._min_count = 1
+
+    def set_version(self, version):
+        """
+        Drops every entry from versions older than `version` (call when the knowledge base is reloaded).
+        """
+        with self._lock:
+            self._check_version(version)
+
+    def clear(self):
+        """
+        Removes every cached result (statistics are kept).
+        """
+        with self._lock:
+            self._reset_entries()
+
+    def get_stats(self):
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: 'hits', 'misses', 'hit_rate' (0.0 to 1.0), 'size', 'max_size',
+                'evictions' and 'invalidations' (times the cache was cleared because
+                the knowledge base version changed)
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,244 @@
+# diagnosis_pipeline.py
+# Command-line streaming pipeline for the medical diagnosis expert system.
+# Reads patient records from a CSV or JSONL file (or stdin), diagnoses each one,
+# and writes one result per record to stdout as soon as it is available.
+#
+# Records are read and written one at a time (through get_diagnoses_batch()), so
+# memory use stays the same no matter how large the input is.
+#
+# Examples:
+#   python diagnosis_pipeline.py patients.jsonl > results.jsonl
+#   python diagnosis_pipeline.py --format csv --workers 4 < patients.csv > results.jsonl
+#
+# Input formats:
+#   JSONL: one JSON object per line, e.g. {"id": 17, "symptoms": ["fever", "cough"]}
+#          ("symptoms" may also be a single comma-separated string)
+#   CSV:   a header row with a "symptoms" column holding comma- or semicolon-separated
+#          symptoms, and an optional "id" column
+
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import deque
+
+from fact_symbols import normalize_facts
+from inference_engine import get_diagnoses_batch, DEFAULT_BATCH_CHUNK_SIZE
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+
+DEFAULT_ID_FIELD = 'id'
+DEFAULT_SYMPTOMS_FIELD = 'symptoms'
+DEFAULT_PROGRESS_INTERVAL = 100000
+
+# Constants for result dictionary keys (same as medical_diagnosis.py)
+DIAGNOSES_KEY = 'diagnoses'
+RECOMMENDATIONS_KEY = 'recommendations'
+
+
+class SkippedRecords:
+    """
+    Counts the malformed records that the readers skip. (Only a count is kept,
+    so memory use does not grow with the number of bad records.)
+
+    Attributes:
+        count (int): Number of records skipped
+    """
+
+    def __init__(self):
+        self.count = 0
+
+
+def normalize_symptoms(symptoms):
+    """
+    Normalizes a record's symptoms the same way as the interactive front end
+    (see fact_symbols.normalize_facts()), dropping empty entries.
+
+    Args:
+        symptoms (str or list): A comma/semicolon-separated string or a list of strings
+
+    Returns:
+        list: Normalized symptom strings
+
+    Raises:
+        ValueError: If symptoms is not a string or a list of strings
+    """
+    if isinstance(symptoms, str):
+        symptoms = symptoms.replace(';', ',').split(',')
+    elif not isinstance(symptoms, list) or not all(isinstance(symptom, str) for symptom in symptoms):
+        raise ValueError("symptoms must be a string or a list of strings")
+    return normalize_facts(symptom for symptom in symptoms if symptom)
+
+
+def read_jsonl_records(stream, id_field, symptoms_field, errors):
+    """
+    Yields (record_id, symptoms) pairs from JSON Lines input.
+
+    Lines that are blank are skipped. Malformed lines (bad JSON, not an object,
+    or symptoms that are not a string or a list of strings) are reported on
+    stderr, counted in errors (a SkippedRecords) and skipped.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            symptoms = normalize_symptoms(record.get(symptoms_field) or [])
+        except (ValueError, AttributeError) as e:
+            errors.count += 1
+            print(f"Line {line_number}: skipped malformed record ({e})", file=sys.stderr)
+            continue
+        yield record.get(id_field, line_number), symptoms
+
+
+def read_csv_records(stream, id_field, symptoms_field, errors):
+    """
+    Yields (record_id, symptoms) pairs from CSV input with a header row.
+    Rows that cannot be parsed (e.g., a field over the csv module's field size
+    limit) or have no symptoms column are reported on stderr, counted in errors
+    (a SkippedRecords) and skipped.
+
+    Raises:
+        ValueError: If the header row has no symptoms column
+        csv.Error: If the header row cannot be parsed
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip().lower() for name in header]
+    if symptoms_field not in header:
+        raise ValueError(f"CSV header has no '{symptoms_field}' column")
+    symptoms_column = header.index(symptoms_field)
+    id_column = header.index(id_field) if id_field in header else None
+    row_number = 0
+    while True:
+        row_number += 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            errors.count += 1
+            print(f"Row {row_number}: skipped malformed record ({e})", file=sys.stderr)
+            continue
+        if not row:
+            continue
+        if symptoms_column >= len(row):
+            errors.count += 1
+            print(f"Row {row_number}: skipped record with missing columns", file=sys.stderr)
+            continue
+        record_id = row[id_column] if id_column is not None and id_column < len(row) else row_number
+        yield record_id, normalize_symptoms(row[symptoms_column])
+
+
+def run_pipeline(records, output, output_format=FORMAT_JSONL, workers=None,
+                 chunk_size=DEFAULT_BATCH_CHUNK_SIZE, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """
+    Diagnoses a stream of records and writes one result per record.
+
+    Args:
+        records (iterable): (record_id, symptoms) pairs
+        output (file): Text stream to write results to
+        output_format (str): FORMAT_JSONL or FORMAT_CSV
+        workers (int): Worker processes for get_diagnoses_batch() (None for in-process)
+        chunk_size (int): Records per chunk for get_diagnoses_batch()
+        progress_interval (int): Report throughput on stderr every this many
+            records (0 to only report at the end)
+
+    Returns:
+        int: Number of records processed
+    """
+    # IDs of records that have been read but whose results have not been written yet.
+    # get_diagnoses_batch() only reads a few chunks ahead, so this stays small.
+    pending_ids = deque()
+
+    def symptom_lists():
+        for record_id, symptoms in records:
+            pending_ids.append(record_id)
+            yield symptoms
+
+    csv_writer = None
+    if output_format == FORMAT_CSV:
+        csv_writer = csv.writer(output)
+        csv_writer.writerow([DEFAULT_ID_FIELD, DIAGNOSES_KEY, RECOMMENDATIONS_KEY])
+
+    start_time = time.perf_counter()
+    count = 0
+    for results in get_diagnoses_batch(symptom_lists(), workers=workers, chunk_size=chunk_size):
+        record_id = pending_ids.popleft()
+        if csv_writer is not None:
+            csv_writer.writerow([record_id, ';'.join(results[DIAGNOSES_KEY]),
+                                 ';'.join(results[RECOMMENDATIONS_KEY])])
+        else:
+            output.write(json.dumps({DEFAULT_ID_FIELD: record_id,
+                                     DIAGNOSES_KEY: results[DIAGNOSES_KEY],
+                                     RECOMMENDATIONS_KEY: results[RECOMMENDATIONS_KEY]}))
+            output.write('\n')
+        count += 1
+        if progress_interval and count % progress_interval == 0:
+            _report_progress(count, start_time)
+    # Final report, unless the last periodic report already covered every record
+    if not progress_interval or count % progress_interval or count == 0:
+        _report_progress(count, start_time)
+    return count
+
+
+def _report_progress(count, start_time):
+    elapsed = time.perf_counter() - start_time
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"{count} records in {elapsed:.1f}s ({rate:,.0f} records/sec)", file=sys.stderr)
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Run with --help for options.
+    """
+    parser = argparse.ArgumentParser(
+        description="Diagnose patient records from CSV or JSONL and write results to stdout.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="Input file (default: '-' for stdin)")
+    parser.add_argument('--format', choices=[FORMAT_CSV, FORMAT_JSONL],
+                        help="Input format (default: from the file extension, or jsonl for stdin)")
+    parser.add_argument('--output-format', choices=[FORMAT_CSV, FORMAT_JSONL], default=FORMAT_JSONL,
+                        help="Output format (default: jsonl)")
+    parser.add_argument('--id-field', default=DEFAULT_ID_FIELD,
+                        help="Field or column holding the record ID (default: id)")
+    parser.add_argument('--symptoms-field', default=DEFAULT_SYMPTOMS_FIELD,
+                        help="Field or column holding the symptoms (default: symptoms)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes (default: diagnose in this process)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_BATCH_CHUNK_SIZE,
+                        help=f"Records per chunk (default: {DEFAULT_BATCH_CHUNK_SIZE})")
+    parser.add_argument('--progress-interval', type=int, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="Report records/sec every N records, 0 for only at the end "
+                             f"(default: {DEFAULT_PROGRESS_INTERVAL})")
+    args = parser.parse_args(argv)
+
+    input_format = args.format
+    if input_format is None:
+        input_format = FORMAT_CSV if args.input.lower().endswith('.csv') else FORMAT_JSONL
+    stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8', newline='')
+    errors = SkippedRecords()
+    try:
+        if input_format == FORMAT_CSV:
+            records = read_csv_records(stream, args.id_field.lower(), args.symptoms_field.lower(), errors)
+        else:
+            records = read_jsonl_records(stream, args.id_field, args.symptoms_field, errors)
+        run_pipeline(records, sys.stdout, args.output_format, args.workers,
+                     args.chunk_size, args.progress_interval)
+    except (ValueError, csv.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    if errors.count:
+        print(f"{errors.count} malformed records skipped", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+# diagnosis_server.py
+# JSON-RPC server that lets other programs get diagnoses from the expert system.
+#
+# Requests and responses are JSON-RPC 2.0 messages, one per line, read from
+# stdin and written to stdout (the default), or exchanged over a local TCP socket.
+# Requests that arrive close together are collected into micro-batches: a batch
+# is sent off when it reaches the maximum batch size, or when its first request
+# has waited the maximum wait time. Each batch is diagnosed with the compiled
+# engine in a pool of worker processes (identical symptom sets in a batch are only
+# diagnosed once), and every request gets its own response as soon as its batch
+# is done. Responses can come back in a different order than the requests, so
+# match them up by "id".
+#
+# Examples:
+#   python diagnosis_server.py
+#   python diagnosis_server.py --tcp --port 8765 --workers 4 --max-batch-size 512 --max-wait-ms 2
+#
+# Methods:
+#   diagnose  params: {"symptoms": ["fever", "cough"]} (or just the list, or a
+#             comma-separated string); result: {"diagnoses": [...], "recommendations": [...]}
+#   metrics   result: the batcher's counters (see MicroBatcher.get_metrics())
+#
+# Example session (stdio):
+#   > {"jsonrpc": "2.0", "id": 1, "method": "diagnose", "params": {"symptoms": ["fever", "cough", "body_aches"]}}
+#   < {"jsonrpc": "2.0", "id": 1, "result": {"diagnoses": ["influenza"], "recommendations": ["rest"]}}
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from diagnosis_pipeline import normalize_symptoms
+from inference_engine import diagnose_chunk, diagnose_chunk_in_worker, expand_chunk_results, init_batch_worker
+from knowledge_base import get_current_knowledge_base
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH_SIZE = 256
+# Longest time (in milliseconds) a request waits for more requests to join its batch
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_WORKERS = 2
+# Number of recent request latencies kept for the latency percentiles in the metrics
+LATENCY_SAMPLE_SIZE = 1000
+
+JSONRPC_VERSION = '2.0'
+METHOD_DIAGNOSE = 'diagnose'
+METHOD_METRICS = 'metrics'
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class MicroBatcher:
+    """
+    Collects concurrent diagnose requests into batches and runs each batch in a
+    worker pool.
+
+    The worker processes are given the compiled knowledge base once, when the
+    pool starts. If the knowledge base is reloaded, the next batch starts a new
+    pool with the new version; batches already running finish on the old one.
+    Workers are spawned rather than forked: a forked worker would inherit locks
+    held by other threads at that moment (e.g., the stdin lock held by the thread
+    serve_stdio() reads requests with) and could block on them forever.
+
+    Attributes:
+        max_batch_size (int): Most requests in one batch
+        max_wait (float): Longest time (seconds) the first request of a batch
+            waits for the batch to fill
+        workers (int): Worker processes; 0 diagnoses in a single background thread
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_MS / 1000,
+                 workers=DEFAULT_WORKERS):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._queue = None
+        self._batch_slots = None
+        self._task = None
+        self._executor = None
+        self._executor_version = None
+        self._diagnose_batch = None
+        # Metrics
+        self._max_queue_depth = 0
+        self._in_flight_requests = 0
+        self._in_flight_batches = 0
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    async def start(self):
+        """
+        Starts collecting batches. Must be called from the event loop that will serve requests.
+        """
+        self._queue = asyncio.Queue()
+        # Bounds the batches being diagnosed at once, so requests wait in the
+        # queue (where they can join bigger batches) while every worker is busy
+        self._batch_slots = asyncio.Semaphore(max(1, self.workers))
+        self._task = asyncio.get_running_loop().create_task(self._collect_batches())
+
+    async def stop(self):
+        """
+        Stops collecting batches and shuts down the worker pool once the running batches are done.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+            self._executor = None
+
+    async def diagnose(self, symptoms):
+        """
+        Diagnoses one patient as part of the next batch.
+
+        Args:
+            symptoms (list): Symptom strings
+
+        Returns:
+            dict: Same format as get_diagnosis()
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((symptoms, future, time.perf_counter()))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return await future
+
+    def get_metrics(self):
+        """
+        Returns the batcher's counters.
+
+        Returns:
+            dict: 'queue_depth' (requests waiting for a batch), 'max_queue_depth',
+                'in_flight_requests' and 'in_flight_batches' (being diagnosed),
+                'requests' and 'batches' (completed), 'mean_batch_size', 'errors'
+                (requests that failed), and 'p50_ms', 'p95_ms' and 'p99_ms'
+                (latency from arrival to result over the last LATENCY_SAMPLE_SIZE requests)
+        """
+        latencies = sorted(self._latencies)
+        metrics = {
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue_depth': self._max_queue_depth,
+            'in_flight_requests': self._in_flight_requests,
+            'in_flight_batches': self._in_flight_batches,
+            'requests': self._requests,
+            'batches': self._batches,
+            'mean_batch_size': self._requests / self._batches if self._batches else 0.0,
+            'errors': self._errors,
+        }
+        for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            index = min(len(latencies) - 1, max(0, round(fraction * len(latencies)) - 1))
+            metrics[name] = latencies[index] * 1000 if latencies else 0.0
+        return metrics
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(queue.get_nowait())
+            await self._batch_slots.acquire()
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        self._in_flight_batches += 1
+        self._in_flight_requests += len(batch)
+        try:
+            executor, diagnose_batch = self._get_executor()
+            unique_results, result_numbers = await asyncio.get_running_loop().run_in_executor(
+                executor, diagnose_batch, [symptoms for symptoms, _, _ in batch])
+            results = expand_chunk_results(unique_results, result_numbers)
+            finished = time.perf_counter()
+            for (_, future, arrived), result in zip(batch, results):
+                self._latencies.append(finished - arrived)
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self._errors += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight_batches -= 1
+            self._in_flight_requests -= len(batch)
+            self._requests += len(batch)
+            self._batches += 1
+            self._batch_slots.release()
+
+    def _get_executor(self):
+        """
+        Returns the worker pool and the function it runs, starting a new pool if
+        there is none yet or the knowledge base has been reloaded.
+        """
+        knowledge_base = get_current_knowledge_base()
+        if self._executor is None or knowledge_base.version != self._executor_version:
+            if self._executor is not None:
+                # Batches already submitted still finish on the old version
+                self._executor.shutdown(wait=False)
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=init_batch_worker,
+                                                     initargs=(knowledge_base.compiled,))
+                self._diagnose_batch = diagnose_chunk_in_worker
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+                self._diagnose_batch = partial(diagnose_chunk, knowledge_base.compiled)
+            self._executor_version = knowledge_base.version
+        return self._executor, self._diagnose_batch
+
+
+class RequestError(Exception):
+    """
+    A request that gets a JSON-RPC error response.
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _get_symptoms(params):
+    """
+    Returns the normalized symptoms of a diagnose request's params.
+
+    Raises:
+        RequestError: If the params hold no list or string of symptoms
+    """
+    if isinstance(params, dict):
+        params = params.get('symptoms')
+    if isinstance(params, str):
+        return normalize_symptoms(params)
+    if not isinstance(params, list) or not all(isinstance(symptom, str) for symptom in params):
+        raise RequestError(INVALID_PARAMS, "params must be {\"symptoms\": [strings]}")
+    return normalize_symptoms(params)
+
+
+async def handle_request(batcher, request):
+    """
+    Handles one decoded JSON-RPC request.
+
+    Returns:
+        dict: The response, or None for a notification (a valid request without an id)
+    """
+    if (not isinstance(request, dict) or request.get('jsonrpc') != JSONRPC_VERSION
+            or not isinstance(request.get('method'), str)):
+        return {'jsonrpc': JSONRPC_VERSION, 'id': None,
+                'error': {'code': INVALID_REQUEST, 'message': "Invalid Request"}}
+    method = request['method']
+    try:
+        if method == METHOD_DIAGNOSE:
+            response = {'result': await batcher.diagnose(_get_symptoms(request.get('params')))}
+        elif method == METHOD_METRICS:
+            response = {'result': batcher.get_metrics()}
+        else:
+            raise RequestError(METHOD_NOT_FOUND, f"Method not found: {method}")
+    except RequestError as e:
+        response = {'error': {'code': e.code, 'message': e.message}}
+    except Exception as e:
+        response = {'error': {'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"}}
+    if 'id' not in request:
+        return None
+    return dict({'jsonrpc': JSONRPC_VERSION, 'id': request['id']}, **response)
+
+
+async def handle_line(batcher, line):
+    """
+    Handles one line of input: a JSON-RPC request, or a JSON array of requests
+    (a JSON-RPC batch, answered with an array of responses).
+
+    Returns:
+        str: The response line (without a newline), or None if there is nothing to send
+    """
+    try:
+        message = json.loads(line)
+    except ValueError:
+        return json.dumps({'jsonrpc': JSONRPC_VERSION, 'id': None,
+                           'error': {'code': PARSE_ERROR, 'message': "Parse error"}})
+    if isinstance(message, list):
+        if not message:
+            return json.dumps({'jsonrpc': JSONRPC_VERSION, 'id': None,
+                               'error': {'code': INVALID_REQUEST, 'message': "Invalid Request"}})
+        responses = await asyncio.gather(*(handle_request(batcher, request) for request in message))
+        responses = [response for response in responses if response is not None]
+        return json.dumps(responses) if responses else None
+    response = await handle_request(batcher, message)
+    return json.dumps(response) if response is not None else None
+
+
+async def serve_stdio(batcher, input_stream=None, output_stream=None):
+    """
+    Serves requests read line by line from stdin, writing responses to stdout,
+    until the input ends. Each line is handled as soon as it is read, so
+    requests sent without waiting for responses are batched together.
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    async def respond(line):
+        response = await handle_line(batcher, line)
+        if response is not None:
+            output_stream.write(response + '\n')
+            output_stream.flush()
+
+    while True:
+        # Reading stdin blocks, so it is done in a thread to keep the event loop running
+        line = await loop.run_in_executor(None, input_stream.readline)
+        if not line:
+            break
+        if line.strip():
+            task = loop.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def serve_tcp(batcher, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Serves requests over TCP, one JSON-RPC message per line, until cancelled.
+    Requests from every connection share the same batches.
+    """
+    async def handle_connection(reader, writer):
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        async def respond(line):
+            response = await handle_line(batcher, line)
+            if response is not None and not writer.is_closing():
+                writer.write(response.encode('utf-8') + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = loop.create_task(respond(line.decode('utf-8')))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, host, port)
+    async with server:
+        print(f"Serving diagnoses on {host}:{port}", file=sys.stderr)
+        await server.serve_forever()
+
+
+async def _report_metrics(batcher, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(batcher.get_metrics()), file=sys.stderr)
+
+
+async def run_server(batcher, tcp=False, host=DEFAULT_HOST, port=DEFAULT_PORT, metrics_interval=0):
+    """
+    Starts the batcher and serves requests over stdio (or TCP) until the input ends.
+
+    Args:
+        batcher (MicroBatcher): The batcher (not started yet)
+        tcp (bool): Serve over TCP instead of stdio
+        host (str): TCP host
+        port (int): TCP port
+        metrics_interval (float): Print the metrics to stderr every this many
+            seconds (0 for never)
+    """
+    # Load the knowledge base before the first request, not while it waits
+    get_current_knowledge_base()
+    await batcher.start()
+    reporter = None
+    if metrics_interval > 0:
+        reporter = asyncio.get_running_loop().create_task(_report_metrics(batcher, metrics_interval))
+    try:
+        if tcp:
+            await serve_tcp(batcher, host, port)
+        else:
+            await serve_stdio(batcher)
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        await batcher.stop()
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Run with --help for options.
+    """
+    parser = argparse.ArgumentParser(description="Serve diagnoses as JSON-RPC over stdio or TCP.")
+    parser.add_argument('--tcp', action='store_true', help="Serve over TCP instead of stdin/stdout")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"TCP host (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Worker processes, 0 for a background thread (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help=f"Most requests per batch (default: {DEFAULT_MAX_BATCH_SIZE})")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="Longest time a request waits for its batch to fill "
+                             f"(default: {DEFAULT_MAX_WAIT_MS})")
+    parser.add_argument('--metrics-interval', type=float, default=0,
+                        help="Print metrics to stderr every this many seconds (default: never)")
+    args = parser.parse_args(argv)
+    if args.max_batch_size < 1:
+        parser.error("--max-batch-size must be at least 1")
+
+    batcher = MicroBatcher(args.max_batch_size, args.max_wait_ms / 1000, args.workers)
+    try:
+        asyncio.run(run_server(batcher, args.tcp, args.host, args.port, args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# diagnosis_session.py
+# Incremental diagnosis for symptoms that arrive one at a time (e.g., a triage
+# conversation).
+#
+# A DiagnosisSession keeps the inference state between calls: which facts are
+# known and how many conditions of each rule are still unsatisfied. Adding a
+# symptom only propagates the consequences of that one fact, instead of running
+# inference again over every symptom seen so far.
+#
+# Example:
+#   session = DiagnosisSession()
+#   session.add_symptom('fever')                  # {'diagnoses': [], 'recommendations': []}
+#   session.add_symptoms(['cough', 'body_aches'])  # {'diagnoses': ['influenza'], 'recommendations': ['rest']}
+#   session.get_results()                          # Everything found so far
+
+from compiled_knowledge_base import propagate_facts, start_inference
+from fact_symbols import normalize_facts
+from inference_engine import extract_goals
+from knowledge_base import get_current_knowledge_base
+
+
+class DiagnosisSession:
+    """
+    The diagnosis state of one patient, updated as symptoms are added.
+
+    The session stays on the knowledge base version that was current when it
+    was created, so its counters stay consistent if the rules are reloaded.
+    Start a new session to use the new rules.
+
+    Attributes:
+        version (int): Knowledge base version the session uses
+        symptoms (list): Symptoms added so far, in order (without duplicates)
+    """
+
+    def __init__(self, initial_symptoms=()):
+        """
+        Starts a session.
+
+        Args:
+            initial_symptoms (iterable): Symptoms already known (may be empty)
+        """
+        knowledge_base = get_current_knowledge_base()
+        self.version = knowledge_base.version
+        self._compiled = knowledge_base.compiled
+        self._known, self._unsatisfied, agenda, derived = start_inference(self._compiled, ())
+        derived += propagate_facts(self._compiled, self._known, self._unsatisfied, agenda)
+        # IDs of every derived fact (not symptoms), in the order they were derived
+        self._derived = derived
+        self.symptoms = []
+        self._symptom_set = set()
+        self.add_symptoms(initial_symptoms)
+
+    def add_symptom(self, symptom):
+        """
+        Adds one symptom and propagates its consequences.
+
+        Args:
+            symptom (str): The new symptom (e.g., 'fever')
+
+        Returns:
+            dict: The diagnoses and recommendations that this symptom added, in
+                the same format as get_diagnosis() (both lists empty if nothing new)
+        """
+        return self.add_symptoms([symptom])
+
+    def add_symptoms(self, symptoms):
+        """
+        Adds several symptoms and propagates their consequences.
+
+        Symptoms are normalized like get_diagnosis() normalizes them. Symptoms
+        that were already added, or that do not appear in any rule, change nothing.
+
+        Args:
+            symptoms (iterable): The new symptoms
+
+        Returns:
+            dict: The diagnoses and recommendations that these symptoms added
+        """
+        agenda = []
+        fact_ids = self._compiled.fact_ids
+        for symptom in normalize_facts(symptoms):
+            if symptom in self._symptom_set:
+                continue
+            self._symptom_set.add(symptom)
+            self.symptoms.append(symptom)
+            fact_id = fact_ids.get(symptom)
+            if fact_id is not None and not self._known[fact_id]:
+                self._known[fact_id] = 1
+                agenda.append(fact_id)
+        derived = propagate_facts(self._compiled, self._known, self._unsatisfied, agenda)
+        self._derived += derived
+        return self._extract(derived)
+
+    def get_results(self):
+        """
+        Returns every diagnosis and recommendation found so far, the same as
+        get_diagnosis(session.symptoms) on this knowledge base version.
+        """
+        return self._extract(fact_id for fact_id in self._derived
+                             if self._compiled.fact_names[fact_id] not in self._symptom_set)
+
+    def _extract(self, derived):
+        fact_names = self._compiled.fact_names
+        return extract_goals([fact_names[fact_id] for fact_id in derived])
@@ -0,0 +1,488 @@
+# differential_test.py
+# Differential testing of the inference engines.
+#
+# Every registered engine (the V1 forward chainers in ../ExpertSystem-MedicalDiagnosis_V1
+# and each V2 engine) runs on the same randomly generated knowledge bases and fact
+# sets, and must derive exactly the same facts and goals as
+# forward_chaining_inference(). The random knowledge bases are small but nasty:
+# rules without conditions, cycles, several rules concluding the same fact,
+# initial facts that rules also conclude, and initial facts no rule mentions.
+# The time each engine takes is recorded too, so a faster engine can be checked
+# and measured with one command.
+#
+# Examples:
+#   python differential_test.py
+#   python differential_test.py --trials 500 --seed 7
+#   python differential_test.py --engines naive,compiled,backward
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from compiled_knowledge_base import GoalProver, compile_knowledge_base, compiled_forward_chaining_inference
+from derivation_trace import traced_forward_chaining_inference
+from inference_engine import (DIAGNOSIS_PREFIX, RECOMMENDATION_PREFIX, extract_goals,
+                              forward_chaining_inference, indexed_forward_chaining_inference)
+from knowledge_base import (IF_KEY, THEN_KEY, RESULT_TYPE_KEY, RESULT_TYPE_INTERMEDIATE,
+                            RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION, KnowledgeBaseVersion,
+                            build_rule_index)
+from rule_graph import build_rule_graph, stratified_forward_chaining_inference
+
+V1_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                            'ExpertSystem-MedicalDiagnosis_V1')
+
+# The engine every other engine is compared with
+REFERENCE_ENGINE = 'naive'
+
+DEFAULT_TRIALS = 100
+DEFAULT_FACT_SETS = 20
+DEFAULT_MAX_RULES = 60
+DEFAULT_MAX_FACTS = 30
+# Most conditions a random rule can have
+MAX_CONDITIONS = 3
+
+_v1_modules = {}   # V1 file name -> module, so each script is only loaded once
+
+
+def load_v1_module(file_name):
+    """
+    Imports one of the V1 scripts as a module. (Their file names contain hyphens,
+    so they cannot be imported with an import statement.)
+
+    Args:
+        file_name (str): File name in the V1 directory, e.g. 'MedicalDiagnosis.py'
+
+    Returns:
+        module: The module, or None if the V1 directory is not next to this one
+    """
+    if file_name in _v1_modules:
+        return _v1_modules[file_name]
+    path = os.path.join(V1_DIRECTORY, file_name)
+    if not os.path.exists(path):
+        return None
+    module_name = 'v1_' + os.path.splitext(file_name)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _v1_modules[file_name] = module
+    return module
+
+
+def _goal_facts(goals):
+    """
+    Converts an extract_goals() dict back to a set of goal fact strings.
+    """
+    return ({DIAGNOSIS_PREFIX + diagnosis for diagnosis in goals['diagnoses']} |
+            {RECOMMENDATION_PREFIX + recommendation for recommendation in goals['recommendations']})
+
+
+def _with_goals(derived_lists):
+    """
+    Pairs each derived fact list with its goals, found by V2 extract_goals().
+    """
+    return [(set(derived), _goal_facts(extract_goals(derived))) for derived in derived_lists]
+
+
+# Each engine's setup function takes the rules and returns a function that takes
+# a list of fact sets and returns a (derived facts, goal facts) pair of sets for
+# each one. Derived facts exclude the initial facts.
+
+def _prepare_v1_medical_diagnosis(rules):
+    module = load_v1_module('MedicalDiagnosis.py')
+    # V1 MedicalDiagnosis.py marks goals with an 'is_goal' flag instead of a result type
+    v1_rules = [{IF_KEY: rule[IF_KEY], THEN_KEY: rule[THEN_KEY],
+                 'is_goal': rule[RESULT_TYPE_KEY] in (RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION)}
+                for rule in rules]
+
+    def run(fact_sets):
+        results = []
+        for facts in fact_sets:
+            derived = module.forward_chaining_inference(v1_rules, facts) - set(facts)
+            # Its extract_goals() also reports initial facts that are goals
+            goals = {goal for goal in module.extract_goals(v1_rules, derived) if goal in derived}
+            results.append((derived, goals))
+        return results
+    return run
+
+
+def _prepare_v1_chained(rules):
+    module = load_v1_module('MedicalDiagnosis-ChainedSearchRuleList.py')
+
+    def run(fact_sets):
+        results = []
+        for facts in fact_sets:
+            derived = module.forward_chaining_inference(rules, facts)
+            goals = module.extract_goals(rules, derived)
+            results.append((set(derived), set(goals['diagnoses']) | set(goals['recommendations'])))
+        return results
+    return run
+
+
+def _prepare_naive(rules):
+    return lambda fact_sets: _with_goals(forward_chaining_inference(rules, facts) for facts in fact_sets)
+
+
+def _prepare_indexed(rules):
+    rule_index = build_rule_index(rules)
+    return lambda fact_sets: _with_goals(indexed_forward_chaining_inference(rules, facts, rule_index)
+                                         for facts in fact_sets)
+
+
+def _prepare_compiled(rules):
+    compiled = compile_knowledge_base(rules)
+    return lambda fact_sets: _with_goals(compiled_forward_chaining_inference(compiled, facts)
+                                         for facts in fact_sets)
+
+
+def _prepare_stratified(rules):
+    graph = build_rule_graph(compile_knowledge_base(rules))
+    return lambda fact_sets: _with_goals(stratified_forward_chaining_inference(graph, facts)
+                                         for facts in fact_sets)
+
+
+def _prepare_traced(rules):
+    compiled = compile_knowledge_base(rules)
+    return lambda fact_sets: _with_goals(traced_forward_chaining_inference(compiled, facts)[0]
+                                         for facts in fact_sets)
+
+
+def _prepare_backward(rules):
+    compiled = compile_knowledge_base(rules)
+
+    def run(fact_sets):
+        derived_lists = []
+        for facts in fact_sets:
+            # Ask about every fact, so the answers should add up to forward chaining's result
+            prover = GoalProver(compiled, facts)
+            initial = set(facts)
+            derived_lists.append([fact for fact in compiled.fact_names
+                                  if fact not in initial and prover.prove(fact)])
+        return _with_goals(derived_lists)
+    return run
+
+
+def _prepare_vectorized(rules):
+    # Imported here because only this engine needs NumPy
+    import numpy as np
+    from vectorized_engine import VectorizedEngine
+    engine = VectorizedEngine(KnowledgeBaseVersion(0, compile_knowledge_base(rules), None))
+
+    def run(fact_sets):
+        fact_sets = list(fact_sets)
+        initial = engine.encode(fact_sets)
+        known = engine.run(initial.copy())
+        derived = np.unpackbits(known & ~initial, axis=1, count=len(fact_sets)).T
+        fact_names = engine.compiled.fact_names
+        return _with_goals([fact_names[fact_id] for fact_id in np.flatnonzero(row)] for row in derived)
+    return run
+
+
+def _prepare_sharded(rules):
+    # Imported here because multiprocessing.shared_memory needs Python 3.8
+    from sharded_engine import ShardedEngine
+    # The shards run in this process: starting worker processes for every random
+    # knowledge base would take longer than the tests, and the rounds are the same
+    engine = ShardedEngine(compile_knowledge_base(rules), shard_count=3, batch_size=8, use_processes=False)
+    return lambda fact_sets: _with_goals(engine.run_batch(fact_sets))
+
+
+# Engine name -> setup function, in the order the engines are run and reported
+ENGINES = {
+    'naive': _prepare_naive,
+    'v1': _prepare_v1_medical_diagnosis,
+    'v1_chained': _prepare_v1_chained,
+    'indexed': _prepare_indexed,
+    'compiled': _prepare_compiled,
+    'stratified': _prepare_stratified,
+    'traced': _prepare_traced,
+    'backward': _prepare_backward,
+    'vectorized': _prepare_vectorized,
+    'sharded': _prepare_sharded,
+}
+
+
+def register_engine(name, prepare):
+    """
+    Adds an engine to the differential tests.
+
+    Args:
+        name (str): Engine name used in reports and on the command line
+        prepare (function): Takes a rule list and returns a function that takes a
+            list of fact lists and returns a (derived facts, goal facts) pair of
+            sets for each one, where derived facts exclude the initial facts
+    """
+    ENGINES[name] = prepare
+
+
+def get_available_engines():
+    """
+    Returns the names of the registered engines that can run here (the V1
+    engines need the V1 directory, the vectorized engine needs NumPy and the
+    sharded engine needs Python 3.8).
+    """
+    available = []
+    for name in ENGINES:
+        if name.startswith('v1') and not os.path.isdir(V1_DIRECTORY):
+            continue
+        if name == 'vectorized':
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                continue
+        if name == 'sharded':
+            try:
+                import multiprocessing.shared_memory  # noqa: F401
+            except ImportError:
+                continue
+        available.append(name)
+    return available
+
+
+def generate_random_rules(rng, rule_count, fact_count):
+    """
+    Generates a random knowledge base.
+
+    Facts are a mix of intermediate facts, diagnoses and recommendations, and
+    each rule gets the result type that matches its conclusion's prefix. Rules
+    may have no conditions, and may conclude any fact, including their own
+    conditions, so cycles are common.
+
+    Args:
+        rng (random.Random): Source of randomness
+        rule_count (int): Number of rules
+        fact_count (int): Number of distinct facts
+
+    Returns:
+        tuple: (rules, facts) where rules is a list of rule dictionaries and
+            facts is the list of every fact the rules may use
+    """
+    facts = []
+    for number in range(fact_count):
+        kind = rng.random()
+        if kind < 0.15:
+            facts.append(f"{DIAGNOSIS_PREFIX}d{number}")
+        elif kind < 0.25:
+            facts.append(f"{RECOMMENDATION_PREFIX}r{number}")
+        else:
+            facts.append(f"f{number}")
+    rules = []
+    for _ in range(rule_count):
+        conclusion = rng.choice(facts)
+        if conclusion.startswith(DIAGNOSIS_PREFIX):
+            result_type = RESULT_TYPE_DIAGNOSIS
+        elif conclusion.startswith(RECOMMENDATION_PREFIX):
+            result_type = RESULT_TYPE_RECOMMENDATION
+        else:
+            result_type = RESULT_TYPE_INTERMEDIATE
+        conditions = set(rng.sample(facts, rng.randint(0, min(MAX_CONDITIONS, fact_count))))
+        rules.append({IF_KEY: conditions, THEN_KEY: conclusion, RESULT_TYPE_KEY: result_type})
+    return rules, facts
+
+
+def generate_fact_sets(rng, facts, count):
+    """
+    Generates random initial fact lists, with the occasional fact that no rule uses.
+    """
+    fact_sets = []
+    for number in range(count):
+        fact_set = rng.sample(facts, rng.randint(0, min(len(facts), 8)))
+        if rng.random() < 0.2:
+            fact_set.append(f"unknown_{number}")
+        fact_sets.append(fact_set)
+    return fact_sets
+
+
+def run_differential_tests(trials=DEFAULT_TRIALS, seed=1, engines=None, fact_sets_per_trial=DEFAULT_FACT_SETS,
+                           max_rules=DEFAULT_MAX_RULES, max_facts=DEFAULT_MAX_FACTS):
+    """
+    Runs every engine on random knowledge bases and compares them with the reference engine.
+
+    Args:
+        trials (int): Number of random knowledge bases
+        seed (int): Random seed, so a failure can be reproduced
+        engines (list): Engine names (default: get_available_engines()). The
+            reference engine (REFERENCE_ENGINE) is always run.
+        fact_sets_per_trial (int): Number of fact sets run on each knowledge base
+        max_rules (int): Most rules in a knowledge base
+        max_facts (int): Most distinct facts in a knowledge base
+
+    Returns:
+        dict: 'trials', 'fact_sets' (total run per engine), 'seconds' (engine
+            name -> total time for setup and inference), and 'mismatches' (list
+            of dicts with 'engine', 'trial', 'rules', 'facts', 'expected' and
+            'actual', where expected and actual are (derived, goals) pairs)
+    """
+    if engines is None:
+        engines = get_available_engines()
+    engines = [REFERENCE_ENGINE] + [engine for engine in engines if engine != REFERENCE_ENGINE]
+    rng = random.Random(seed)
+    seconds = dict.fromkeys(engines, 0.0)
+    mismatches = []
+    for trial in range(trials):
+        rules, facts = generate_random_rules(rng, rng.randint(0, max_rules), rng.randint(1, max_facts))
+        fact_sets = generate_fact_sets(rng, facts, fact_sets_per_trial)
+        expected = None
+        for engine in engines:
+            start = time.perf_counter()
+            results = ENGINES[engine](rules)(fact_sets)
+            seconds[engine] += time.perf_counter() - start
+            if expected is None:
+                expected = results
+                continue
+            for fact_set, want, got in zip(fact_sets, expected, results):
+                if want != got:
+                    mismatches.append({'engine': engine, 'trial': trial, 'rules': rules,
+                                       'facts': fact_set, 'expected': want, 'actual': got})
+    return {
+        'trials': trials,
+        'fact_sets': trials * fact_sets_per_trial,
+        'seconds': seconds,
+        'mismatches': mismatches,
+    }
+
+
+def run_first_match_tests(trials=DEFAULT_TRIALS, seed=1, fact_sets_per_trial=DEFAULT_FACT_SETS,
+                          max_rules=DEFAULT_MAX_RULES, max_facts=DEFAULT_MAX_FACTS):
+    """
+    Checks the V1 direct search engine's index: indexed_lookup_inference() and
+    direct_lookup_batch() must return the same first matching rule as
+    direct_lookup_inference() on random knowledge bases.
+
+    Args:
+        See run_differential_tests().
+
+    Returns:
+        dict: Report in the same format as run_differential_tests(), for the
+            engines 'direct', 'direct_indexed' and 'direct_batch', with
+            'expected' and 'actual' of each mismatch being the rule conclusions
+            found (None if the V1 directory is missing)
+    """
+    module = load_v1_module('MedicalDiagnosis-DirectSearchRuleList.py')
+    if module is None:
+        return None
+    rng = random.Random(seed)
+    engines = {
+        'direct': lambda rules, fact_sets: [module.direct_lookup_inference(rules, facts) for facts in fact_sets],
+        'direct_indexed': lambda rules, fact_sets: _indexed_lookups(module, rules, fact_sets),
+        'direct_batch': lambda rules, fact_sets: module.direct_lookup_batch(rules, fact_sets),
+    }
+    seconds = dict.fromkeys(engines, 0.0)
+    mismatches = []
+    for trial in range(trials):
+        rules, facts = generate_random_rules(rng, rng.randint(0, max_rules), rng.randint(1, max_facts))
+        fact_sets = generate_fact_sets(rng, facts, fact_sets_per_trial)
+        expected = None
+        for engine, run in engines.items():
+            start = time.perf_counter()
+            results = run(rules, fact_sets)
+            seconds[engine] += time.perf_counter() - start
+            if expected is None:
+                expected = results
+                continue
+            for fact_set, want, got in zip(fact_sets, expected, results):
+                if want != got:
+                    mismatches.append({'engine': engine, 'trial': trial, 'rules': rules,
+                                       'facts': fact_set, 'expected': want, 'actual': got})
+    return {
+        'trials': trials,
+        'fact_sets': trials * fact_sets_per_trial,
+        'seconds': seconds,
+        'mismatches': mismatches,
+    }
+
+
+def _indexed_lookups(module, rules, fact_sets):
+    lookup_index = module.build_lookup_index(rules)
+    return [module.indexed_lookup_inference(rules, facts, lookup_index) for facts in fact_sets]
+
+
+def format_report(report):
+    """
+    Formats a run_differential_tests() or run_first_match_tests() report as a
+    text table, with each engine's time relative to the first (reference) engine.
+    """
+    reference_engine = next(iter(report['seconds']))
+    reference_seconds = report['seconds'][reference_engine]
+    mismatch_counts = {}
+    for mismatch in report['mismatches']:
+        mismatch_counts[mismatch['engine']] = mismatch_counts.get(mismatch['engine'], 0) + 1
+    lines = [f"{report['trials']} knowledge bases, {report['fact_sets']} fact sets per engine",
+             f"{'engine':<14} {'seconds':>8} {'relative':>9} {'mismatches':>10}"]
+    for engine, seconds in report['seconds'].items():
+        relative = seconds / reference_seconds if reference_seconds > 0 else 0.0
+        mismatches = '-' if engine == reference_engine else mismatch_counts.get(engine, 0)
+        lines.append(f"{engine:<14} {seconds:>8.3f} {relative:>8.2f}x {mismatches:>10}")
+    return '\n'.join(lines)
+
+
+def format_mismatch(mismatch):
+    """
+    Describes one mismatch: the facts, the rules, and what each engine found.
+    """
+    expected_derived, expected_goals = mismatch['expected']
+    actual_derived, actual_goals = mismatch['actual']
+    lines = [f"{mismatch['engine']} differs from {REFERENCE_ENGINE} in trial {mismatch['trial']}",
+             f"  Initial facts: {sorted(mismatch['facts'])}"]
+    for number, rule in enumerate(mismatch['rules']):
+        lines.append(f"  Rule {number}: {sorted(rule[IF_KEY])} -> {rule[THEN_KEY]}")
+    lines.append(f"  Missing facts: {sorted(expected_derived - actual_derived)}")
+    lines.append(f"  Extra facts: {sorted(actual_derived - expected_derived)}")
+    lines.append(f"  Expected goals: {sorted(expected_goals)}, actual goals: {sorted(actual_goals)}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Run with --help for options. Unless --engines is
+    given, the V1 direct search index is checked too (see run_first_match_tests()).
+
+    Returns:
+        int: 0 if every engine matched the reference engine, 1 otherwise
+    """
+    parser = argparse.ArgumentParser(description="Check that every inference engine derives the same facts.")
+    parser.add_argument('--trials', type=int, default=DEFAULT_TRIALS, help="Number of random knowledge bases")
+    parser.add_argument('--fact-sets', type=int, default=DEFAULT_FACT_SETS,
+                        help="Fact sets per knowledge base")
+    parser.add_argument('--max-rules', type=int, default=DEFAULT_MAX_RULES, help="Most rules per knowledge base")
+    parser.add_argument('--max-facts', type=int, default=DEFAULT_MAX_FACTS, help="Most facts per knowledge base")
+    parser.add_argument('--engines', help="Comma-separated engines to run (default: all available: "
+                                          f"{','.join(get_available_engines())})")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed")
+    args = parser.parse_args(argv)
+
+    engines = None
+    if args.engines:
+        engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+        unknown = [engine for engine in engines if engine not in ENGINES]
+        if unknown:
+            parser.error(f"unknown engine(s): {', '.join(unknown)}")
+
+    report = run_differential_tests(args.trials, args.seed, engines, args.fact_sets,
+                                    args.max_rules, args.max_facts)
+    print(format_report(report))
+    for mismatch in report['mismatches'][:3]:
+        print()
+        print(format_mismatch(mismatch))
+
+    first_match_report = None
+    if engines is None:
+        first_match_report = run_first_match_tests(args.trials, args.seed, args.fact_sets,
+                                                   args.max_rules, args.max_facts)
+    if first_match_report is not None:
+        print()
+        print(format_report(first_match_report))
+        for mismatch in first_match_report['mismatches'][:3]:
+            print()
+            print(f"{mismatch['engine']} differs from direct in trial {mismatch['trial']}: "
+                  f"facts {sorted(mismatch['facts'])}, expected {mismatch['expected']!r}, "
+                  f"actual {mismatch['actual']!r}")
+        if first_match_report['mismatches']:
+            return 1
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# fact_symbols.py
+# Normalizes and interns fact names, so each fact is cleaned up and classified once.
+#
+# Every fact name, whether it comes from the rules or from a patient, is put in
+# one canonical form: trimmed, lowercased, and with spaces replaced by
+# underscores ('Sore Throat' -> 'sore_throat', 'Diagnosis: Influenza' ->
+# 'diagnosis:influenza'). The facts of the rules are interned as FactSymbol
+# objects when the rules are loaded. A FactSymbol is a str (so it works as a
+# dictionary key and compares equal to the plain string), that also knows whether
+# it is a diagnosis or recommendation and its name without the prefix, so
+# extract_goals() only checks an attribute instead of parsing each fact.
+
+from functools import lru_cache
+
+from knowledge_base import RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION
+
+DIAGNOSIS_PREFIX = 'diagnosis:'
+RECOMMENDATION_PREFIX = 'recommendation:'
+# Distinct input strings whose normalized form is remembered
+NORMALIZE_CACHE_SIZE = 65536
+
+
+class FactSymbol(str):
+    """
+    An interned, normalized fact name. Create them with get_symbol() or intern_fact().
+
+    Attributes:
+        goal_type (str): RESULT_TYPE_DIAGNOSIS for 'diagnosis:*' facts,
+            RESULT_TYPE_RECOMMENDATION for 'recommendation:*' facts, else None
+        label (str): The name without the 'diagnosis:'/'recommendation:' prefix
+            (the whole name for other facts)
+    """
+
+    def __new__(cls, name):
+        symbol = super().__new__(cls, name)
+        if name.startswith(DIAGNOSIS_PREFIX):
+            symbol.goal_type = RESULT_TYPE_DIAGNOSIS
+            symbol.label = name[len(DIAGNOSIS_PREFIX):]
+        elif name.startswith(RECOMMENDATION_PREFIX):
+            symbol.goal_type = RESULT_TYPE_RECOMMENDATION
+            symbol.label = name[len(RECOMMENDATION_PREFIX):]
+        else:
+            symbol.goal_type = None
+            symbol.label = str(name)
+        return symbol
+
+    def __reduce__(self):
+        # Unpickled symbols (e.g., from the compiled cache or in a worker process) are interned again
+        return get_symbol, (str(self),)
+
+
+# Normalized name -> FactSymbol, for every fact of the rules loaded so far
+_symbols = {}
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_fact_name(name):
+    """
+    Returns the canonical form of a fact name: trimmed, lowercased, runs of
+    whitespace replaced by one underscore, and no spaces around the ':' of a prefix.
+
+    Example:
+        >>> normalize_fact_name(' Diagnosis: Common  Cold ')
+        'diagnosis:common_cold'
+    """
+    name = name.strip().lower()
+    if ':' in name:
+        prefix, _, rest = name.partition(':')
+        name = prefix.strip() + ':' + rest.strip()
+    return '_'.join(name.split())
+
+
+def get_symbol(name):
+    """
+    Returns the interned FactSymbol of an already normalized fact name, creating it if needed.
+    """
+    symbol = _symbols.get(name)
+    if symbol is None:
+        symbol = _symbols.setdefault(name, FactSymbol(name))
+    return symbol
+
+
+def find_symbol(name):
+    """
+    Returns the interned FactSymbol of an already normalized fact name, or None if
+    no rule loaded so far uses it. Unlike get_symbol(), never interns the name.
+    """
+    return _symbols.get(name)
+
+
+def intern_fact(name):
+    """
+    Normalizes a fact name from the rules and returns its interned FactSymbol.
+    """
+    return get_symbol(normalize_fact_name(name))
+
+
+def normalize_facts(facts):
+    """
+    Normalizes fact names given by a user (e.g., symptoms), dropping empty ones.
+
+    Facts that appear in the rules come back as their FactSymbol; other facts
+    come back as normalized plain strings (they are not interned, so arbitrary
+    input does not fill the symbol table).
+
+    Args:
+        facts (iterable): Fact strings
+
+    Returns:
+        list: Normalized facts, in the same order
+    """
+    normalized = []
+    for fact in facts:
+        name = normalize_fact_name(fact)
+        if name:
+            symbol = find_symbol(name)
+            normalized.append(name if symbol is None else symbol)
+    return normalized
+
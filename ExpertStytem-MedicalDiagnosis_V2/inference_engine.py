@@ -3,10 +3,36 @@
 # Code generated by Gemini Flash 2.5 10/6/2025
 # Refactored extensively by Brian Bird 10/11/2025
 
-from knowledge_base import KNOWLEDGE_BASE, IF_KEY, THEN_KEY, RESULT_TYPE_KEY, RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-DIAGNOSIS_PREFIX = 'diagnosis:'
-RECOMMENDATION_PREFIX = 'recommendation:'
+from knowledge_base import (IF_KEY, THEN_KEY, RESULT_TYPE_KEY, RESULT_TYPE_DIAGNOSIS,
+                            RESULT_TYPE_RECOMMENDATION, build_rule_index, add_reload_listener,
+                            get_current_knowledge_base)
+from compiled_knowledge_base import GoalProver, compiled_forward_chaining_inference
+from diagnosis_cache import DiagnosisCache, make_cache_key
+from derivation_trace import traced_forward_chaining_inference
+from fact_symbols import (DIAGNOSIS_PREFIX, RECOMMENDATION_PREFIX, FactSymbol, find_symbol,
+                          normalize_fact_name, normalize_facts)
+
+# Result key added by get_diagnosis(explain=True)
+TRACE_KEY = 'trace'
+
+# Number of symptom lists handed to a worker process at a time by get_diagnoses_batch()
+DEFAULT_BATCH_CHUNK_SIZE = 1000
+
+# Set to False to run inference on every call to get_diagnosis()
+USE_DIAGNOSIS_CACHE = True
+# Set to True to look diagnoses up in a table of every combination of symptoms
+# (see closure_table.py); only used if the rules have few enough symptoms
+USE_CLOSURE_TABLE = False
+# Results of recent get_diagnosis() calls; cleared automatically when the knowledge base is reloaded
+DIAGNOSIS_CACHE = DiagnosisCache()
+add_reload_listener(lambda knowledge_base: DIAGNOSIS_CACHE.set_version(knowledge_base.version))
+
+# Compiled knowledge base sent to each get_diagnoses_batch() worker process
+_worker_compiled_knowledge_base = None
 
 def forward_chaining_inference(rules, initial_facts):
     """
@@ -56,6 +82,58 @@ def forward_chaining_inference(rules, initial_facts):
     derived_facts = list(facts - set(initial_facts))
     return derived_facts
 
+def indexed_forward_chaining_inference(rules, initial_facts, rule_index=None):
+    """
+    Performs forward chaining inference using a fact-to-rules index.
+    
+    Produces the same derived facts as forward_chaining_inference(), but instead
+    of rescanning every rule until nothing changes, it keeps a count of the
+    unsatisfied conditions of each rule (the idea behind the Rete algorithm):
+    1. Every known fact is put on an agenda
+    2. Taking a fact from the agenda decrements the count of each rule that uses it
+    3. When a rule's count reaches zero the rule fires, and its conclusion
+       (if new) is added to the facts and to the agenda
+    
+    Each fact is processed once and only touches the rules that reference it, so
+    the work is proportional to the number of condition occurrences rather than
+    rules times passes.
+    
+    Args:
+        rules (list): A list of rule dictionaries (same format as forward_chaining_inference)
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+        rule_index (tuple): Optional index from build_rule_index(rules). Pass it
+            in when running many queries against the same rules.
+    
+    Returns:
+        list: A list of newly derived fact strings (excluding the initial facts).
+    """
+    if rule_index is None:
+        rule_index = build_rule_index(rules)
+    fact_to_rules, condition_counts = rule_index
+    facts = set(initial_facts)
+    unsatisfied = list(condition_counts)
+    agenda = list(facts)
+    derived_facts = []
+    # Rules without conditions fire unconditionally
+    for rule_number, count in enumerate(unsatisfied):
+        if count == 0:
+            new_fact = rules[rule_number][THEN_KEY]
+            if new_fact not in facts:
+                facts.add(new_fact)
+                agenda.append(new_fact)
+                derived_facts.append(new_fact)
+    while agenda:
+        fact = agenda.pop()
+        for rule_number in fact_to_rules.get(fact, ()):
+            unsatisfied[rule_number] -= 1
+            if unsatisfied[rule_number] == 0:
+                new_fact = rules[rule_number][THEN_KEY]
+                if new_fact not in facts:
+                    facts.add(new_fact)
+                    agenda.append(new_fact)
+                    derived_facts.append(new_fact)
+    return derived_facts
+
 def extract_goals(derived_facts):
     """
     Extracts and categorizes final diagnoses and recommendations from derived facts.
@@ -73,16 +151,27 @@ def extract_goals(derived_facts):
     Notes:
         - Intermediate facts are filtered out and not included in results
         - Order of facts in returned lists matches order they appear in rules
+        - Facts of loaded rules are FactSymbols that already know their type and
+          name without the prefix (see fact_symbols.py); plain strings are
+          looked up in the same symbol table, and ones not in it are classified
+          by their prefix (without interning them)
     """
-    # Extract diagnoses by finding facts with 'diagnosis:' prefix and removing the prefix
-    diagnoses = [fact.split(':', 1)[1] for fact in derived_facts 
-                 if fact.startswith('diagnosis:')]
-    # Extract recommendations by finding facts with 'recommendation:' prefix and removing the prefix
-    recommendations = [fact.split(':', 1)[1] for fact in derived_facts 
-                       if fact.startswith(RECOMMENDATION_PREFIX)]
+    diagnoses = []
+    recommendations = []
+    for fact in derived_facts:
+        symbol = fact if type(fact) is FactSymbol else find_symbol(fact)
+        if symbol is not None:
+            if symbol.goal_type == RESULT_TYPE_DIAGNOSIS:
+                diagnoses.append(symbol.label)
+            elif symbol.goal_type == RESULT_TYPE_RECOMMENDATION:
+                recommendations.append(symbol.label)
+        elif fact.startswith(DIAGNOSIS_PREFIX):
+            diagnoses.append(fact[len(DIAGNOSIS_PREFIX):])
+        elif fact.startswith(RECOMMENDATION_PREFIX):
+            recommendations.append(fact[len(RECOMMENDATION_PREFIX):])
     return {"diagnoses": diagnoses, "recommendations": recommendations}
 
-def get_diagnosis(initial_facts):
+def get_diagnosis(initial_facts, explain=False):
     """
     High-level function to obtain diagnoses and recommendations from symptoms.
     This is the main entry point for the inference engine, providing a simple
@@ -91,17 +180,179 @@ def get_diagnosis(initial_facts):
         initial_facts (iterable): An iterable (typically list) of starting fact
             strings, usually representing patient symptoms (e.g., ['fever', 'cough']).
             Can be any facts that match conditions in the knowledge base rules.
+            Facts are normalized first (see fact_symbols.py), so 'Sore Throat',
+            'SORE_THROAT' and 'sore_throat' are the same fact.
+        explain (bool): If True, also record which rules fired (bypassing the
+            cache and the closure table).
+            Tracing runs a separate copy of the inference loop, so it costs
+            nothing when it is off.
     
     Returns:
         dict: A dictionary containing two keys:
             - 'diagnoses' (list): Derived diagnostic conclusions
             - 'recommendations' (list): Suggested actions or treatments
             Both lists may be empty if no conclusions could be drawn.
+            With explain=True there is a third key, 'trace': a DerivationTrace
+            (see derivation_trace.py) whose get_proof() gives the proof tree of
+            each diagnosis or recommendation.
     
     Raises:
         KeyError: If rules in KNOWLEDGE_BASE are missing required keys
         TypeError: If initial_facts is not iterable
     """
-    derived_facts = forward_chaining_inference(KNOWLEDGE_BASE, initial_facts)
+    initial_facts = normalize_facts(initial_facts)
+    # Use one knowledge base version throughout, even if the rules are reloaded meanwhile
+    knowledge_base = get_current_knowledge_base()
+    if explain:
+        derived_facts, trace = traced_forward_chaining_inference(knowledge_base.compiled, initial_facts)
+        results = extract_goals(derived_facts)
+        results[TRACE_KEY] = trace
+        return results
+    if USE_CLOSURE_TABLE:
+        closure_table = knowledge_base.closure_table
+        if closure_table is not None:
+            results = closure_table.lookup(initial_facts)
+            if results is not None:
+                return results
+    if USE_DIAGNOSIS_CACHE:
+        cache_key = make_cache_key(initial_facts)
+        results = DIAGNOSIS_CACHE.get(cache_key, knowledge_base.version)
+        if results is not None:
+            return results
+    derived_facts = compiled_forward_chaining_inference(knowledge_base.compiled, initial_facts)
     results = extract_goals(derived_facts)
+    if USE_DIAGNOSIS_CACHE:
+        DIAGNOSIS_CACHE.put(cache_key, knowledge_base.version, results)
     return results
+
+def query_goal(initial_facts, goal):
+    """
+    Checks whether one goal follows from the symptoms, using backward chaining.
+    
+    Answers a targeted question such as "is influenza a diagnosis for these
+    symptoms?" without deriving every reachable fact: only the rules that can
+    contribute to the goal are examined (see GoalProver in compiled_knowledge_base.py).
+    
+    Args:
+        initial_facts (iterable): Starting fact strings (e.g., ['fever', 'cough'])
+        goal (str): The full goal fact, e.g. 'diagnosis:influenza' or
+            'recommendation:rest'
+    
+    Returns:
+        bool: True if get_diagnosis() would report the goal for the same symptoms
+    
+    Example:
+        >>> query_goal(['fever', 'cough', 'body_aches'], DIAGNOSIS_PREFIX + 'influenza')
+        True
+    """
+    return GoalProver(get_current_knowledge_base().compiled,
+                      normalize_facts(initial_facts)).prove(normalize_fact_name(goal))
+
+def get_diagnosis_cache_stats():
+    """
+    Returns the hit/miss statistics of the get_diagnosis() cache (see DiagnosisCache.get_stats()).
+    """
+    return DIAGNOSIS_CACHE.get_stats()
+
+def get_diagnoses_batch(symptom_lists, workers=None, chunk_size=DEFAULT_BATCH_CHUNK_SIZE):
+    """
+    Obtains diagnoses and recommendations for many patients.
+    
+    Works like calling get_diagnosis() on each symptom list, but is built for
+    high-volume processing:
+    - The compiled knowledge base is shared by every record (and sent to each
+      worker process once, not once per record)
+    - Symptom lists are processed in chunks, and identical symptom sets within
+      a chunk (regardless of order or duplicates) are only diagnosed once
+    - With workers > 1, chunks are diagnosed in parallel by a process pool
+    
+    Results are yielded in the same order as the input. The input is read lazily
+    and only a few chunks per worker are in progress at once, so memory use does
+    not grow with the number of records.
+    
+    Args:
+        symptom_lists (iterable): An iterable of symptom lists (each an iterable
+            of fact strings, as accepted by get_diagnosis())
+        workers (int): Number of worker processes. None or 1 diagnoses in this process.
+        chunk_size (int): Number of symptom lists per chunk (default: 1000)
+    
+    Yields:
+        dict: One result per symptom list, in the same format as get_diagnosis()
+    """
+    # The whole batch runs on the version current when it starts, even if the rules are reloaded
+    compiled = get_current_knowledge_base().compiled
+    symptom_lists = iter(symptom_lists)
+    chunks = iter(lambda: list(islice(symptom_lists, chunk_size)), [])
+    if not workers or workers <= 1:
+        for chunk in chunks:
+            yield from expand_chunk_results(*diagnose_chunk(compiled, chunk))
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker,
+                             initargs=(compiled,)) as executor:
+        # Keep a bounded number of chunks in flight so the input is not read all at once
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(diagnose_chunk_in_worker, chunk))
+            if len(in_flight) >= 2 * workers:
+                yield from expand_chunk_results(*in_flight.popleft().result())
+        while in_flight:
+            yield from expand_chunk_results(*in_flight.popleft().result())
+
+def diagnose_chunk(compiled, chunk):
+    """
+    Diagnoses one chunk of symptom lists, diagnosing each distinct symptom set once.
+    Used by get_diagnoses_batch() and the micro-batches of diagnosis_server.py.
+    
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled knowledge base to diagnose with
+        chunk (list): Symptom lists (each an iterable of fact strings)
+    
+    Returns:
+        tuple: (unique_results, result_numbers) where result_numbers[i] is the
+            position in unique_results of the result for chunk[i]
+    """
+    result_numbers_by_key = {}
+    unique_results = []
+    result_numbers = []
+    for symptoms in chunk:
+        symptoms = normalize_facts(symptoms)
+        key = frozenset(symptoms)
+        result_number = result_numbers_by_key.get(key)
+        if result_number is None:
+            result_number = len(unique_results)
+            result_numbers_by_key[key] = result_number
+            derived_facts = compiled_forward_chaining_inference(compiled, symptoms)
+            unique_results.append(extract_goals(derived_facts))
+        result_numbers.append(result_number)
+    return unique_results, result_numbers
+
+def expand_chunk_results(unique_results, result_numbers):
+    """
+    Yields one result per record of a chunk, copying results shared by duplicate
+    records so callers can modify each result independently.
+    
+    Args:
+        unique_results (list): Results, as returned by diagnose_chunk()
+        result_numbers (list): Positions in unique_results, as returned by diagnose_chunk()
+    """
+    used = [False] * len(unique_results)
+    for result_number in result_numbers:
+        result = unique_results[result_number]
+        if used[result_number]:
+            result = {key: list(value) for key, value in result.items()}
+        used[result_number] = True
+        yield result
+
+def init_batch_worker(compiled):
+    """
+    Process pool initializer: stores the compiled knowledge base in the worker,
+    for diagnose_chunk_in_worker().
+    """
+    global _worker_compiled_knowledge_base
+    _worker_compiled_knowledge_base = compiled
+
+def diagnose_chunk_in_worker(chunk):
+    """
+    Runs diagnose_chunk() in a worker process started with init_batch_worker().
+    """
+    return diagnose_chunk(_worker_compiled_knowledge_base, chunk)
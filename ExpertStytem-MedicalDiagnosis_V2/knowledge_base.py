@@ -6,19 +6,40 @@
 # Refactored by Brian Bird 10/11/2025
 
 import csv
+import hashlib
+import io
+import os
+import pickle
+import threading
 
 HARD_CODED_RULES = False  # Set to False to load rules from CSV file
+# Relative paths are resolved relative to this file's folder, not the current working directory
 CSV_PATH = 'medical_diagnosis.csv'
+# Set to False to always parse and compile the CSV file instead of reusing the compiled cache
+USE_COMPILED_CACHE = True
+# The compiled cache is stored next to the CSV file, with this added to its name
+COMPILED_CACHE_SUFFIX = '.cache'
+# Increment when the format of the cached data changes, so old cache files are ignored
+COMPILED_CACHE_FORMAT = 4
+# Set to True to remove duplicate, subsumed and unreachable rules when the rules are
+# loaded (see rule_analyzer.py). Diagnoses of symptoms do not change, but the
+# certainty factors of certainty_inference.py can, since it counts every rule as evidence.
+PRUNE_REDUNDANT_RULES = False
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Constants for rule dictionary keys
 IF_KEY = "if"
 AND_KEY = "and"
 THEN_KEY = "then"
 RESULT_TYPE_KEY = "result_type"
+CONFIDENCE_KEY = "confidence"   # Optional certainty factor of a rule, 0.0 to 1.0
 # Constants for result_type values
 RESULT_TYPE_INTERMEDIATE = "INTERMEDIATE"
 RESULT_TYPE_DIAGNOSIS = "DIAGNOSIS"
 RESULT_TYPE_RECOMMENDATION = "RECOMMENDATION"
+# Certainty factor of rules without a confidence
+DEFAULT_CONFIDENCE = 1.0
 
 
 HARDCODED_KNOWLEDGE_BASE = [
@@ -26,53 +47,209 @@ HARDCODED_KNOWLEDGE_BASE = [
     {
         IF_KEY: {"fever", "cough"},
         THEN_KEY: "suspect_flu",
-        RESULT_TYPE_KEY: RESULT_TYPE_INTERMEDIATE
+        RESULT_TYPE_KEY: RESULT_TYPE_INTERMEDIATE,
+        CONFIDENCE_KEY: 0.7
     },
     # Rule 2: Suspect Migraine
     {
         IF_KEY: {"headache", "nausea"},
         THEN_KEY: "suspect_migraine",
-        RESULT_TYPE_KEY: RESULT_TYPE_INTERMEDIATE
+        RESULT_TYPE_KEY: RESULT_TYPE_INTERMEDIATE,
+        CONFIDENCE_KEY: 0.6
     },
     # Rule 3: Diagnosis Influenza
     {
         IF_KEY: {"suspect_flu", "body_aches"},
         THEN_KEY: "diagnosis:influenza",
-        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS
+        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS,
+        CONFIDENCE_KEY: 0.8
     },
     # Rule 4: Diagnosis Common Cold
     {
         IF_KEY: {"suspect_flu", "sore_throat"},
         THEN_KEY: "diagnosis:common_cold",
-        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS
+        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS,
+        CONFIDENCE_KEY: 0.6
     },
     # Rule 5: Diagnosis Migraine
     {
         IF_KEY: {"suspect_migraine", "light_sensitivity"},
         THEN_KEY: "diagnosis:migraine",
-        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS
+        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS,
+        CONFIDENCE_KEY: 0.9
     },
     # Rule 6: Recommendation for Influenza
     {
         IF_KEY: {"diagnosis:influenza"},
         THEN_KEY: "recommendation:rest",
-        RESULT_TYPE_KEY: RESULT_TYPE_RECOMMENDATION
+        RESULT_TYPE_KEY: RESULT_TYPE_RECOMMENDATION,
+        CONFIDENCE_KEY: 1.0
     },
     # Rule 7: Recommendation for Migraine
     {
         IF_KEY: {"diagnosis:migraine"},
         THEN_KEY: "recommendation:dark_room",
-        RESULT_TYPE_KEY: RESULT_TYPE_RECOMMENDATION
+        RESULT_TYPE_KEY: RESULT_TYPE_RECOMMENDATION,
+        CONFIDENCE_KEY: 1.0
     },
     # Rule 8: Diagnosis Food Poisoning
     {
         IF_KEY: {"no_appetite", "stomach_pain"},
         THEN_KEY: "diagnosis:food_poisoning",
-        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS
+        RESULT_TYPE_KEY: RESULT_TYPE_DIAGNOSIS,
+        CONFIDENCE_KEY: 0.7
     },
 ]
 
 
+def build_rule_index(rules):
+    """
+    Builds an index from each fact to the rules that use it as a condition.
+    
+    The index lets the inference engine find the rules affected by a new fact
+    directly, instead of rescanning every rule (see indexed_forward_chaining_inference).
+    
+    Args:
+        rules (list): A list of rule dictionaries with 'if' and 'then' keys
+    
+    Returns:
+        tuple: (fact_to_rules, condition_counts) where
+            - fact_to_rules (dict): Maps each condition fact to a list of the
+              positions (in rules) of the rules that need it
+            - condition_counts (list): Number of distinct conditions of each rule
+    """
+    fact_to_rules = {}
+    condition_counts = []
+    for rule_number, rule in enumerate(rules):
+        conditions = rule[IF_KEY]
+        for fact in conditions:
+            fact_to_rules.setdefault(fact, []).append(rule_number)
+        condition_counts.append(len(conditions))
+    return fact_to_rules, condition_counts
+
+def intern_rule_facts(rules):
+    """
+    Returns copies of rules with every fact name normalized and interned (see fact_symbols.py).
+    """
+    # Imported here because fact_symbols imports the constants from this module
+    from fact_symbols import intern_fact
+    interned = []
+    for rule in rules:
+        rule = dict(rule)
+        rule[IF_KEY] = {intern_fact(fact) for fact in rule[IF_KEY]}
+        rule[THEN_KEY] = intern_fact(rule[THEN_KEY])
+        interned.append(rule)
+    return interned
+
+def _is_condition_column(name):
+    """
+    Returns True for the 'if' column and for 'and' columns ('and', 'and2', 'and_3', ...).
+    """
+    if name == IF_KEY or name == AND_KEY:
+        return True
+    return name.startswith(AND_KEY) and name[len(AND_KEY):].lstrip('_').isdigit()
+
+def _parse_confidence(text, line_number):
+    """
+    Converts a confidence cell to a float between 0.0 and 1.0.
+    
+    Raises:
+        ValueError: If the cell is not a number in that range
+    """
+    try:
+        confidence = float(text)
+    except ValueError:
+        raise ValueError(f"Line {line_number}: confidence must be a number, got {text!r}")
+    if not 0.0 <= confidence <= 1.0:
+        raise ValueError(f"Line {line_number}: confidence must be between 0 and 1, got {text!r}")
+    return confidence
+
+def load_indexed_knowledge_base_from_csv(csv_path):
+    """
+    Loads rules from a CSV file and builds their fact-to-rules index in the same pass.
+
+    CSV Format Expected:
+        - Header row with an 'if' column, any number of 'and' columns, a 'then'
+          column and a 'result_type' column. Repeated 'and' headers are allowed,
+          as are numbered ones ('and2', 'and_3', ...), so rules can have any
+          number of conditions.
+        - Empty condition cells are ignored, so rules in one file can have
+          different numbers of conditions.
+        - Fact names are normalized and interned (see fact_symbols.py), so
+          'Sore Throat' in the file is the fact 'sore_throat'.
+        - An optional 'confidence' column holds each rule's certainty factor
+          (0.0 to 1.0). It is converted to a float; rules with an empty cell
+          have no 'confidence' key (DEFAULT_CONFIDENCE is used).
+    
+    The file is read in a single bulk read and parsed by position (no dictionary
+    per row), which keeps loading fast for files with 100k+ rules.
+    
+    Args:
+        csv_path (str): File path to the CSV file containing rules.
+    
+    Returns:
+        tuple: (rules, rule_index) where rules is the list described in
+            load_knowledge_base_from_csv() and rule_index is the same as
+            build_rule_index(rules) would return
+    
+    Raises:
+        FileNotFoundError: If the CSV file does not exist at the specified path
+        csv.Error: If the CSV file is malformed or cannot be parsed
+        KeyError: If the 'if' or 'then' column is missing from the CSV header
+        ValueError: If a confidence is not a number between 0 and 1
+        UnicodeDecodeError: If the file encoding is not UTF-8 compatible
+    """
+    # Imported here because fact_symbols imports the constants from this module
+    from fact_symbols import intern_fact
+
+    with open(resolve_path(csv_path), 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    rules = []
+    fact_to_rules = {}
+    condition_counts = []
+    if header is None:
+        return rules, (fact_to_rules, condition_counts)
+
+    header = [name.strip().lower() for name in header]
+    for required in (IF_KEY, THEN_KEY):
+        if required not in header:
+            raise KeyError(required)
+    condition_columns = [i for i, name in enumerate(header) if _is_condition_column(name)]
+    then_column = header.index(THEN_KEY)
+    other_columns = [(i, name) for i, name in enumerate(header)
+                     if i != then_column and i not in condition_columns]
+    confidence_column = header.index(CONFIDENCE_KEY) if CONFIDENCE_KEY in header else None
+    width = len(header)
+
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row += [''] * (width - len(row))
+        conditions = {intern_fact(row[i]) for i in condition_columns if row[i].strip()}
+        rule = {IF_KEY: conditions, THEN_KEY: intern_fact(row[then_column])}
+        # Any other columns (e.g., 'result_type') are kept as additional keys
+        for i, name in other_columns:
+            rule[name] = row[i]
+        if confidence_column is not None:
+            confidence = row[confidence_column].strip()
+            if confidence:
+                rule[CONFIDENCE_KEY] = _parse_confidence(confidence, reader.line_num)
+            else:
+                del rule[CONFIDENCE_KEY]
+        rule_number = len(rules)
+        for fact in conditions:
+            rule_numbers = fact_to_rules.get(fact)
+            if rule_numbers is None:
+                fact_to_rules[fact] = [rule_number]
+            else:
+                rule_numbers.append(rule_number)
+        condition_counts.append(len(conditions))
+        rules.append(rule)
+    return rules, (fact_to_rules, condition_counts)
+
 def load_knowledge_base_from_csv(csv_path):
     """
     Loads and parses medical diagnosis rules from a CSV file into rule dictionaries.
@@ -80,57 +257,349 @@ def load_knowledge_base_from_csv(csv_path):
     CSV Format Expected:
         - Header row with columns: 'if', 'and', 'then', 'result_type'
         - 'if': Primary condition (required for most rules)
-        - 'and': Secondary condition (optional, can be empty)
+        - 'and': Additional condition (optional, can be empty). The column can be
+          repeated for rules with more than two conditions.
         - 'then': Conclusion derived when conditions are met
         - 'result_type': Classification (INTERMEDIATE, DIAGNOSIS, or RECOMMENDATION)
+        - 'confidence': Certainty factor of the rule, 0.0 to 1.0 (optional)
     
     Transformation Process:
-        1. Reads CSV with DictReader (assumes lowercase headers)
-        2. Combines 'if' and 'and' values into a single set stored under 'if' key
-        3. Removes the 'and' key from each rule dictionary
-        4. Returns list of transformed rule dictionaries
+        1. Reads the whole file and parses it with csv.reader
+        2. Combines the 'if' and 'and' values into a single set stored under 'if' key
+        3. Returns list of rule dictionaries (the 'and' columns are not kept)
     
     Args:
-        csv_path (str): File path to the CSV file containing rules. Path can be
-            relative to the current working directory or absolute.
+        csv_path (str): File path to the CSV file containing rules. Relative
+            paths are resolved relative to this file's folder.
     
     Returns:
         list: A list of rule dictionaries, each containing:
             - 'if' (set): Set of condition facts (combined from 'if' and 'and' columns)
             - 'then' (str): Conclusion fact derived when conditions are satisfied
             - 'result_type' (str): Type classification of the conclusion
+            - 'confidence' (float): Certainty factor, if the CSV has one for the rule
             - Any other columns from CSV are preserved as additional keys
          
     Raises:
         FileNotFoundError: If the CSV file does not exist at the specified path
         csv.Error: If the CSV file is malformed or cannot be parsed
         KeyError: If required columns are missing from the CSV header
+        ValueError: If a confidence is not a number between 0 and 1
         UnicodeDecodeError: If the file encoding is not UTF-8 compatible
-    
-    Notes:
-        - Header row must exist and use lowercase column names
-        - The 'and' key is intentionally removed to simplify rule structure
-    """
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rules = []
-        for row in reader:
-            # Build a set combining both 'if' and 'and' conditions
-            # This allows rules to have one or two conditions
-            if_set = set()
-            if row.get(IF_KEY):
-                if_set.add(row[IF_KEY])
-            if row.get(AND_KEY):
-                if_set.add(row[AND_KEY])
-            row[IF_KEY] = if_set
-            # Remove the 'and' key since conditions are now combined in 'if'
-            if AND_KEY in row:
-                del row[AND_KEY]
-            rules.append(row)
+    """
+    rules, _ = load_indexed_knowledge_base_from_csv(csv_path)
     return rules
 
-# Load the knowledge base based on the HARD_CODED_RULES flag
-if HARD_CODED_RULES:
-    KNOWLEDGE_BASE = HARDCODED_KNOWLEDGE_BASE
-else:
-    KNOWLEDGE_BASE = load_knowledge_base_from_csv(CSV_PATH)
+def resolve_path(path):
+    """
+    Resolves a rule file path: relative paths are relative to this file's folder.
+    """
+    return path if os.path.isabs(path) else os.path.join(PACKAGE_DIR, path)
+
+def _read_compiled_cache(cache_path, csv_stat, csv_path, prune=False):
+    """
+    Returns the cache contents (a dict) if the cache matches the CSV file (and
+    was built with the same prune setting), else None.
+    
+    The cache is trusted if the CSV file's modification time and size are
+    unchanged. Otherwise the file's SHA-256 hash is compared, so touching or
+    copying the file without changing its contents does not force a rebuild.
+    """
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except Exception:
+        # A missing, truncated or otherwise unreadable cache is simply rebuilt
+        return None
+    if not isinstance(cached, dict) or cached.get('format') != COMPILED_CACHE_FORMAT:
+        return None
+    if cached.get('pruned', False) != prune:
+        return None
+    if cached['mtime_ns'] != csv_stat.st_mtime_ns or cached['size'] != csv_stat.st_size:
+        if cached['sha256'] != _hash_file(csv_path):
+            return None
+        # Same contents: refresh the stored timestamp so the next check is cheap
+        _write_compiled_cache(cache_path, csv_stat, cached['sha256'],
+                              cached['compiled'], cached['rules'], prune)
+    return cached
+
+def _write_compiled_cache(cache_path, csv_stat, sha256, compiled, rules_pickle, prune=False):
+    """
+    Writes the compiled cache atomically. Failures (e.g., a read-only folder) are ignored.
+    """
+    cached = {
+        'format': COMPILED_CACHE_FORMAT,
+        'pruned': prune,
+        'mtime_ns': csv_stat.st_mtime_ns,
+        'size': csv_stat.st_size,
+        'sha256': sha256,
+        'compiled': compiled,
+        # The rule dictionaries are stored pre-pickled: they are only unpickled
+        # if get_knowledge_base() is called, since inference only needs 'compiled'
+        'rules': rules_pickle,
+    }
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def _hash_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _load_csv_with_cache(csv_path, use_cache, prune=False):
+    """
+    Loads a CSV rule file, using the compiled cache if possible. If prune is
+    True, the redundant rules are removed (see rule_analyzer.prune_rules()).
+    
+    Returns:
+        tuple: (compiled, load_rules) where load_rules() returns (rules, rule_index)
+    """
+    # Imported here because compiled_knowledge_base imports the constants from this module
+    from compiled_knowledge_base import compile_knowledge_base
+
+    csv_path = resolve_path(csv_path)
+    cache_path = csv_path + COMPILED_CACHE_SUFFIX
+    if use_cache:
+        csv_stat = os.stat(csv_path)
+        cached = _read_compiled_cache(cache_path, csv_stat, csv_path, prune)
+        if cached is not None:
+            rules_pickle = cached['rules']
+            return cached['compiled'], lambda: pickle.loads(rules_pickle)
+    rules, rule_index = load_indexed_knowledge_base_from_csv(csv_path)
+    if prune:
+        rules, rule_index = _prune_rules(rules, rule_index)
+    compiled = compile_knowledge_base(rules)
+    if use_cache:
+        rules_pickle = pickle.dumps((rules, rule_index), protocol=pickle.HIGHEST_PROTOCOL)
+        _write_compiled_cache(cache_path, csv_stat, _hash_file(csv_path), compiled, rules_pickle, prune)
+    return compiled, lambda: (rules, rule_index)
+
+def _prune_rules(rules, rule_index=None):
+    """
+    Removes the redundant rules (see rule_analyzer.py).
+
+    Returns:
+        tuple: (rules, rule_index) for the remaining rules
+    """
+    # Imported here because rule_analyzer imports this module
+    from rule_analyzer import analyze_rules, prune_rules
+    analysis = analyze_rules(rules, rule_index)
+    if not analysis['redundant_rules']:
+        return rules, rule_index if rule_index is not None else build_rule_index(rules)
+    rules = prune_rules(rules, analysis)
+    return rules, build_rule_index(rules)
+
+def load_compiled_knowledge_base_from_csv(csv_path, use_cache=True):
+    """
+    Loads the compiled form of the rules in a CSV file.
+    
+    Parsing and compiling a large rule file takes much longer than reading back
+    the result, so the result is saved in a cache file next to the CSV file
+    (CSV name + COMPILED_CACHE_SUFFIX) and reused while the CSV file is unchanged.
+    
+    Args:
+        csv_path (str): Path to the CSV file (relative paths are resolved with resolve_path())
+        use_cache (bool): Read and write the compiled cache (default: True)
+    
+    Returns:
+        CompiledKnowledgeBase: The compiled rules
+    """
+    compiled, _ = _load_csv_with_cache(csv_path, use_cache)
+    return compiled
+
+def load_knowledge_base(csv_path=None):
+    """
+    Loads the rules selected by the HARD_CODED_RULES flag (or the rules in
+    csv_path, if given), pruned if PRUNE_REDUNDANT_RULES is set.
+    
+    Args:
+        csv_path (str): Optional CSV file to load instead of the selected source
+    
+    Returns:
+        tuple: (compiled, load_rules) where compiled is the CompiledKnowledgeBase
+            and load_rules() returns (rules, rule_index): a new list of rule
+            dictionaries (hard-coded or from CSV_PATH) and its index from build_rule_index()
+    """
+    if csv_path is None and HARD_CODED_RULES:
+        from compiled_knowledge_base import compile_knowledge_base
+        rules = intern_rule_facts(HARDCODED_KNOWLEDGE_BASE)
+        if PRUNE_REDUNDANT_RULES:
+            rules, rule_index = _prune_rules(rules)
+            return compile_knowledge_base(rules), lambda: (rules, rule_index)
+        return compile_knowledge_base(rules), lambda: (rules, build_rule_index(rules))
+    return _load_csv_with_cache(csv_path if csv_path is not None else CSV_PATH,
+                                USE_COMPILED_CACHE, PRUNE_REDUNDANT_RULES)
+
+class KnowledgeBaseVersion:
+    """
+    One loaded version of the knowledge base.
+    
+    A version never changes after it is created: reloading the knowledge base
+    builds a new KnowledgeBaseVersion and swaps it in. Code that takes a version
+    at the start of a diagnosis (see get_current_knowledge_base()) can finish on
+    that version even if the rules are reloaded in the meantime.
+    
+    Attributes:
+        version (int): Version number, incremented on every load
+        compiled (CompiledKnowledgeBase): The compiled rules
+    """
+
+    def __init__(self, version, compiled, load_rules):
+        self.version = version
+        self.compiled = compiled
+        self._load_rules = load_rules
+        self._rules = None
+        self._rule_graph = None
+        self._closure_table = None
+        self._closure_table_built = False
+        self._lock = threading.Lock()
+
+    def _get_rules(self):
+        # The rule dictionaries are only built when asked for; inference only needs compiled
+        if self._rules is None:
+            with self._lock:
+                if self._rules is None:
+                    self._rules = self._load_rules()
+        return self._rules
+
+    @property
+    def rules(self):
+        """
+        The list of rule dictionaries.
+        """
+        return self._get_rules()[0]
+
+    @property
+    def rule_index(self):
+        """
+        The fact-to-rules index of the rules (see build_rule_index()).
+        """
+        return self._get_rules()[1]
+
+    @property
+    def rule_graph(self):
+        """
+        The RuleGraph of the rules (see rule_graph.py), built the first time it is used.
+        """
+        if self._rule_graph is None:
+            # Imported here because rule_graph imports this module
+            from rule_graph import build_rule_graph
+            with self._lock:
+                if self._rule_graph is None:
+                    self._rule_graph = build_rule_graph(self.compiled)
+        return self._rule_graph
+
+    @property
+    def closure_table(self):
+        """
+        The ClosureTable of the rules (see closure_table.py), built the first time
+        it is used, or None if the rules have too many symptoms for one.
+        """
+        if not self._closure_table_built:
+            # Imported here because closure_table imports this module
+            from closure_table import build_closure_table
+            with self._lock:
+                if not self._closure_table_built:
+                    self._closure_table = build_closure_table(self.compiled)
+                    self._closure_table_built = True
+        return self._closure_table
+
+def get_current_knowledge_base():
+    """
+    Returns the current KnowledgeBaseVersion, loading the knowledge base on first use.
+    
+    Importing this module does not read any files; the rules are loaded the
+    first time they are needed.
+    """
+    current = _current
+    if current is None:
+        # Double-checked so that concurrent first calls only load the rules once
+        with _load_lock:
+            if _current is None:
+                _install(*load_knowledge_base())
+            current = _current
+    return current
+
+def _install(compiled, load_rules):
+    global _current, _last_version
+    _last_version += 1
+    # A single assignment, so other threads see either the old or the new version
+    _current = KnowledgeBaseVersion(_last_version, compiled, load_rules)
+    for listener in list(_reload_listeners):
+        listener(_current)
+
+def get_knowledge_base():
+    """
+    Returns the list of rules of the current version, loading it on first use.
+    """
+    return get_current_knowledge_base().rules
+
+def get_knowledge_base_index():
+    """
+    Returns the fact-to-rules index of the knowledge base (see build_rule_index()),
+    loading the knowledge base on first use.
+    """
+    return get_current_knowledge_base().rule_index
+
+def get_compiled_knowledge_base():
+    """
+    Returns the compiled form of the knowledge base (a CompiledKnowledgeBase),
+    loading the knowledge base on first use.
+    """
+    return get_current_knowledge_base().compiled
+
+def reload_knowledge_base(csv_path=None):
+    """
+    Reloads the knowledge base from its source (e.g., after the CSV file has been edited).
+    
+    The new rules are loaded and compiled before anything changes, so diagnoses
+    keep running on the old version in the meantime. Then the new version is
+    swapped in and the reload listeners are called (see add_reload_listener()).
+    If loading fails, the exception is raised and the old version stays current.
+    Reloads are done one at a time, so the last reload to start is the one that
+    stays installed.
+    
+    Args:
+        csv_path (str): Optional CSV file to load instead of the source selected
+            by HARD_CODED_RULES and CSV_PATH
+    
+    Returns:
+        int: The new knowledge base version
+    """
+    # Diagnoses never take this lock once the rules are loaded, so they keep running
+    with _load_lock:
+        _install(*load_knowledge_base(csv_path))
+        return _current.version
+
+def get_knowledge_base_version():
+    """
+    Returns the version of the knowledge base. It changes every time the rules are reloaded.
+    """
+    return get_current_knowledge_base().version
+
+def add_reload_listener(listener):
+    """
+    Registers a function to call with the new KnowledgeBaseVersion whenever the
+    knowledge base is (re)loaded, e.g. to drop caches built from the old rules.
+    """
+    _reload_listeners.append(listener)
+
+def __getattr__(name):
+    # KNOWLEDGE_BASE is loaded lazily: 'from knowledge_base import KNOWLEDGE_BASE'
+    # still works, but only reads the rules when that import runs
+    if name == 'KNOWLEDGE_BASE':
+        return get_knowledge_base()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# The current KnowledgeBaseVersion (selected by the HARD_CODED_RULES flag), loaded on first use
+_current = None
+_last_version = 0
+_reload_listeners = []
+_load_lock = threading.Lock()
@@ -0,0 +1,132 @@
+# knowledge_base_watcher.py
+# Watches the rule file and reloads the knowledge base when it changes, so rules
+# can be updated without restarting the program.
+#
+# The watcher runs in a background thread. When the CSV file's modification time
+# or size changes, it loads and compiles the new rules (see reload_knowledge_base())
+# while diagnoses keep running on the old version, then swaps the new version in.
+# Diagnoses that already started finish on the version they started with.
+#
+# Example:
+#   watcher = start_watching()
+#   ...
+#   stop_watching()
+
+import os
+import sys
+import threading
+
+import knowledge_base
+from knowledge_base import reload_knowledge_base, resolve_path
+
+DEFAULT_POLL_INTERVAL = 2.0  # Seconds between checks of the rule file
+
+
+class KnowledgeBaseWatcher:
+    """
+    Polls the rule file and reloads the knowledge base from it when it changes.
+
+    If a reload fails (e.g., the file is half-written or has a missing column),
+    the old version stays in use, the error is reported on stderr and kept in
+    last_error, and the reload is tried again the next time the file changes.
+
+    Attributes:
+        path (str): The rule file being watched
+        poll_interval (float): Seconds between checks
+        reload_count (int): Number of successful reloads
+        last_error (Exception): The error from the last failed reload (None if it succeeded)
+    """
+
+    def __init__(self, path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = resolve_path(path if path is not None else knowledge_base.CSV_PATH)
+        self.poll_interval = poll_interval
+        self.reload_count = 0
+        self.last_error = None
+        self._last_signature = self._get_signature()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _get_signature(self):
+        """
+        Returns (modification time, size) of the rule file, or None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        """
+        Reloads the knowledge base if the rule file changed since the last check.
+
+        Returns:
+            bool: True if the knowledge base was reloaded
+        """
+        signature = self._get_signature()
+        if signature is None or signature == self._last_signature:
+            return False
+        self._last_signature = signature
+        try:
+            version = reload_knowledge_base(self.path)
+        except Exception as e:
+            self.last_error = e
+            print(f"Knowledge base reload failed, keeping the current rules: {e}", file=sys.stderr)
+            return False
+        self.last_error = None
+        self.reload_count += 1
+        print(f"Knowledge base reloaded from {self.path} (version {version})", file=sys.stderr)
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.check()
+
+    def start(self):
+        """
+        Starts watching in a daemon thread.
+        """
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='KnowledgeBaseWatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching and waits for the thread to finish.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+
+_watcher = None
+
+
+def start_watching(path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Starts the shared watcher (if it is not already running) and returns it.
+
+    Args:
+        path (str): Rule file to watch (default: knowledge_base.CSV_PATH)
+        poll_interval (float): Seconds between checks
+
+    Returns:
+        KnowledgeBaseWatcher: The running watcher
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = KnowledgeBaseWatcher(path, poll_interval)
+        _watcher.start()
+    return _watcher
+
+
+def stop_watching():
+    """
+    Stops the shared watcher started by start_watching().
+    """
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -2,8 +2,9 @@
 # Console interface for the medical diagnosis expert system.
 # Code by Brian Bird using GitHub Copilot with GPT-4.1, 10/11/2025
 
+from fact_symbols import normalize_facts
 from inference_engine import get_diagnosis
-from knowledge_base import KNOWLEDGE_BASE, IF_KEY, AND_KEY
+from knowledge_base import get_knowledge_base, IF_KEY, AND_KEY
 
 # Constants for result dictionary keys
 DIAGNOSES_KEY = 'diagnoses'
@@ -35,7 +36,7 @@ def main():
     """
     # Collect all possible symptoms from the 'IF' and 'AND' properties in the knowledge base
     possible_symptoms = set()
-    for rule in KNOWLEDGE_BASE:
+    for rule in get_knowledge_base():
         if IF_KEY in rule and rule[IF_KEY]:
             # Handle both set and string values for IF_KEY
             if isinstance(rule[IF_KEY], set):
@@ -54,8 +55,8 @@ def main():
     print("Enter your symptoms, separated by commas (case-insensitive):")
     print("Examples: fever,cough OR Fever, Cough, Body_Aches")
     user_input = input("Symptoms: ")
-    # Split input by comma, strip whitespace, and filter out empty strings
-    symptoms = [s.strip().lower() for s in user_input.split(',') if s.strip()]
+    # Split input by comma and normalize each symptom (case, spaces), dropping empty ones
+    symptoms = normalize_facts(user_input.split(','))
     if not symptoms:
         print("No symptoms entered. Exiting.")
         return
@@ -3,129 +3,375 @@
 # Code generated by Gemini Flash 2.5 10/6/2025
 # Refactored extensively by Brian Bird 10/11 and 10/25/2025
 
-from inference_engine import get_diagnosis
-
-print("--- Scenario 1: Influenza Chain ---")
-patient_facts_1 = ['fever', 'cough', 'body_aches']
-goal_recommendations_1 = get_diagnosis(patient_facts_1)
-print("Expected Diagnoses: influenza")
-print("Actual Diagnoses:", *(goal_recommendations_1.get('diagnoses') or ['None']))
-print("Expected Recommendations: rest")
-print("Actual Recommendations:", *(goal_recommendations_1.get('recommendations') or ['None']))
-passed_1 = (goal_recommendations_1.get('diagnoses') == ['influenza'] and 
-            goal_recommendations_1.get('recommendations') == ['rest'])
-print("Result: PASS" if passed_1 else "Result: FAIL")
-print()
-
-print("--- Scenario 2: Common Cold ---")
-patient_facts_2 = ['fever', 'cough', 'sore_throat']
-goal_recommendations_2 = get_diagnosis(patient_facts_2)
-print("Expected Diagnoses: common_cold")
-print("Actual Diagnoses:", *(goal_recommendations_2.get('diagnoses') or ['None']))
-print("Expected Recommendations: None")
-print("Actual Recommendations:", *(goal_recommendations_2.get('recommendations') or ['None']))
-passed_2 = (goal_recommendations_2.get('diagnoses') == ['common_cold'] and 
-            goal_recommendations_2.get('recommendations') == [])
-print("Result: PASS" if passed_2 else "Result: FAIL")
-print()
-
-print("--- Scenario 3: Migraine ---")
-patient_facts_3 = ['headache', 'nausea', 'light_sensitivity']
-goal_recommendations_3 = get_diagnosis(patient_facts_3)
-print("Expected Diagnoses: migraine")
-print("Actual Diagnoses:", *(goal_recommendations_3.get('diagnoses') or ['None']))
-print("Expected Recommendations: dark_room")
-print("Actual Recommendations:", *(goal_recommendations_3.get('recommendations') or ['None']))
-passed_3 = (goal_recommendations_3.get('diagnoses') == ['migraine'] and 
-            goal_recommendations_3.get('recommendations') == ['dark_room'])
-print("Result: PASS" if passed_3 else "Result: FAIL")
-print()
-
-print("--- Scenario 4: Food Poisoning ---")
-patient_facts_4 = ['no_appetite', 'stomach_pain']
-goal_recommendations_4 = get_diagnosis(patient_facts_4)
-print("Expected Diagnoses: food_poisoning")
-print("Actual Diagnoses:", *(goal_recommendations_4.get('diagnoses') or ['None']))
-print("Expected Recommendations: None")
-print("Actual Recommendations:", *(goal_recommendations_4.get('recommendations') or ['None']))
-passed_4 = (goal_recommendations_4.get('diagnoses') == ['food_poisoning'] and 
-            goal_recommendations_4.get('recommendations') == [])
-print("Result: PASS" if passed_4 else "Result: FAIL")
-print()
-
-# Additional tests for edge cases
-
-print("--- Scenario 5: Empty Symptoms ---")
-patient_facts_5 = []
-goal_recommendations_5 = get_diagnosis(patient_facts_5)
-print("Expected Diagnoses: None")
-print("Actual Diagnoses:", *(goal_recommendations_5.get('diagnoses') or ['None']))
-print("Expected Recommendations: None")
-print("Actual Recommendations:", *(goal_recommendations_5.get('recommendations') or ['None']))
-passed_5 = (goal_recommendations_5.get('diagnoses') == [] and 
-            goal_recommendations_5.get('recommendations') == [])
-print("Result: PASS" if passed_5 else "Result: FAIL")
-print()
-
-print("--- Scenario 6: Unknown Symptoms ---")
-patient_facts_6 = ['unicorn_sneeze', 'dragon_cough']
-goal_recommendations_6 = get_diagnosis(patient_facts_6)
-print("Expected Diagnoses: None")
-print("Actual Diagnoses:", *(goal_recommendations_6.get('diagnoses') or ['None']))
-print("Expected Recommendations: None")
-print("Actual Recommendations:", *(goal_recommendations_6.get('recommendations') or ['None']))
-passed_6 = (goal_recommendations_6.get('diagnoses') == [] and 
-            goal_recommendations_6.get('recommendations') == [])
-print("Result: PASS" if passed_6 else "Result: FAIL")
-print()
-
-print("--- Scenario 7: Case Insensitivity Test ---")
-patient_facts_7a = ['fever', 'cough', 'sore_throat']
-patient_facts_7b = ['FEVER', 'COUGH', 'SORE_THROAT']
-patient_facts_7c = ['Fever', 'Cough', 'Sore Throat']
-results_7a = get_diagnosis(patient_facts_7a)
-results_7b = get_diagnosis(patient_facts_7b)
-results_7c = get_diagnosis(patient_facts_7c)
-print("Expected: All three should produce common_cold diagnosis")
-print("Actual Lowercase diagnoses:", *(results_7a.get('diagnoses') or ['None']))
-print("Actual Uppercase diagnoses:", *(results_7b.get('diagnoses') or ['None']))
-print("Actual Mixed case diagnoses:", *(results_7c.get('diagnoses') or ['None']))
-print("Expected Results match: True")
-print("Actual Results match:", results_7a == results_7b == results_7c)
-passed_7 = (results_7a == results_7b == results_7c and 
-            results_7a.get('diagnoses') == ['common_cold'])
-print("Result: PASS" if passed_7 else "Result: FAIL")
-print()
-
-print("--- Scenario 8: Symptom Order Independence ---")
-patient_facts_8a = ['fever', 'cough', 'body_aches']
-patient_facts_8b = ['body_aches', 'fever', 'cough']
-patient_facts_8c = ['cough', 'body_aches', 'fever']
-results_8a = get_diagnosis(patient_facts_8a)
-results_8b = get_diagnosis(patient_facts_8b)
-results_8c = get_diagnosis(patient_facts_8c)
-print("Expected: All three should produce influenza diagnosis")
-print("Actual Order 1 diagnoses:", *(results_8a.get('diagnoses') or ['None']))
-print("Actual Order 2 diagnoses:", *(results_8b.get('diagnoses') or ['None']))
-print("Actual Order 3 diagnoses:", *(results_8c.get('diagnoses') or ['None']))
-print("Expected Results match: True")
-print("Actual Results match:", results_8a == results_8b == results_8c)
-passed_8 = (results_8a == results_8b == results_8c and 
-            results_8a.get('diagnoses') == ['influenza'])
-print("Result: PASS" if passed_8 else "Result: FAIL")
-print()
-
-print("--- Scenario 9: Duplicate Symptoms ---")
-patient_facts_9a = ['fever', 'cough', 'body_aches']
-patient_facts_9b = ['fever', 'fever', 'cough', 'cough', 'body_aches', 'body_aches']
-results_9a = get_diagnosis(patient_facts_9a)
-results_9b = get_diagnosis(patient_facts_9b)
-print("Expected: Both should produce influenza diagnosis")
-print("Actual No duplicates diagnoses:", *(results_9a.get('diagnoses') or ['None']))
-print("Actual With duplicates diagnoses:", *(results_9b.get('diagnoses') or ['None']))
-print("Expected Results match: True")
-print("Actual Results match:", results_9a == results_9b)
-passed_9 = (results_9a == results_9b and 
-            results_9a.get('diagnoses') == ['influenza'])
-print("Result: PASS" if passed_9 else "Result: FAIL")
-print()
+from inference_engine import get_diagnosis, get_diagnoses_batch, query_goal
+from diagnosis_session import DiagnosisSession
+from certainty_inference import get_ranked_diagnosis
+
+# The scenarios only run when this file is run directly: Scenario 20 starts worker
+# processes, which import this file again under the 'spawn' start method (Windows, macOS)
+if __name__ == "__main__":
+    print("--- Scenario 1: Influenza Chain ---")
+    patient_facts_1 = ['fever', 'cough', 'body_aches']
+    goal_recommendations_1 = get_diagnosis(patient_facts_1)
+    print("Expected Diagnoses: influenza")
+    print("Actual Diagnoses:", *(goal_recommendations_1.get('diagnoses') or ['None']))
+    print("Expected Recommendations: rest")
+    print("Actual Recommendations:", *(goal_recommendations_1.get('recommendations') or ['None']))
+    passed_1 = (goal_recommendations_1.get('diagnoses') == ['influenza'] and 
+                goal_recommendations_1.get('recommendations') == ['rest'])
+    print("Result: PASS" if passed_1 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 2: Common Cold ---")
+    patient_facts_2 = ['fever', 'cough', 'sore_throat']
+    goal_recommendations_2 = get_diagnosis(patient_facts_2)
+    print("Expected Diagnoses: common_cold")
+    print("Actual Diagnoses:", *(goal_recommendations_2.get('diagnoses') or ['None']))
+    print("Expected Recommendations: None")
+    print("Actual Recommendations:", *(goal_recommendations_2.get('recommendations') or ['None']))
+    passed_2 = (goal_recommendations_2.get('diagnoses') == ['common_cold'] and 
+                goal_recommendations_2.get('recommendations') == [])
+    print("Result: PASS" if passed_2 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 3: Migraine ---")
+    patient_facts_3 = ['headache', 'nausea', 'light_sensitivity']
+    goal_recommendations_3 = get_diagnosis(patient_facts_3)
+    print("Expected Diagnoses: migraine")
+    print("Actual Diagnoses:", *(goal_recommendations_3.get('diagnoses') or ['None']))
+    print("Expected Recommendations: dark_room")
+    print("Actual Recommendations:", *(goal_recommendations_3.get('recommendations') or ['None']))
+    passed_3 = (goal_recommendations_3.get('diagnoses') == ['migraine'] and 
+                goal_recommendations_3.get('recommendations') == ['dark_room'])
+    print("Result: PASS" if passed_3 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 4: Food Poisoning ---")
+    patient_facts_4 = ['no_appetite', 'stomach_pain']
+    goal_recommendations_4 = get_diagnosis(patient_facts_4)
+    print("Expected Diagnoses: food_poisoning")
+    print("Actual Diagnoses:", *(goal_recommendations_4.get('diagnoses') or ['None']))
+    print("Expected Recommendations: None")
+    print("Actual Recommendations:", *(goal_recommendations_4.get('recommendations') or ['None']))
+    passed_4 = (goal_recommendations_4.get('diagnoses') == ['food_poisoning'] and 
+                goal_recommendations_4.get('recommendations') == [])
+    print("Result: PASS" if passed_4 else "Result: FAIL")
+    print()
+
+    # Additional tests for edge cases
+
+    print("--- Scenario 5: Empty Symptoms ---")
+    patient_facts_5 = []
+    goal_recommendations_5 = get_diagnosis(patient_facts_5)
+    print("Expected Diagnoses: None")
+    print("Actual Diagnoses:", *(goal_recommendations_5.get('diagnoses') or ['None']))
+    print("Expected Recommendations: None")
+    print("Actual Recommendations:", *(goal_recommendations_5.get('recommendations') or ['None']))
+    passed_5 = (goal_recommendations_5.get('diagnoses') == [] and 
+                goal_recommendations_5.get('recommendations') == [])
+    print("Result: PASS" if passed_5 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 6: Unknown Symptoms ---")
+    patient_facts_6 = ['unicorn_sneeze', 'dragon_cough']
+    goal_recommendations_6 = get_diagnosis(patient_facts_6)
+    print("Expected Diagnoses: None")
+    print("Actual Diagnoses:", *(goal_recommendations_6.get('diagnoses') or ['None']))
+    print("Expected Recommendations: None")
+    print("Actual Recommendations:", *(goal_recommendations_6.get('recommendations') or ['None']))
+    passed_6 = (goal_recommendations_6.get('diagnoses') == [] and 
+                goal_recommendations_6.get('recommendations') == [])
+    print("Result: PASS" if passed_6 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 7: Case Insensitivity Test ---")
+    patient_facts_7a = ['fever', 'cough', 'sore_throat']
+    patient_facts_7b = ['FEVER', 'COUGH', 'SORE_THROAT']
+    patient_facts_7c = ['Fever', 'Cough', 'Sore Throat']
+    results_7a = get_diagnosis(patient_facts_7a)
+    results_7b = get_diagnosis(patient_facts_7b)
+    results_7c = get_diagnosis(patient_facts_7c)
+    print("Expected: All three should produce common_cold diagnosis")
+    print("Actual Lowercase diagnoses:", *(results_7a.get('diagnoses') or ['None']))
+    print("Actual Uppercase diagnoses:", *(results_7b.get('diagnoses') or ['None']))
+    print("Actual Mixed case diagnoses:", *(results_7c.get('diagnoses') or ['None']))
+    print("Expected Results match: True")
+    print("Actual Results match:", results_7a == results_7b == results_7c)
+    passed_7 = (results_7a == results_7b == results_7c and 
+                results_7a.get('diagnoses') == ['common_cold'])
+    print("Result: PASS" if passed_7 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 8: Symptom Order Independence ---")
+    patient_facts_8a = ['fever', 'cough', 'body_aches']
+    patient_facts_8b = ['body_aches', 'fever', 'cough']
+    patient_facts_8c = ['cough', 'body_aches', 'fever']
+    results_8a = get_diagnosis(patient_facts_8a)
+    results_8b = get_diagnosis(patient_facts_8b)
+    results_8c = get_diagnosis(patient_facts_8c)
+    print("Expected: All three should produce influenza diagnosis")
+    print("Actual Order 1 diagnoses:", *(results_8a.get('diagnoses') or ['None']))
+    print("Actual Order 2 diagnoses:", *(results_8b.get('diagnoses') or ['None']))
+    print("Actual Order 3 diagnoses:", *(results_8c.get('diagnoses') or ['None']))
+    print("Expected Results match: True")
+    print("Actual Results match:", results_8a == results_8b == results_8c)
+    passed_8 = (results_8a == results_8b == results_8c and 
+                results_8a.get('diagnoses') == ['influenza'])
+    print("Result: PASS" if passed_8 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 9: Duplicate Symptoms ---")
+    patient_facts_9a = ['fever', 'cough', 'body_aches']
+    patient_facts_9b = ['fever', 'fever', 'cough', 'cough', 'body_aches', 'body_aches']
+    results_9a = get_diagnosis(patient_facts_9a)
+    results_9b = get_diagnosis(patient_facts_9b)
+    print("Expected: Both should produce influenza diagnosis")
+    print("Actual No duplicates diagnoses:", *(results_9a.get('diagnoses') or ['None']))
+    print("Actual With duplicates diagnoses:", *(results_9b.get('diagnoses') or ['None']))
+    print("Expected Results match: True")
+    print("Actual Results match:", results_9a == results_9b)
+    passed_9 = (results_9a == results_9b and 
+                results_9a.get('diagnoses') == ['influenza'])
+    print("Result: PASS" if passed_9 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 10: Batch Diagnosis ---")
+    patient_facts_10 = [['fever', 'cough', 'body_aches'],
+                        ['headache', 'nausea', 'light_sensitivity'],
+                        ['body_aches', 'cough', 'fever'],
+                        [],
+                        ['no_appetite', 'stomach_pain']]
+    results_10 = list(get_diagnoses_batch(patient_facts_10))
+    expected_10 = [get_diagnosis(facts) for facts in patient_facts_10]
+    print("Expected: Same results as get_diagnosis, in input order")
+    print("Actual diagnoses:", [result.get('diagnoses') for result in results_10])
+    print("Actual Results match:", results_10 == expected_10)
+    passed_10 = results_10 == expected_10
+    print("Result: PASS" if passed_10 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 11: Goal Query (Backward Chaining) ---")
+    patient_facts_11 = ['fever', 'cough', 'body_aches']
+    goals_11 = ['diagnosis:influenza', 'recommendation:rest', 'diagnosis:common_cold']
+    results_11 = [query_goal(patient_facts_11, goal) for goal in goals_11]
+    print("Expected: True True False")
+    print("Actual:", *results_11)
+    passed_11 = results_11 == [True, True, False]
+    print("Result: PASS" if passed_11 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 12: Incremental Diagnosis Session ---")
+    session_12 = DiagnosisSession()
+    added_12 = [session_12.add_symptom(symptom) for symptom in ['fever', 'cough', 'body_aches']]
+    print("Expected: influenza and rest added by the third symptom only")
+    print("Actual Diagnoses added:", [added.get('diagnoses') for added in added_12])
+    print("Actual Recommendations added:", [added.get('recommendations') for added in added_12])
+    passed_12 = ([added.get('diagnoses') for added in added_12] == [[], [], ['influenza']] and
+                 [added.get('recommendations') for added in added_12] == [[], [], ['rest']] and
+                 session_12.get_results() == get_diagnosis(['fever', 'cough', 'body_aches']))
+    print("Result: PASS" if passed_12 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 13: Vectorized Engine ---")
+    try:
+        from vectorized_engine import mismatched_patients
+    except ImportError:
+        print("Skipped: NumPy is not installed")
+    else:
+        patient_facts_13 = patient_facts_10 + [['fever', 'cough', 'sore_throat'], ['unknown_symptom']]
+        mismatched_13 = mismatched_patients(patient_facts_13)
+        print("Expected: Same results as get_diagnosis for every patient")
+        print("Actual mismatched patients:", mismatched_13 or 'None')
+        passed_13 = mismatched_13 == []
+        print("Result: PASS" if passed_13 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 14: Explanation ---")
+    results_14 = get_diagnosis(['fever', 'cough', 'body_aches'], explain=True)
+    proof_14 = results_14['trace'].get_proof('recommendation:rest')
+    print("Expected: rest <- influenza <- (body_aches, suspect_flu <- (cough, fever))")
+    print("Actual proof tree:")
+    print(proof_14.format())
+    passed_14 = (proof_14.conditions[0].fact == 'diagnosis:influenza' and
+                 sorted(node.fact for node in proof_14.conditions[0].conditions) == ['body_aches', 'suspect_flu'] and
+                 results_14['diagnoses'] == ['influenza'])
+    print("Result: PASS" if passed_14 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 15: Certainty Factors ---")
+    patient_facts_15 = {'fever': 1.0, 'cough': 1.0, 'body_aches': 0.9, 'sore_throat': 0.4}
+    results_15 = get_ranked_diagnosis(patient_facts_15)
+    print("Expected: influenza ranked above common_cold, both above 0")
+    print("Actual:", [(name, round(certainty, 3)) for name, certainty in results_15['diagnoses']])
+    passed_15 = [name for name, _ in results_15['diagnoses']] == ['influenza', 'common_cold']
+    print("Result: PASS" if passed_15 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 16: Differential Testing ---")
+    from differential_test import run_differential_tests
+    report_16 = run_differential_tests(trials=20)
+    print("Expected: Every engine derives the same facts and goals on random knowledge bases")
+    print("Engines checked:", ', '.join(report_16['seconds']))
+    print("Actual mismatches:", len(report_16['mismatches']))
+    passed_16 = report_16['mismatches'] == []
+    print("Result: PASS" if passed_16 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 17: Redundant Rules ---")
+    from knowledge_base import get_knowledge_base, IF_KEY, THEN_KEY
+    from rule_analyzer import analyze_rules
+    rules_17 = list(get_knowledge_base())
+    # A duplicate, a subsumed rule, and two rules that only depend on each other
+    rules_17.append(dict(rules_17[0]))
+    rules_17.append({IF_KEY: rules_17[0][IF_KEY] | {'chills'}, THEN_KEY: rules_17[0][THEN_KEY]})
+    rules_17.append({IF_KEY: {'never_derived'}, THEN_KEY: 'loop_fact'})
+    rules_17.append({IF_KEY: {'loop_fact'}, THEN_KEY: 'never_derived'})
+    analysis_17 = analyze_rules(rules_17)
+    print("Expected: 1 duplicate, 1 subsumed and 2 unreachable rules")
+    print("Actual:", len(analysis_17['duplicate_rules']), "duplicate,", len(analysis_17['subsumed_rules']),
+          "subsumed and", len(analysis_17['unreachable_rules']), "unreachable rules")
+    passed_17 = (len(analysis_17['duplicate_rules']) == 1 and len(analysis_17['subsumed_rules']) == 1 and
+                 len(analysis_17['unreachable_rules']) == 2 and analysis_17['pruned_rules'] == len(rules_17) - 4)
+    print("Result: PASS" if passed_17 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 18: Diagnosis Server ---")
+    import asyncio
+    import json
+    from diagnosis_server import MicroBatcher, handle_line
+
+
+    async def send_requests_18(lines):
+        batcher = MicroBatcher(max_batch_size=8, workers=0)
+        await batcher.start()
+        try:
+            responses = await asyncio.gather(*(handle_line(batcher, line) for line in lines))
+            return [json.loads(response) for response in responses], batcher.get_metrics()
+        finally:
+            await batcher.stop()
+
+    patient_facts_18 = [['fever', 'cough', 'body_aches'], ['headache', 'nausea', 'light_sensitivity']] * 10
+    lines_18 = [json.dumps({'jsonrpc': '2.0', 'id': number, 'method': 'diagnose', 'params': {'symptoms': facts}})
+                for number, facts in enumerate(patient_facts_18)]
+    responses_18, metrics_18 = asyncio.run(send_requests_18(lines_18))
+    print("Expected: Same results as get_diagnosis, in batches of at most 8")
+    print("Actual batches:", metrics_18['batches'], "mean size:", metrics_18['mean_batch_size'])
+    passed_18 = (all(response['result'] == get_diagnosis(facts)
+                     for response, facts in zip(responses_18, patient_facts_18)) and
+                 metrics_18['requests'] == 20 and metrics_18['batches'] == 3)
+    print("Result: PASS" if passed_18 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 19: Closure Table ---")
+    import itertools
+    import inference_engine
+    from knowledge_base import get_current_knowledge_base
+    closure_table_19 = get_current_knowledge_base().closure_table
+    symptom_sets_19 = [list(symptoms) for count in range(len(closure_table_19.symptoms) + 1)
+                       for symptoms in itertools.combinations(closure_table_19.symptoms, count)]
+    inference_engine.USE_CLOSURE_TABLE = True
+    table_results_19 = [get_diagnosis(symptoms) for symptoms in symptom_sets_19]
+    inference_engine.USE_CLOSURE_TABLE = False
+    print("Expected: Same results as get_diagnosis for every combination of symptoms")
+    print("Actual:", len(symptom_sets_19), "combinations,", closure_table_19.stored_subsets, "stored,",
+          len(closure_table_19.results), "distinct results")
+    passed_19 = all(table_result == get_diagnosis(symptoms)
+                    for table_result, symptoms in zip(table_results_19, symptom_sets_19))
+    print("Result: PASS" if passed_19 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 20: Sharded Inference ---")
+    try:
+        from sharded_engine import ShardedEngine
+    except ImportError:
+        print("Skipped: multiprocessing.shared_memory needs Python 3.8")
+    else:
+        from compiled_knowledge_base import compile_knowledge_base
+        from inference_engine import forward_chaining_inference
+        from synthetic_knowledge_base import generate_knowledge_base, generate_patients
+        rules_20 = generate_knowledge_base(2000, 4, 2, 100, 1)
+        patient_facts_20 = generate_patients(rules_20, 50, 10, 1)
+        with ShardedEngine(compile_knowledge_base(rules_20), shard_count=3) as engine_20:
+            derived_20 = engine_20.run_batch(patient_facts_20)
+            rounds_20 = engine_20.last_rounds
+        print("Expected: Same derived facts as forward_chaining_inference for every patient")
+        print("Actual:", len(engine_20.shards), "shards,", rounds_20, "rounds,",
+              sum(len(derived) for derived in derived_20), "facts derived")
+        passed_20 = all(sorted(derived) == sorted(forward_chaining_inference(rules_20, facts))
+                        for derived, facts in zip(derived_20, patient_facts_20))
+        print("Result: PASS" if passed_20 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 21: Diagnosis Server over stdio with Worker Processes ---")
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    # The responses go to a file, so a server that never answers fails the scenario instead of hanging it
+    with tempfile.TemporaryFile(mode='w+') as output_21:
+        server_21 = subprocess.Popen([sys.executable, 'diagnosis_server.py', '--workers', '2'],
+                                     cwd=os.path.dirname(os.path.abspath(__file__)), stdin=subprocess.PIPE,
+                                     stdout=output_21, universal_newlines=True)
+        # stdin stays open while the server answers, as it does for a client waiting for responses
+        server_21.stdin.write(''.join(line + '\n' for line in lines_18[:4]))
+        server_21.stdin.flush()
+        deadline_21 = time.time() + 60
+        while time.time() < deadline_21:
+            output_21.seek(0)
+            if output_21.read().count('\n') >= 4:
+                break
+            time.sleep(0.1)
+        server_21.stdin.close()
+        try:
+            server_21.wait(60)
+        except subprocess.TimeoutExpired:
+            server_21.kill()
+            server_21.wait()
+        output_21.seek(0)
+        responses_21 = [json.loads(line) for line in output_21.read().splitlines()]
+    print("Expected: A response from the worker processes for each request")
+    print("Actual responses:", len(responses_21))
+    passed_21 = (len(responses_21) == 4 and
+                 all(response['result'] == get_diagnosis(patient_facts_18[response['id']])
+                     for response in responses_21))
+    print("Result: PASS" if passed_21 else "Result: FAIL")
+    print()
+
+    print("--- Scenario 22: Hot Reload ---")
+    import shutil
+    from knowledge_base import CSV_PATH, get_knowledge_base_version, reload_knowledge_base, resolve_path
+    from knowledge_base_watcher import KnowledgeBaseWatcher
+    flu_22 = ['fever', 'cough', 'body_aches']
+    with tempfile.TemporaryDirectory() as directory_22:
+        path_22 = os.path.join(directory_22, 'rules.csv')
+        shutil.copyfile(resolve_path(CSV_PATH), path_22)
+        try:
+            version_22 = get_knowledge_base_version()
+            copy_version_22 = reload_knowledge_base(path_22)
+            before_22 = get_diagnosis(flu_22)
+            # Opened before the edit, so it stays on the copy's version
+            session_22 = DiagnosisSession(flu_22)
+            watcher_22 = KnowledgeBaseWatcher(path_22)
+            with open(path_22, encoding='utf-8') as rule_file:
+                rules_text_22 = rule_file.read()
+            with open(path_22, 'w', encoding='utf-8') as rule_file:
+                rule_file.write(rules_text_22.replace('recommendation:rest,', 'recommendation:fluids,'))
+            reloaded_22 = watcher_22.check()
+            after_22 = get_diagnosis(flu_22)
+            edited_version_22 = get_knowledge_base_version()
+        finally:
+            reload_knowledge_base()
+    print("Expected: Each reload raises the version, get_diagnosis sees the edited rule,"
+          " and the earlier session keeps the old one")
+    print("Actual versions:", version_22, copy_version_22, edited_version_22, get_knowledge_base_version())
+    print("Actual Recommendations before/after/session:", before_22['recommendations'],
+          after_22['recommendations'], session_22.get_results()['recommendations'])
+    passed_22 = (version_22 < copy_version_22 < edited_version_22 < get_knowledge_base_version() and
+                 reloaded_22 and watcher_22.reload_count == 1 and
+                 before_22['recommendations'] == ['rest'] and after_22['recommendations'] == ['fluids'] and
+                 session_22.version == copy_version_22 and
+                 session_22.get_results()['recommendations'] == ['rest'] and
+                 get_diagnosis(flu_22)['recommendations'] == ['rest'])
+    print("Result: PASS" if passed_22 else "Result: FAIL")
+    print()
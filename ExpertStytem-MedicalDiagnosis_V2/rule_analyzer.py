@@ -0,0 +1,233 @@
+# rule_analyzer.py
+# Finds rules that add nothing to the knowledge base, and optionally removes them.
+#
+# Three kinds of rules can be removed without changing any diagnosis:
+#   - Duplicates: the same conditions and conclusion as an earlier rule
+#   - Subsumed rules: another rule with the same conclusion needs only some of
+#     this rule's conditions, so it fires whenever this rule would
+#   - Unreachable rules: a condition can never be derived, even when a patient
+#     has every symptom (every fact that no rule concludes), e.g. because it
+#     only appears in a cycle of rules
+# Every pass of forward_chaining_inference() checks every rule, so removing them
+# makes every pass cheaper. Set PRUNE_REDUNDANT_RULES in knowledge_base.py to
+# remove them when the rules are loaded.
+#
+# Each check uses hashing or an index instead of comparing every pair of rules,
+# so analyzing 100k rules takes a second or two, however the rules share conditions.
+#
+# Run this file to print a report on the rule source selected in knowledge_base.py,
+# or on another CSV file:
+#   python rule_analyzer.py
+#   python rule_analyzer.py other_rules.csv
+
+import sys
+from itertools import combinations
+
+import knowledge_base
+from inference_engine import indexed_forward_chaining_inference
+from knowledge_base import IF_KEY, THEN_KEY, build_rule_index, load_knowledge_base_from_csv
+
+# Rules with more conditions than this are not checked by enumerating their
+# subsets (2^12 = 4096 lookups), but by comparing with their group's other rules
+MAX_ENUMERATED_CONDITIONS = 12
+
+
+def find_duplicate_rules(rules):
+    """
+    Finds rules with the same conditions and conclusion as an earlier rule.
+
+    Returns:
+        dict: Maps each duplicate rule's number to the number of the first rule
+            with the same conditions and conclusion
+    """
+    first_rules = {}
+    duplicates = {}
+    for rule_number, rule in enumerate(rules):
+        key = (rule[THEN_KEY], frozenset(rule[IF_KEY]))
+        first_rule = first_rules.setdefault(key, rule_number)
+        if first_rule != rule_number:
+            duplicates[rule_number] = first_rule
+    return duplicates
+
+
+def find_subsumed_rules(rules, ignore=()):
+    """
+    Finds rules that another rule with the same conclusion makes redundant,
+    because its conditions are a proper subset of the rule's conditions.
+
+    Rules are grouped by conclusion, and each group keeps a set of its rules'
+    condition sets. Rules have few conditions, so each proper subset of a rule's
+    conditions is looked up in that set, smallest first; the work grows with
+    the number of rules, not with the number of pairs of rules. Rules with more
+    than MAX_ENUMERATED_CONDITIONS conditions are compared with the smaller
+    condition sets of their group instead.
+
+    Args:
+        rules (list): A list of rule dictionaries
+        ignore (collection): Rule numbers to leave out (e.g., duplicates)
+
+    Returns:
+        dict: Maps each subsumed rule's number to the number of a rule that subsumes it
+    """
+    # Conclusion -> {conditions: number of the first rule with them}
+    groups = {}
+    for rule_number, rule in enumerate(rules):
+        if rule_number not in ignore:
+            group = groups.setdefault(rule[THEN_KEY], {})
+            group.setdefault(frozenset(rule[IF_KEY]), rule_number)
+
+    subsumed = {}
+    for rule_number, rule in enumerate(rules):
+        if rule_number in ignore:
+            continue
+        group = groups[rule[THEN_KEY]]
+        if len(group) == 1:
+            continue    # Every rule for this conclusion has the same conditions
+        subsuming_rule = _find_subset(frozenset(rule[IF_KEY]), group)
+        if subsuming_rule is not None:
+            subsumed[rule_number] = subsuming_rule
+    return subsumed
+
+
+def _find_subset(conditions, group):
+    """
+    Returns the number of a rule in the group whose conditions are a proper
+    subset of conditions, or None.
+    """
+    if len(conditions) > MAX_ENUMERATED_CONDITIONS:
+        size = len(conditions)
+        for other_conditions, other_number in group.items():
+            if len(other_conditions) < size and other_conditions <= conditions:
+                return other_number
+        return None
+    ordered = sorted(conditions)
+    for size in range(len(ordered)):
+        for subset in combinations(ordered, size):
+            other_number = group.get(frozenset(subset))
+            if other_number is not None:
+                return other_number
+    return None
+
+
+def find_unreachable_rules(rules, rule_index=None):
+    """
+    Finds rules that cannot fire even if every symptom (every fact that no rule
+    concludes) is known.
+
+    Args:
+        rules (list): A list of rule dictionaries
+        rule_index (tuple): Optional index from build_rule_index(rules)
+
+    Returns:
+        tuple: (unreachable_rules, unreachable_facts) where unreachable_rules is a
+            list of rule numbers and unreachable_facts is a sorted list of their
+            conditions that can never be derived
+    """
+    conclusions = {rule[THEN_KEY] for rule in rules}
+    symptoms = {fact for rule in rules for fact in rule[IF_KEY] if fact not in conclusions}
+    known = symptoms.union(indexed_forward_chaining_inference(rules, symptoms, rule_index))
+    unreachable_rules = []
+    unreachable_facts = set()
+    for rule_number, rule in enumerate(rules):
+        missing = rule[IF_KEY] - known
+        if missing:
+            unreachable_rules.append(rule_number)
+            unreachable_facts |= missing
+    return unreachable_rules, sorted(unreachable_facts)
+
+
+def analyze_rules(rules, rule_index=None):
+    """
+    Finds the duplicate, subsumed and unreachable rules.
+
+    Args:
+        rules (list): A list of rule dictionaries
+        rule_index (tuple): Optional index from build_rule_index(rules)
+
+    Returns:
+        dict: 'rules' (rule count), 'duplicate_rules' and 'subsumed_rules' (dicts
+            from find_duplicate_rules() and find_subsumed_rules()),
+            'unreachable_rules' and 'unreachable_facts' (from
+            find_unreachable_rules()), 'redundant_rules' (sorted list of every
+            rule number found) and 'pruned_rules' (rule count without them)
+    """
+    duplicates = find_duplicate_rules(rules)
+    subsumed = find_subsumed_rules(rules, ignore=duplicates)
+    unreachable_rules, unreachable_facts = find_unreachable_rules(rules, rule_index)
+    redundant = sorted(set(duplicates).union(subsumed, unreachable_rules))
+    return {
+        'rules': len(rules),
+        'duplicate_rules': duplicates,
+        'subsumed_rules': subsumed,
+        'unreachable_rules': unreachable_rules,
+        'unreachable_facts': unreachable_facts,
+        'redundant_rules': redundant,
+        'pruned_rules': len(rules) - len(redundant),
+    }
+
+
+def prune_rules(rules, analysis=None):
+    """
+    Returns a new list of the rules without the redundant ones, in the same order.
+
+    Forward chaining on the pruned rules derives the same facts as on the
+    original rules, as long as the initial facts are symptoms. (An unreachable
+    rule could still fire if a fact that rules conclude, like 'suspect_flu', were
+    given as an initial fact.) Certainty factors can change, since
+    certainty_inference.py counts every rule that supports a fact as evidence.
+
+    Args:
+        rules (list): A list of rule dictionaries
+        analysis (dict): Optional result of analyze_rules(rules)
+    """
+    if analysis is None:
+        analysis = analyze_rules(rules)
+    redundant = set(analysis['redundant_rules'])
+    return [rule for rule_number, rule in enumerate(rules) if rule_number not in redundant]
+
+
+def format_analysis(analysis, rules=None, limit=20):
+    """
+    Formats an analyze_rules() result as text. If rules is given, up to limit
+    rules of each kind are listed.
+    """
+    rule_count = analysis['rules']
+    removed = rule_count - analysis['pruned_rules']
+    lines = [f"Rules: {rule_count}",
+             f"Duplicate rules: {len(analysis['duplicate_rules'])}",
+             f"Subsumed rules: {len(analysis['subsumed_rules'])}",
+             f"Unreachable rules: {len(analysis['unreachable_rules'])}"]
+    if analysis['unreachable_facts']:
+        facts = analysis['unreachable_facts']
+        lines.append(f"Facts that can never be derived: {', '.join(facts[:limit])}"
+                     f"{' ...' if len(facts) > limit else ''}")
+    percent = 100.0 * removed / rule_count if rule_count else 0.0
+    lines.append(f"Rules after pruning: {analysis['pruned_rules']} ({removed} removed, {percent:.1f}%)")
+    if rules is not None:
+        for title, found in (("Duplicate", analysis['duplicate_rules']),
+                             ("Subsumed", analysis['subsumed_rules'])):
+            for rule_number, other_number in list(found.items())[:limit]:
+                lines.append(f"  {title} rule {rule_number}: {rules[rule_number]} "
+                             f"(see rule {other_number})")
+        for rule_number in analysis['unreachable_rules'][:limit]:
+            lines.append(f"  Unreachable rule {rule_number}: {rules[rule_number]}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Prints the analysis of a CSV file given on the command line, or of the rule
+    source selected in knowledge_base.py (before any pruning).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        rules = load_knowledge_base_from_csv(argv[0])
+    elif knowledge_base.HARD_CODED_RULES:
+        rules = list(knowledge_base.HARDCODED_KNOWLEDGE_BASE)
+    else:
+        rules = load_knowledge_base_from_csv(knowledge_base.CSV_PATH)
+    print(format_analysis(analyze_rules(rules, build_rule_index(rules)), rules))
+
+
+if __name__ == "__main__":
+    main()
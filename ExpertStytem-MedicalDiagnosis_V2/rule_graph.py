@@ -0,0 +1,293 @@
+# rule_graph.py
+# Dependency graph of the knowledge base rules, stratification, and stratified
+# forward chaining.
+#
+# The rules form layers: symptoms -> suspect_* -> diagnosis:* -> recommendation:*.
+# A fact depends on the conditions of every rule that concludes it. Grouping the
+# rules by how deep their conclusion sits in this graph lets forward chaining run
+# each layer (stratum) once, in order, instead of rescanning every rule until a
+# full pass adds nothing. Rules that form a cycle (A concludes B and B concludes A)
+# end up in the same stratum, which is then repeated until nothing changes.
+#
+# Run this file to print a report on the current knowledge base:
+#   python rule_graph.py
+
+from array import array
+
+from knowledge_base import get_current_knowledge_base
+
+
+class RuleGraph:
+    """
+    The fact dependency graph of a compiled knowledge base, split into strata.
+
+    Facts that depend on each other through a cycle of rules share a component.
+    Facts that no rule concludes (symptoms) are level 0; every other component
+    is one level above the deepest component its rules depend on. A rule belongs
+    to stratum (level of its conclusion - 1), so all of a rule's conditions are
+    either known before its stratum runs or (for recursive strata) concluded
+    within the same stratum.
+
+    Attributes:
+        compiled (CompiledKnowledgeBase): The compiled rules the graph was built from
+        fact_components (array): Component number of each fact ID
+        component_levels (array): Level of each component
+        recursive_components (set): Components containing a cycle of rules
+        rule_strata (array): Stratum of each rule
+        strata (list): For each stratum, an array of its rule numbers (in rule order)
+        recursive_strata (list): For each stratum, True if it contains a cycle
+            and must be repeated until nothing changes
+    """
+
+    def __init__(self, compiled):
+        """
+        Builds the graph and strata.
+
+        Args:
+            compiled (CompiledKnowledgeBase): The compiled rules
+        """
+        self.compiled = compiled
+        self.fact_components, component_count = _find_components(compiled)
+        components = self.fact_components
+        offsets = compiled.condition_offsets
+        condition_ids = compiled.condition_ids
+        conclusion_ids = compiled.conclusion_ids
+
+        # Rules grouped by the component of their conclusion
+        rules_by_component = [[] for _ in range(component_count)]
+        for rule_number in range(compiled.rule_count):
+            rules_by_component[components[conclusion_ids[rule_number]]].append(rule_number)
+
+        # _find_components() numbers every component after the components it depends
+        # on, so one pass in component order computes the levels
+        self.component_levels = array('l', [0]) * component_count
+        self.recursive_components = set()
+        for component in range(component_count):
+            level = 0
+            for rule_number in rules_by_component[component]:
+                rule_level = 1
+                for position in range(offsets[rule_number], offsets[rule_number + 1]):
+                    condition_component = components[condition_ids[position]]
+                    if condition_component == component:
+                        self.recursive_components.add(component)
+                    else:
+                        rule_level = max(rule_level, self.component_levels[condition_component] + 1)
+                level = max(level, rule_level)
+            self.component_levels[component] = level
+
+        self.rule_strata = array('l', (self.component_levels[components[fact_id]] - 1
+                                       for fact_id in conclusion_ids))
+        stratum_count = max(self.rule_strata, default=-1) + 1
+        strata = [[] for _ in range(stratum_count)]
+        self.recursive_strata = [False] * stratum_count
+        for rule_number, stratum in enumerate(self.rule_strata):
+            strata[stratum].append(rule_number)
+            if components[conclusion_ids[rule_number]] in self.recursive_components:
+                self.recursive_strata[stratum] = True
+        self.strata = [array('l', stratum) for stratum in strata]
+        self._stratum_rules = None
+
+    def get_stratum_rules(self):
+        """
+        Returns each stratum's rules as (conclusion ID, frozenset of condition IDs)
+        pairs, so a rule can be checked with one set comparison. Built on first use.
+        """
+        if self._stratum_rules is None:
+            compiled = self.compiled
+            self._stratum_rules = [[(compiled.conclusion_ids[rule_number],
+                                     frozenset(compiled.get_conditions(rule_number)))
+                                    for rule_number in stratum]
+                                   for stratum in self.strata]
+        return self._stratum_rules
+
+    @property
+    def depth(self):
+        """
+        Number of strata (the length of the longest chain of rules, counting each cycle once).
+        """
+        return len(self.strata)
+
+
+def _find_components(compiled):
+    """
+    Finds the strongly connected components of the fact graph (an edge runs from
+    each condition of a rule to its conclusion), using Tarjan's algorithm with an
+    explicit stack so long rule chains cannot exceed Python's recursion limit.
+
+    Returns:
+        tuple: (fact_components, component_count) where components are numbered
+            so that every component comes after the components it depends on
+    """
+    fact_count = compiled.fact_count
+    dependent_offsets = compiled.dependent_offsets
+    dependent_rules = compiled.dependent_rules
+    conclusion_ids = compiled.conclusion_ids
+    unvisited = -1
+    index_of = array('l', [unvisited]) * fact_count
+    lowlink = array('l', [0]) * fact_count
+    on_stack = bytearray(fact_count)
+    fact_stack = []
+    finished = []   # Components in the order Tarjan's algorithm completes them
+    next_index = 0
+
+    for root in range(fact_count):
+        if index_of[root] != unvisited:
+            continue
+        index_of[root] = lowlink[root] = next_index
+        next_index += 1
+        fact_stack.append(root)
+        on_stack[root] = 1
+        # (fact ID, position of the next dependent rule to follow)
+        call_stack = [[root, dependent_offsets[root]]]
+        while call_stack:
+            frame = call_stack[-1]
+            fact_id, position = frame
+            if position < dependent_offsets[fact_id + 1]:
+                frame[1] += 1
+                successor = conclusion_ids[dependent_rules[position]]
+                if index_of[successor] == unvisited:
+                    index_of[successor] = lowlink[successor] = next_index
+                    next_index += 1
+                    fact_stack.append(successor)
+                    on_stack[successor] = 1
+                    call_stack.append([successor, dependent_offsets[successor]])
+                elif on_stack[successor]:
+                    lowlink[fact_id] = min(lowlink[fact_id], index_of[successor])
+                continue
+            call_stack.pop()
+            if call_stack:
+                parent = call_stack[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[fact_id])
+            if lowlink[fact_id] == index_of[fact_id]:
+                component = []
+                while True:
+                    member = fact_stack.pop()
+                    on_stack[member] = 0
+                    component.append(member)
+                    if member == fact_id:
+                        break
+                finished.append(component)
+
+    # Tarjan's algorithm completes a component after everything that depends on it,
+    # so numbering in reverse puts each component after its dependencies
+    fact_components = array('l', [0]) * fact_count
+    for component_number, component in enumerate(reversed(finished)):
+        for fact_id in component:
+            fact_components[fact_id] = component_number
+    return fact_components, len(finished)
+
+
+def build_rule_graph(compiled):
+    """
+    Builds the RuleGraph of a compiled knowledge base.
+    """
+    return RuleGraph(compiled)
+
+
+def stratified_forward_chaining_inference(graph, initial_facts):
+    """
+    Performs forward chaining one stratum at a time.
+
+    Each stratum's rules are checked in a single pass, since their conditions were
+    all settled by earlier strata. Only strata that contain a cycle are repeated
+    until a pass derives nothing new. Gives the same derived facts as
+    forward_chaining_inference() on the rules the graph was built from.
+
+    Args:
+        graph (RuleGraph): Graph from build_rule_graph()
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+
+    Returns:
+        list: A list of newly derived fact strings (excluding the initial facts).
+    """
+    compiled = graph.compiled
+    fact_ids = compiled.fact_ids
+    known = {fact_ids[fact] for fact in initial_facts if fact in fact_ids}
+    derived = []
+    for stratum_rules, recursive in zip(graph.get_stratum_rules(), graph.recursive_strata):
+        new_fact_added = True
+        while new_fact_added:
+            new_fact_added = False
+            for new_fact_id, conditions in stratum_rules:
+                if new_fact_id not in known and conditions <= known:
+                    known.add(new_fact_id)
+                    derived.append(new_fact_id)
+                    new_fact_added = recursive
+    fact_names = compiled.fact_names
+    return [fact_names[fact_id] for fact_id in derived]
+
+
+def get_graph_report(graph):
+    """
+    Summarizes the shape of the rule graph.
+
+    A rule's fan-in is the number of rules that conclude one of its conditions,
+    and its fan-out is the number of rules that use its conclusion as a condition.
+    A rule is unreachable if it can never fire, even when every symptom (every
+    fact that no rule concludes) is present.
+
+    Args:
+        graph (RuleGraph): Graph from build_rule_graph()
+
+    Returns:
+        dict: 'rules', 'facts', 'depth', 'stratum_sizes' (rules per stratum),
+            'recursive_strata' (stratum numbers that contain cycles),
+            'max_fan_in', 'mean_fan_in', 'max_fan_out', 'mean_fan_out',
+            and 'unreachable_rules' (list of rule numbers)
+    """
+    # Imported here so that importing this module stays cheap
+    from compiled_knowledge_base import propagate_facts, start_inference
+
+    compiled = graph.compiled
+    rule_count = compiled.rule_count
+    concluding_offsets = compiled.concluding_offsets
+    dependent_offsets = compiled.dependent_offsets
+    fan_in = [sum(concluding_offsets[fact_id + 1] - concluding_offsets[fact_id]
+                  for fact_id in compiled.get_conditions(rule_number))
+              for rule_number in range(rule_count)]
+    fan_out = [dependent_offsets[fact_id + 1] - dependent_offsets[fact_id]
+               for fact_id in compiled.conclusion_ids]
+
+    symptoms = [compiled.fact_names[fact_id] for fact_id in range(compiled.fact_count)
+                if concluding_offsets[fact_id] == concluding_offsets[fact_id + 1]]
+    known, unsatisfied, agenda, _ = start_inference(compiled, symptoms)
+    propagate_facts(compiled, known, unsatisfied, agenda)
+
+    return {
+        'rules': rule_count,
+        'facts': compiled.fact_count,
+        'depth': graph.depth,
+        'stratum_sizes': [len(stratum) for stratum in graph.strata],
+        'recursive_strata': [number for number, recursive in enumerate(graph.recursive_strata)
+                             if recursive],
+        'max_fan_in': max(fan_in, default=0),
+        'mean_fan_in': sum(fan_in) / rule_count if rule_count else 0.0,
+        'max_fan_out': max(fan_out, default=0),
+        'mean_fan_out': sum(fan_out) / rule_count if rule_count else 0.0,
+        'unreachable_rules': [rule_number for rule_number in range(rule_count)
+                              if unsatisfied[rule_number] > 0],
+    }
+
+
+def main():
+    """
+    Prints the graph report for the current knowledge base.
+    """
+    knowledge_base = get_current_knowledge_base()
+    report = get_graph_report(knowledge_base.rule_graph)
+    print(f"Rules: {report['rules']}, facts: {report['facts']}")
+    print(f"Depth: {report['depth']} strata, sizes {report['stratum_sizes']}")
+    if report['recursive_strata']:
+        print(f"Strata with cycles: {report['recursive_strata']}")
+    print(f"Fan-in: max {report['max_fan_in']}, mean {report['mean_fan_in']:.2f}")
+    print(f"Fan-out: max {report['max_fan_out']}, mean {report['mean_fan_out']:.2f}")
+    unreachable = report['unreachable_rules']
+    print(f"Unreachable rules: {len(unreachable)}")
+    if unreachable and len(unreachable) <= 20:
+        rules = knowledge_base.rules
+        for rule_number in unreachable:
+            print(f"  Rule {rule_number}: {rules[rule_number]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+# sharded_engine.py
+# Forward chaining on very large knowledge bases, with the rules split across
+# worker processes.
+#
+# The rules are partitioned into shards along the rule dependency graph (see
+# rule_graph.py), and each shard runs in its own worker process. The known facts
+# of a batch of patients live in one shared memory block, one byte per fact per
+# patient, that every worker reads and writes directly. Inference runs in rounds:
+#   1. Every worker propagates the new facts its rules use, firing its rules and
+#      marking their conclusions in shared memory, until its shard can derive
+#      nothing more
+#   2. Each worker replies with the facts it derived that other shards use, and
+#      the engine sends all of them to every worker in the next round
+# Inference stops after a round in which no worker derived a fact that another
+# shard uses (a global fixed point), so the derived facts are the same as
+# forward_chaining_inference()'s. Keeping chains of rules inside one shard (see
+# partition_rules()) keeps the number of rounds low.
+#
+# Every fact is derived by exactly one shard, so two workers never write the same
+# byte. (Packing the facts as bits would make workers overwrite each other's
+# updates to a shared byte.)
+#
+# This is not automatically faster than the single-process engines: starting the
+# workers and exchanging facts between rounds has a cost, and on one core it is
+# slower than compiled_forward_chaining_inference(). Measure it with
+# benchmark_inference.py first. Create one ShardedEngine and give it many patients
+# at a time:
+#   with ShardedEngine(compiled, shard_count=4) as engine:
+#       derived_lists = engine.run_batch(symptom_lists)
+
+from array import array
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+from compiled_knowledge_base import compile_knowledge_base
+from rule_graph import build_rule_graph
+
+DEFAULT_SHARD_COUNT = 4
+# Patients whose facts share one shared memory block (and one set of rounds)
+DEFAULT_SHARD_BATCH_SIZE = 256
+# A shard may hold this fraction more than an equal share of the rules, so that
+# rules that depend on each other can stay together
+SHARD_BALANCE_SLACK = 0.1
+
+# Messages sent to the workers
+_FIRST_ROUND = 'first_round'    # Argument: initial fact IDs of each patient
+_NEXT_ROUND = 'next_round'      # Argument: facts other shards derived in the last round
+_COLLECT = 'collect'
+_STOP = 'stop'
+
+
+def partition_rules(compiled, shard_count, graph=None):
+    """
+    Splits the rules into shards along the rule dependency graph.
+
+    All the rules that conclude the facts of one component of the graph (see
+    RuleGraph) go to the same shard, so every fact is derived by exactly one
+    shard and cycles of rules stay inside a shard. Components are assigned in
+    dependency order, each to the shard that derives most of its rules'
+    conditions (so chains of rules tend to stay in one shard and need fewer
+    rounds), unless that shard already holds its share of the rules; then it
+    goes to the shard with the fewest rules.
+
+    Args:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        shard_count (int): Number of shards
+        graph (RuleGraph): Optional graph from build_rule_graph(compiled)
+
+    Returns:
+        list: For each shard, an array of its rule numbers (in rule order)
+    """
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1")
+    if graph is None:
+        graph = build_rule_graph(compiled)
+    components = graph.fact_components
+    offsets = compiled.condition_offsets
+    condition_ids = compiled.condition_ids
+    conclusion_ids = compiled.conclusion_ids
+
+    rules_by_component = [[] for _ in range(len(graph.component_levels))]
+    for rule_number in range(compiled.rule_count):
+        rules_by_component[components[conclusion_ids[rule_number]]].append(rule_number)
+
+    capacity = (1.0 + SHARD_BALANCE_SLACK) * compiled.rule_count / shard_count
+    component_shards = array('l', [-1]) * len(rules_by_component)
+    shard_sizes = [0] * shard_count
+    for component, component_rules in enumerate(rules_by_component):
+        if not component_rules:
+            continue    # Symptoms: no shard derives them
+        votes = [0] * shard_count
+        for rule_number in component_rules:
+            for position in range(offsets[rule_number], offsets[rule_number + 1]):
+                condition_shard = component_shards[components[condition_ids[position]]]
+                if condition_shard >= 0:
+                    votes[condition_shard] += 1
+        shard = max(range(shard_count), key=lambda candidate: (votes[candidate], -shard_sizes[candidate]))
+        if votes[shard] == 0 or shard_sizes[shard] + len(component_rules) > capacity:
+            shard = min(range(shard_count), key=shard_sizes.__getitem__)
+        component_shards[component] = shard
+        shard_sizes[shard] += len(component_rules)
+
+    shards = [array('l') for _ in range(shard_count)]
+    for rule_number in range(compiled.rule_count):
+        shards[component_shards[components[conclusion_ids[rule_number]]]].append(rule_number)
+    return shards
+
+
+class Shard:
+    """
+    The part of a compiled knowledge base that one worker runs, with the shard's
+    rules renumbered from 0.
+
+    The shard's rules that use input_ids[i] as a condition are
+    dependent_rules[dependent_offsets[i]:dependent_offsets[i + 1]].
+
+    Attributes:
+        rule_numbers (array): Number of each of the shard's rules in the full knowledge base
+        conclusion_ids (array): Conclusion fact ID of each of the shard's rules
+        condition_counts (array): Number of conditions of each of the shard's rules
+        unconditional_rules (array): The shard's rules with no conditions
+        input_ids (array): Fact IDs that the shard's rules use as conditions
+        input_positions (dict): Maps each of input_ids to its position
+        export_ids (set): Facts the shard concludes that other shards use as conditions
+        dependent_offsets (array): Start of each input fact's dependent rules
+        dependent_rules (array): The shard's rules that use each input fact
+    """
+
+    def __init__(self, compiled, rule_numbers, export_ids):
+        """
+        Args:
+            compiled (CompiledKnowledgeBase): The compiled rules
+            rule_numbers (array): The shard's rules, from partition_rules()
+            export_ids (set): Facts the shard concludes that other shards use
+        """
+        offsets = compiled.condition_offsets
+        condition_ids = compiled.condition_ids
+        self.rule_numbers = rule_numbers
+        self.conclusion_ids = array('l', (compiled.conclusion_ids[rule_number]
+                                          for rule_number in rule_numbers))
+        self.condition_counts = array('l', (compiled.condition_counts[rule_number]
+                                            for rule_number in rule_numbers))
+        self.unconditional_rules = array('l', (local_rule for local_rule, count
+                                               in enumerate(self.condition_counts) if count == 0))
+
+        dependents = {}
+        for local_rule, rule_number in enumerate(rule_numbers):
+            for position in range(offsets[rule_number], offsets[rule_number + 1]):
+                dependents.setdefault(condition_ids[position], []).append(local_rule)
+        self.input_ids = array('l', sorted(dependents))
+        self.input_positions = {fact_id: position for position, fact_id in enumerate(self.input_ids)}
+        self.export_ids = export_ids
+        self.dependent_offsets = array('l', [0])
+        self.dependent_rules = array('l')
+        for fact_id in self.input_ids:
+            self.dependent_rules.extend(dependents[fact_id])
+            self.dependent_offsets.append(len(self.dependent_rules))
+
+    @property
+    def rule_count(self):
+        return len(self.rule_numbers)
+
+
+def build_shards(compiled, shard_count, graph=None):
+    """
+    Partitions a compiled knowledge base (see partition_rules()) and builds its Shards.
+    """
+    partition = partition_rules(compiled, shard_count, graph)
+    offsets = compiled.condition_offsets
+    condition_ids = compiled.condition_ids
+    fact_shards = array('l', [-1]) * compiled.fact_count
+    for shard_number, rule_numbers in enumerate(partition):
+        for rule_number in rule_numbers:
+            fact_shards[compiled.conclusion_ids[rule_number]] = shard_number
+    export_ids = [set() for _ in partition]
+    for shard_number, rule_numbers in enumerate(partition):
+        for rule_number in rule_numbers:
+            for position in range(offsets[rule_number], offsets[rule_number + 1]):
+                fact_shard = fact_shards[condition_ids[position]]
+                if fact_shard not in (-1, shard_number):
+                    export_ids[fact_shard].add(condition_ids[position])
+    return [Shard(compiled, rule_numbers, shard_exports)
+            for rule_numbers, shard_exports in zip(partition, export_ids)]
+
+
+class ShardWorker:
+    """
+    Runs one shard's rules on a batch of patients whose known facts are in a
+    shared block of memory.
+
+    Patient p's fact f is known if known[p * fact_count + f] is nonzero. The
+    worker only writes the facts its own rules conclude, and keeps the
+    unsatisfied condition counts of its rules for each patient between rounds
+    (only for the rules a fact has reached, since most rules never fire).
+    """
+
+    def __init__(self, shard, known, fact_count):
+        self.shard = shard
+        self.known = known
+        self.fact_count = fact_count
+        self._unsatisfied = []
+        self._derived = []
+
+    def run_first_round(self, initial_fact_ids):
+        """
+        Starts a new batch of patients, whose initial facts are already marked
+        in known, and runs its first round.
+
+        Args:
+            initial_fact_ids (list): For each patient, the IDs of its initial facts
+
+        Returns:
+            dict: Maps patient numbers to the facts derived this round that
+                other shards use (only patients with any)
+        """
+        patient_count = len(initial_fact_ids)
+        self._unsatisfied = [{} for _ in range(patient_count)]
+        self._derived = [[] for _ in range(patient_count)]
+        shard = self.shard
+        unconditional_ids = [shard.conclusion_ids[local_rule] for local_rule in shard.unconditional_rules]
+        exports = {}
+        for patient, fact_ids in enumerate(initial_fact_ids):
+            self._propagate(patient, fact_ids, unconditional_ids, exports)
+        return exports
+
+    def run_next_round(self, new_fact_ids):
+        """
+        Propagates the facts that shards derived in the last round.
+
+        Args:
+            new_fact_ids (dict): Maps patient numbers to new fact IDs (from the
+                replies of every shard to the last round)
+
+        Returns:
+            dict: The facts derived this round that other shards use, like
+                run_first_round()
+        """
+        export_ids = self.shard.export_ids
+        exports = {}
+        for patient, fact_ids in new_fact_ids.items():
+            # This shard already propagated the facts it derived itself
+            fact_ids = [fact_id for fact_id in fact_ids if fact_id not in export_ids]
+            self._propagate(patient, fact_ids, (), exports)
+        return exports
+
+    def _propagate(self, patient, fact_ids, concluded_ids, exports):
+        """
+        Runs the shard's rules for one patient until they derive nothing more.
+
+        Args:
+            fact_ids (iterable): Known facts the shard has not processed yet
+            concluded_ids (iterable): Conclusions of rules that have fired
+            exports (dict): Patient number -> new facts that other shards use; updated
+        """
+        shard = self.shard
+        known = self.known
+        base = patient * self.fact_count
+        input_positions = shard.input_positions
+        export_ids = shard.export_ids
+        dependent_offsets = shard.dependent_offsets
+        dependent_rules = shard.dependent_rules
+        condition_counts = shard.condition_counts
+        conclusion_ids = shard.conclusion_ids
+        unsatisfied = self._unsatisfied[patient]
+        derived = self._derived[patient]
+        agenda = [input_positions[fact_id] for fact_id in fact_ids if fact_id in input_positions]
+        concluded_ids = list(concluded_ids)
+        while agenda or concluded_ids:
+            while concluded_ids:
+                new_fact_id = concluded_ids.pop()
+                if not known[base + new_fact_id]:
+                    known[base + new_fact_id] = 1
+                    derived.append(new_fact_id)
+                    if new_fact_id in export_ids:
+                        exports.setdefault(patient, []).append(new_fact_id)
+                    position = input_positions.get(new_fact_id)
+                    if position is not None:
+                        agenda.append(position)
+            if agenda:
+                position = agenda.pop()
+                for index in range(dependent_offsets[position], dependent_offsets[position + 1]):
+                    local_rule = dependent_rules[index]
+                    count = unsatisfied.get(local_rule, condition_counts[local_rule]) - 1
+                    unsatisfied[local_rule] = count
+                    if count == 0:
+                        concluded_ids.append(conclusion_ids[local_rule])
+
+    def get_derived(self):
+        """
+        Returns the IDs of the facts this shard derived for each patient of the batch.
+        """
+        return self._derived
+
+
+def _handle_message(worker, message, argument):
+    """
+    Carries out one message from the engine and returns the reply.
+    """
+    if message == _FIRST_ROUND:
+        return worker.run_first_round(argument)
+    if message == _NEXT_ROUND:
+        return worker.run_next_round(argument)
+    if message == _COLLECT:
+        return worker.get_derived()
+    raise ValueError(f"Unknown message: {message}")
+
+
+def _run_worker_process(connection, shard, memory_name, fact_count):
+    """
+    Main loop of a worker process: carries out messages until told to stop.
+    """
+    memory = SharedMemory(name=memory_name)
+    try:
+        worker = ShardWorker(shard, memory.buf, fact_count)
+        while True:
+            message, argument = connection.recv()
+            if message == _STOP:
+                break
+            connection.send(_handle_message(worker, message, argument))
+    finally:
+        memory.close()
+        connection.close()
+
+
+class ShardedEngine:
+    """
+    Forward chaining with the rules split into shards that run in parallel.
+
+    Use it as a context manager, or call close() to stop the worker processes.
+
+    Attributes:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        shards (list): The Shards, one per worker
+        batch_size (int): Most patients that run together
+        last_rounds (int): Number of rounds the last batch of patients took
+    """
+
+    def __init__(self, compiled, shard_count=DEFAULT_SHARD_COUNT, batch_size=DEFAULT_SHARD_BATCH_SIZE,
+                 use_processes=True):
+        """
+        Partitions the rules and starts the workers.
+
+        Args:
+            compiled (CompiledKnowledgeBase): The compiled rules
+            shard_count (int): Number of shards (and worker processes)
+            batch_size (int): Most patients whose facts share the shared memory block
+            use_processes (bool): If False, the shards run one after another in
+                this process (same rounds and results, no parallelism); useful
+                for testing
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.compiled = compiled
+        self.shards = build_shards(compiled, shard_count)
+        self.batch_size = batch_size
+        self.last_rounds = 0
+        self._memory = None
+        self._processes = []
+        self._connections = []
+        self._workers = []
+        size = max(1, batch_size * compiled.fact_count)
+        if not use_processes:
+            self._known = bytearray(size)
+            self._workers = [ShardWorker(shard, self._known, compiled.fact_count) for shard in self.shards]
+            return
+        self._memory = SharedMemory(create=True, size=size)
+        self._known = self._memory.buf
+        try:
+            for shard in self.shards:
+                connection, worker_connection = Pipe()
+                process = Process(target=_run_worker_process,
+                                  args=(worker_connection, shard, self._memory.name, compiled.fact_count),
+                                  daemon=True)
+                process.start()
+                worker_connection.close()
+                self._processes.append(process)
+                self._connections.append(connection)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops the worker processes and frees the shared memory.
+        """
+        for connection in self._connections:
+            try:
+                connection.send((_STOP, None))
+            except OSError:
+                pass    # The worker already exited
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+        if self._memory is not None:
+            self._known = None
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def _send_all(self, message, argument=None):
+        """
+        Sends a message to every worker and returns their replies, in shard order.
+        """
+        if self._workers:
+            return [_handle_message(worker, message, argument) for worker in self._workers]
+        for connection in self._connections:
+            connection.send((message, argument))
+        return [connection.recv() for connection in self._connections]
+
+    def run_batch(self, fact_sets):
+        """
+        Runs forward chaining for many patients.
+
+        Args:
+            fact_sets (iterable): Starting fact lists (e.g., patient symptoms)
+
+        Returns:
+            list: For each fact set, a list of the newly derived fact strings
+                (excluding the initial facts), like forward_chaining_inference()
+        """
+        fact_sets = list(fact_sets)
+        results = []
+        for start in range(0, len(fact_sets), self.batch_size):
+            results.extend(self._run_chunk(fact_sets[start:start + self.batch_size]))
+        return results
+
+    def run(self, initial_facts):
+        """
+        Runs forward chaining for one patient. Returns the newly derived fact strings.
+        """
+        return self.run_batch([initial_facts])[0]
+
+    @staticmethod
+    def _merge_exports(replies):
+        """
+        Combines the workers' replies to a round into the new facts of each patient.
+        """
+        new_fact_ids = {}
+        for exports in replies:
+            for patient, fact_ids in exports.items():
+                new_fact_ids.setdefault(patient, []).extend(fact_ids)
+        return new_fact_ids
+
+    def _run_chunk(self, fact_sets):
+        known = self._known
+        fact_count = self.compiled.fact_count
+        fact_ids = self.compiled.fact_ids
+        size = len(fact_sets) * fact_count
+        known[:size] = bytes(size)
+        initial_fact_ids = []
+        for patient, facts in enumerate(fact_sets):
+            base = patient * fact_count
+            patient_fact_ids = []
+            for fact in facts:
+                fact_id = fact_ids.get(fact)
+                if fact_id is not None and not known[base + fact_id]:
+                    known[base + fact_id] = 1
+                    patient_fact_ids.append(fact_id)
+            initial_fact_ids.append(patient_fact_ids)
+
+        rounds = 1
+        new_fact_ids = self._merge_exports(self._send_all(_FIRST_ROUND, initial_fact_ids))
+        while new_fact_ids:
+            rounds += 1
+            new_fact_ids = self._merge_exports(self._send_all(_NEXT_ROUND, new_fact_ids))
+        self.last_rounds = rounds
+
+        fact_names = self.compiled.fact_names
+        results = [[] for _ in fact_sets]
+        for shard_derived in self._send_all(_COLLECT):
+            for derived, fact_ids in zip(results, shard_derived):
+                derived.extend(fact_names[fact_id] for fact_id in fact_ids)
+        return results
+
+
+def sharded_forward_chaining_inference(rules, initial_facts, shard_count=DEFAULT_SHARD_COUNT):
+    """
+    Performs forward chaining inference with the rules split across worker processes.
+
+    Gives the same derived facts as forward_chaining_inference(). Starting the
+    workers costs far more than one inference on small rule sets, so use a
+    ShardedEngine to run many patients on the same rules.
+
+    Args:
+        rules (list): A list of rule dictionaries (same format as forward_chaining_inference)
+        initial_facts (iterable): Starting fact strings (e.g., patient symptoms)
+        shard_count (int): Number of worker processes
+
+    Returns:
+        list: A list of newly derived fact strings (excluding the initial facts).
+    """
+    with ShardedEngine(compile_knowledge_base(rules), shard_count) as engine:
+        return engine.run(initial_facts)
@@ -0,0 +1,134 @@
+# synthetic_knowledge_base.py
+# Generates large synthetic knowledge bases and patient workloads for benchmarking
+# and testing the inference engines.
+#
+# The generated rules have the same layered shape as medical_diagnosis.csv:
+# symptoms -> intermediate facts (one layer per level of chain depth) ->
+# diagnosis:* -> recommendation:*. Every rule is a dictionary in the same format
+# as the rules in knowledge_base.py, so any engine can run on them.
+#
+# Example:
+#   rules = generate_knowledge_base(rule_count=100000, depth=4, fan_in=3, seed=1)
+#   patients = generate_patients(rules, count=10000, seed=1)
+#   write_knowledge_base_csv(rules, 'synthetic.csv')
+
+import csv
+import random
+
+from knowledge_base import (IF_KEY, AND_KEY, THEN_KEY, RESULT_TYPE_KEY, RESULT_TYPE_INTERMEDIATE,
+                            RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION)
+
+DEFAULT_RULE_COUNT = 10000
+DEFAULT_DEPTH = 3
+DEFAULT_FAN_IN = 2
+DEFAULT_SYMPTOM_COUNT = 1000
+DEFAULT_SYMPTOMS_PER_PATIENT = 8
+
+
+def generate_knowledge_base(rule_count=DEFAULT_RULE_COUNT, depth=DEFAULT_DEPTH, fan_in=DEFAULT_FAN_IN,
+                            symptom_count=DEFAULT_SYMPTOM_COUNT, seed=None):
+    """
+    Generates a layered knowledge base.
+
+    Layer 0 is the symptoms. Layers 1 to depth - 2 are intermediate facts, layer
+    depth - 1 is diagnoses, and layer depth is recommendations (with depth 1 there
+    are only diagnoses). Each rule concludes a fact of one layer and takes its
+    conditions from the layers below it, at least one of them from the layer
+    directly below, so the longest chain of rules is `depth` rules long.
+
+    Args:
+        rule_count (int): Number of rules
+        depth (int): Number of rule layers (at least 1)
+        fan_in (int): Number of conditions of each rule (at least 1)
+        symptom_count (int): Number of distinct symptoms
+        seed (int): Random seed, so the same arguments give the same rules
+
+    Returns:
+        list: Rule dictionaries with 'if', 'then' and 'result_type' keys
+
+    Raises:
+        ValueError: If depth, fan_in or symptom_count is less than 1
+    """
+    if depth < 1 or fan_in < 1 or symptom_count < 1:
+        raise ValueError("depth, fan_in and symptom_count must be at least 1")
+    rng = random.Random(seed)
+    # Spread the rules evenly over the layers; about two rules share each conclusion
+    rules_per_layer = [rule_count // depth + (1 if layer < rule_count % depth else 0)
+                       for layer in range(depth)]
+    layers = [[f"symptom_{i}" for i in range(symptom_count)]]
+    rules = []
+    for layer, layer_rule_count in enumerate(rules_per_layer, start=1):
+        if layer == depth and depth > 1:
+            name, result_type = 'recommendation:treatment_{}', RESULT_TYPE_RECOMMENDATION
+        elif layer >= depth - 1:
+            name, result_type = 'diagnosis:condition_{}', RESULT_TYPE_DIAGNOSIS
+        else:
+            name, result_type = f'level{layer}_finding_{{}}', RESULT_TYPE_INTERMEDIATE
+        conclusions = [name.format(i) for i in range(max(1, layer_rule_count // 2))]
+        below = layers[-1]
+        lower = [fact for facts in layers for fact in facts]
+        for _ in range(layer_rule_count):
+            conditions = {rng.choice(below)}
+            while len(conditions) < min(fan_in, len(lower)):
+                conditions.add(rng.choice(below) if rng.random() < 0.5 else rng.choice(lower))
+            rules.append({IF_KEY: conditions, THEN_KEY: rng.choice(conclusions),
+                          RESULT_TYPE_KEY: result_type})
+        layers.append(conclusions)
+    return rules
+
+
+def get_symptoms(rules):
+    """
+    Returns the sorted list of facts that rules use as conditions but no rule concludes.
+    """
+    conclusions = {rule[THEN_KEY] for rule in rules}
+    return sorted({fact for rule in rules for fact in rule[IF_KEY]} - conclusions)
+
+
+def generate_patients(rules, count, symptoms_per_patient=DEFAULT_SYMPTOMS_PER_PATIENT, seed=None):
+    """
+    Generates symptom lists that exercise the rules.
+
+    Each patient gets the symptoms of a few randomly chosen rules whose
+    conditions are all symptoms (so at least some rules fire), topped up with
+    random symptoms.
+
+    Args:
+        rules (list): Rules from generate_knowledge_base() (or any rule list)
+        count (int): Number of patients
+        symptoms_per_patient (int): Approximate number of symptoms per patient
+        seed (int): Random seed
+
+    Returns:
+        list: One list of symptom strings per patient
+    """
+    rng = random.Random(seed)
+    symptoms = get_symptoms(rules)
+    symptom_set = set(symptoms)
+    first_layer = [sorted(rule[IF_KEY]) for rule in rules if rule[IF_KEY] and rule[IF_KEY] <= symptom_set]
+    patients = []
+    for _ in range(count):
+        patient = set()
+        while first_layer and len(patient) < symptoms_per_patient // 2:
+            patient.update(rng.choice(first_layer))
+        while symptoms and len(patient) < symptoms_per_patient:
+            patient.add(rng.choice(symptoms))
+        patient = sorted(patient)
+        rng.shuffle(patient)
+        patients.append(patient)
+    return patients
+
+
+def write_knowledge_base_csv(rules, csv_path):
+    """
+    Writes rules to a CSV file in the format load_knowledge_base_from_csv() reads,
+    with as many 'and' columns as the rule with the most conditions needs.
+    """
+    condition_columns = max((len(rule[IF_KEY]) for rule in rules), default=1)
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([IF_KEY] + [AND_KEY] * (condition_columns - 1) + [THEN_KEY, RESULT_TYPE_KEY])
+        for rule in rules:
+            conditions = sorted(rule[IF_KEY])
+            conditions += [''] * (condition_columns - len(conditions))
+            writer.writerow(conditions + [rule[THEN_KEY], rule.get(RESULT_TYPE_KEY, '')])
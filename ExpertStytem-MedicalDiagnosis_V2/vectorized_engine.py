@@ -0,0 +1,244 @@
+# vectorized_engine.py
+# NumPy forward chaining over many patients at once, for population-level analysis.
+#
+# The known facts of a group of patients are stored as a packed bit matrix: one
+# row per fact ID of the compiled knowledge base, one bit per patient (8 patients
+# per byte). The rules are applied one stratum at a time (see rule_graph.py): for
+# each stratum, the condition rows of every rule are AND-ed together, and the
+# conclusion rows of the rules that fired are OR-ed into the matrix. Each of these
+# is one array operation covering every rule of the stratum and every patient.
+#
+# Requires NumPy (pip install numpy). The rest of the expert system does not.
+
+import numpy as np
+
+from fact_symbols import get_symbol, normalize_fact_name
+from inference_engine import get_diagnosis
+from knowledge_base import RESULT_TYPE_DIAGNOSIS, RESULT_TYPE_RECOMMENDATION, get_current_knowledge_base
+
+# Patients per matrix in vectorized_get_diagnoses(), to bound memory use
+DEFAULT_VECTOR_CHUNK_SIZE = 8192
+
+
+class _StratumArrays:
+    """
+    The rules of one stratum as index arrays.
+
+    Attributes:
+        condition_ids (np.ndarray): Condition fact IDs of the stratum's rules with
+            conditions, one rule after another
+        condition_starts (np.ndarray): Start of each of those rules in condition_ids
+        conditional_order (np.ndarray): Positions (in conclusion order) of those rules
+        always_fired (np.ndarray): Positions of the rules without conditions
+        conclusion_ids (np.ndarray): Distinct conclusion fact IDs of the stratum
+        conclusion_starts (np.ndarray): Start of each conclusion's rules, with the
+            rules sorted by conclusion
+        recursive (bool): True if the stratum must be repeated until nothing changes
+    """
+
+    def __init__(self, compiled, conclusions, rule_numbers, recursive):
+        # Sort the rules by conclusion so rules with the same conclusion are adjacent
+        rule_numbers = np.asarray(rule_numbers, dtype=np.int64)
+        rule_numbers = rule_numbers[np.argsort(conclusions[rule_numbers], kind='stable')]
+        self.rule_count = len(rule_numbers)
+        rule_conclusions = conclusions[rule_numbers]
+        self.conclusion_ids, self.conclusion_starts = np.unique(rule_conclusions, return_index=True)
+
+        condition_ids = []
+        condition_starts = []
+        conditional_order = []
+        always_fired = []
+        for position, rule_number in enumerate(rule_numbers):
+            conditions = compiled.get_conditions(int(rule_number))
+            if conditions:
+                conditional_order.append(position)
+                condition_starts.append(len(condition_ids))
+                condition_ids.extend(conditions)
+            else:
+                always_fired.append(position)
+        self.condition_ids = np.asarray(condition_ids, dtype=np.int64)
+        self.condition_starts = np.asarray(condition_starts, dtype=np.int64)
+        self.conditional_order = np.asarray(conditional_order, dtype=np.int64)
+        self.always_fired = np.asarray(always_fired, dtype=np.int64)
+        self.recursive = recursive
+
+    def apply(self, known):
+        """
+        Fires the stratum's rules once for every patient.
+
+        Args:
+            known (np.ndarray): (facts, patient bytes) packed bit matrix. Updated in place.
+
+        Returns:
+            bool: True if any new fact was added
+        """
+        fired = np.empty((self.rule_count, known.shape[1]), dtype=np.uint8)
+        if len(self.condition_ids):
+            # AND each rule's condition rows together
+            fired[self.conditional_order] = np.bitwise_and.reduceat(
+                known[self.condition_ids], self.condition_starts, axis=0)
+        fired[self.always_fired] = 0xFF
+        # OR together the rules that share a conclusion
+        concluded = np.bitwise_or.reduceat(fired, self.conclusion_starts, axis=0)
+        current = known[self.conclusion_ids]
+        if not (concluded & ~current).any():
+            return False
+        known[self.conclusion_ids] = current | concluded
+        return True
+
+
+class VectorizedEngine:
+    """
+    Forward chaining for a matrix of patients on one knowledge base version.
+
+    Attributes:
+        compiled (CompiledKnowledgeBase): The compiled rules
+        fact_count (int): Number of columns of the patient matrices
+    """
+
+    def __init__(self, knowledge_base=None):
+        """
+        Prepares the strata of a knowledge base.
+
+        Args:
+            knowledge_base (KnowledgeBaseVersion): Version to use (default: the current one)
+        """
+        if knowledge_base is None:
+            knowledge_base = get_current_knowledge_base()
+        graph = knowledge_base.rule_graph
+        self.compiled = graph.compiled
+        self.fact_count = self.compiled.fact_count
+        conclusions = np.asarray(self.compiled.conclusion_ids, dtype=np.int64)
+        self._strata = [_StratumArrays(self.compiled, conclusions, rule_numbers, recursive)
+                        for rule_numbers, recursive in zip(graph.strata, graph.recursive_strata)
+                        if len(rule_numbers)]
+        symbols = [get_symbol(fact) for fact in self.compiled.fact_names]
+        diagnoses = [i for i, symbol in enumerate(symbols) if symbol.goal_type == RESULT_TYPE_DIAGNOSIS]
+        self._diagnosis_ids = np.asarray(diagnoses, dtype=np.int64)
+        self._diagnosis_names = [symbols[i].label for i in diagnoses]
+        recommendations = [i for i, symbol in enumerate(symbols)
+                           if symbol.goal_type == RESULT_TYPE_RECOMMENDATION]
+        self._recommendation_ids = np.asarray(recommendations, dtype=np.int64)
+        self._recommendation_names = [symbols[i].label for i in recommendations]
+
+    def encode(self, symptom_lists):
+        """
+        Builds the packed bit matrix of a group of patients. Symptoms are
+        normalized like get_diagnosis() normalizes them, and symptoms that do
+        not appear in any rule are ignored.
+
+        Args:
+            symptom_lists (list): One list of symptom strings per patient
+
+        Returns:
+            np.ndarray: (facts, (patients + 7) // 8) uint8 matrix; bit 7 - p % 8 of
+                byte p // 8 in a fact's row is set if patient p has that fact
+        """
+        fact_ids = self.compiled.fact_ids
+        patients = []
+        columns = []
+        for patient, symptoms in enumerate(symptom_lists):
+            for symptom in symptoms:
+                fact_id = fact_ids.get(normalize_fact_name(symptom))
+                if fact_id is not None:
+                    patients.append(patient)
+                    columns.append(fact_id)
+        known = np.zeros((self.fact_count, (len(symptom_lists) + 7) // 8), dtype=np.uint8)
+        patients = np.asarray(patients, dtype=np.int64)
+        bits = np.left_shift(1, 7 - patients % 8).astype(np.uint8)
+        np.bitwise_or.at(known, (np.asarray(columns, dtype=np.int64), patients // 8), bits)
+        return known
+
+    def run(self, known):
+        """
+        Runs forward chaining to the fixed point for every patient.
+
+        Args:
+            known (np.ndarray): Matrix from encode(). Updated in place.
+
+        Returns:
+            np.ndarray: The same matrix, with every derivable fact set
+        """
+        for stratum in self._strata:
+            while stratum.apply(known) and stratum.recursive:
+                pass
+        return known
+
+    def extract(self, known, initial, patient_count):
+        """
+        Extracts the diagnoses and recommendations of each patient.
+
+        Args:
+            known (np.ndarray): Matrix after run()
+            initial (np.ndarray): Matrix from encode(), before run()
+            patient_count (int): Number of patients in the matrices
+
+        Returns:
+            list: One dict per patient in the same format as get_diagnosis().
+                Goals are listed in the order they first appear in the rules.
+        """
+        results = [{"diagnoses": [], "recommendations": []} for _ in range(patient_count)]
+        for key, fact_ids, names in (("diagnoses", self._diagnosis_ids, self._diagnosis_names),
+                                     ("recommendations", self._recommendation_ids,
+                                      self._recommendation_names)):
+            derived = known[fact_ids] & ~initial[fact_ids]
+            # (patients, goals) bools; nonzero() lists them patient by patient, in goal order
+            for patient, goal in zip(*np.unpackbits(derived, axis=1, count=patient_count).T.nonzero()):
+                results[patient][key].append(names[goal])
+        return results
+
+    def get_diagnoses(self, symptom_lists):
+        """
+        Diagnoses a group of patients in one matrix.
+
+        Returns:
+            list: One result per patient (see extract())
+        """
+        initial = self.encode(symptom_lists)
+        return self.extract(self.run(initial.copy()), initial, len(symptom_lists))
+
+
+def vectorized_get_diagnoses(symptom_lists, chunk_size=DEFAULT_VECTOR_CHUNK_SIZE):
+    """
+    Diagnoses many patients with the vectorized engine, a chunk at a time.
+
+    Gives the same diagnoses and recommendations as get_diagnosis() for each
+    patient, but each list is in the order the goals first appear in the rules
+    (get_diagnosis() lists them in the order they were derived).
+
+    Args:
+        symptom_lists (iterable): One list of symptom strings per patient
+        chunk_size (int): Patients per matrix (each matrix takes about
+            number of facts x chunk_size / 8 bytes)
+
+    Yields:
+        dict: One result per patient, in input order
+    """
+    engine = VectorizedEngine()
+    chunk = []
+    for symptoms in symptom_lists:
+        chunk.append(symptoms)
+        if len(chunk) >= chunk_size:
+            yield from engine.get_diagnoses(chunk)
+            chunk = []
+    if chunk:
+        yield from engine.get_diagnoses(chunk)
+
+
+def mismatched_patients(symptom_lists):
+    """
+    Cross-checks the vectorized engine against get_diagnosis().
+
+    Args:
+        symptom_lists (list): One list of symptom strings per patient
+
+    Returns:
+        list: Indexes of patients whose diagnoses or recommendations differ
+            (ignoring order) from get_diagnosis() (empty if all agree)
+    """
+    mismatched = []
+    for i, (symptoms, result) in enumerate(zip(symptom_lists, vectorized_get_diagnoses(symptom_lists))):
+        expected = get_diagnosis(symptoms)
+        if any(sorted(result[key]) != sorted(expected[key]) for key in expected):
+            mismatched.append(i)
+    return mismatched
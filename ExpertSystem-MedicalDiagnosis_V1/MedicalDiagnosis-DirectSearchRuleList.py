@@ -1,7 +1,12 @@
+import heapq
+from collections import Counter
+
 from knowledge_base import IF_KEY, THEN_KEY
 
 # This program demonstrates simple rule-based classification (Pattern Matching)
 
+NO_MATCH_RESULT = "Diagnosis: Undetermined. No direct rule matched all symptoms."
+
 KNOWLEDGE_BASE = [
     # Rule 1:Flu/Cold symptoms
     {"if": {"fever", "cough", "sore_throat"}, "then": "Diagnosis: Common Cold - Recommend hot tea."},
@@ -35,30 +40,105 @@ def direct_lookup_inference(rules, patient_facts):
             return rule[THEN_KEY]
 
     # If the loop finishes without finding a match:
-    return "Diagnosis: Undetermined. No direct rule matched all symptoms."
+    return NO_MATCH_RESULT
+
+
+def build_lookup_index(rules):
+    """
+    Builds an index that lets indexed_lookup_inference() skip most of the rules.
+
+    Each rule is filed under just one of its conditions: the one the fewest rules
+    need (its rarest condition). A rule can only match a patient who has that
+    condition, so a lookup only has to check the rules filed under the patient's
+    facts. Rules without conditions match everyone and are filed under None.
+
+    Returns a dictionary: condition -> list of rule numbers, in rule order.
+    """
+    condition_counts = Counter(condition for rule in rules for condition in rule[IF_KEY])
+    lookup_index = {}
+    for rule_number, rule in enumerate(rules):
+        conditions = rule[IF_KEY]
+        if conditions:
+            # Ties are broken by name so the index does not depend on set order
+            key = min(conditions, key=lambda condition: (condition_counts[condition], condition))
+        else:
+            key = None
+        lookup_index.setdefault(key, []).append(rule_number)
+    return lookup_index
+
+
+def indexed_lookup_inference(rules, patient_facts, lookup_index):
+    """
+    Returns the same first matching rule as direct_lookup_inference(), using an
+    index from build_lookup_index() so that only the rules filed under the
+    patient's facts are checked.
+    """
+    facts_set = set(patient_facts)
+
+    # The candidate lists are each in rule order, so merging them visits the
+    # candidates in rule order and the first one that matches is the first match.
+    candidate_lists = [lookup_index[fact] for fact in facts_set if fact in lookup_index]
+    if None in lookup_index:
+        candidate_lists.append(lookup_index[None])
+
+    for rule_number in heapq.merge(*candidate_lists):
+        rule = rules[rule_number]
+        if rule[IF_KEY].issubset(facts_set):
+            return rule[THEN_KEY]
+
+    return NO_MATCH_RESULT
+
+
+def direct_lookup_batch(rules, patients, lookup_index=None):
+    """
+    Finds the first matching rule for many patients.
+
+    Builds the index once (unless one is given), and looks up each distinct set
+    of facts only once.
+
+    Returns a list with one result per patient, in the same order.
+    """
+    if lookup_index is None:
+        lookup_index = build_lookup_index(rules)
+    results_by_facts = {}
+    results = []
+    for patient_facts in patients:
+        key = frozenset(patient_facts)
+        if key not in results_by_facts:
+            results_by_facts[key] = indexed_lookup_inference(rules, key, lookup_index)
+        results.append(results_by_facts[key])
+    return results
 
 # --- Main Program Execution ---
 
-# Scenario 1: Simple Cold (matches Rule 1)
-patient_facts_1 = ['fever', 'cough', 'sore_throat', 'body_aches'] # Extra fact doesn't hurt
-result_1 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_1)
+if __name__ == "__main__":
+    # Scenario 1: Simple Cold (matches Rule 1)
+    patient_facts_1 = ['fever', 'cough', 'sore_throat', 'body_aches'] # Extra fact doesn't hurt
+    result_1 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_1)
+
+    print("\n====================================")
+    print(f"RESULT 1: {result_1}")
+    print("====================================")
+
+    # Scenario 2: Migraine (matches Rule 2)
+    patient_facts_2 = ['headache', 'nausea']
+    result_2 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_2)
 
-print("\n====================================")
-print(f"RESULT 1: {result_1}")
-print("====================================")
+    print("\n====================================")
+    print(f"RESULT 2: {result_2}")
+    print("====================================")
 
-# Scenario 2: Migraine (matches Rule 2)
-patient_facts_2 = ['headache', 'nausea']
-result_2 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_2)
+    # Scenario 3: Only Fever (matches Rule 4, since it's the simplest match)
+    patient_facts_3 = ['fever', 'restless']
+    result_3 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_3)
 
-print("\n====================================")
-print(f"RESULT 2: {result_2}")
-print("====================================")
+    print("\n====================================")
+    print(f"RESULT 3: {result_3}")
+    print("====================================")
 
-# Scenario 3: Only Fever (matches Rule 4, since it's the simplest match)
-patient_facts_3 = ['fever', 'restless']
-result_3 = direct_lookup_inference(KNOWLEDGE_BASE, patient_facts_3)
+    # Batch: all three patients at once, using the index
+    batch_results = direct_lookup_batch(KNOWLEDGE_BASE, [patient_facts_1, patient_facts_2, patient_facts_3])
 
-print("\n====================================")
-print(f"RESULT 3: {result_3}")
-print("====================================")
+    print("\n====================================")
+    print(f"BATCH RESULTS: {batch_results}")
+    print("====================================")
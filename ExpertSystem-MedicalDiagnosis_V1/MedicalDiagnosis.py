@@ -104,36 +104,37 @@ def extract_goals(rules: List[Dict[str, Any]], facts: Set[str]) -> List[str]:
 
 # --- Main Program Execution ---
 
-# Load the knowledge base from CSV file in the same directory
-CSV_FILE = 'MedicalDiagnosis.csv'
-
-# Try to load rules from the CSV file path; fall back to empty rules on error
-try:
-    knowledge_base = load_rules_from_file(CSV_FILE)
-except FileNotFoundError:
-    print(f"Warning: {CSV_FILE} not found. No rules loaded.")
-    knowledge_base = []
-
-# --- Scenario 1: Influenza ---
-patient_facts_1 = ['fever', 'cough', 'body_aches']
-final_facts_1 = forward_chaining_inference(knowledge_base, patient_facts_1)
-
-# Extract goal results
-goal_recommendations_1 = extract_goals(knowledge_base, final_facts_1)
-
-print("====================================")
-print(f"FINAL RESULT (Scenario 1: {patient_facts_1})")
-print(f"Recommendations: {goal_recommendations_1 if goal_recommendations_1 else 'None'}")
-print("====================================")
-
-# --- Scenario 2: Food Poisoning ---
-patient_facts_2 = ['no_appetite', 'stomach_pain']
-final_facts_2 = forward_chaining_inference(knowledge_base, patient_facts_2)
-
-# Extract goal results
-goal_recommendations_2 = extract_goals(knowledge_base, final_facts_2)
-
-print("====================================")
-print(f"FINAL RESULT (Scenario 2: {patient_facts_2})")
-print(f"Recommendations: {goal_recommendations_2 if goal_recommendations_2 else 'None'}")
-print("====================================")
+if __name__ == "__main__":
+    # Load the knowledge base from CSV file in the same directory
+    CSV_FILE = 'MedicalDiagnosis.csv'
+
+    # Try to load rules from the CSV file path; fall back to empty rules on error
+    try:
+        knowledge_base = load_rules_from_file(CSV_FILE)
+    except FileNotFoundError:
+        print(f"Warning: {CSV_FILE} not found. No rules loaded.")
+        knowledge_base = []
+
+    # --- Scenario 1: Influenza ---
+    patient_facts_1 = ['fever', 'cough', 'body_aches']
+    final_facts_1 = forward_chaining_inference(knowledge_base, patient_facts_1)
+
+    # Extract goal results
+    goal_recommendations_1 = extract_goals(knowledge_base, final_facts_1)
+
+    print("====================================")
+    print(f"FINAL RESULT (Scenario 1: {patient_facts_1})")
+    print(f"Recommendations: {goal_recommendations_1 if goal_recommendations_1 else 'None'}")
+    print("====================================")
+
+    # --- Scenario 2: Food Poisoning ---
+    patient_facts_2 = ['no_appetite', 'stomach_pain']
+    final_facts_2 = forward_chaining_inference(knowledge_base, patient_facts_2)
+
+    # Extract goal results
+    goal_recommendations_2 = extract_goals(knowledge_base, final_facts_2)
+
+    print("====================================")
+    print(f"FINAL RESULT (Scenario 2: {patient_facts_2})")
+    print(f"Recommendations: {goal_recommendations_2 if goal_recommendations_2 else 'None'}")
+    print("====================================")